@@ -0,0 +1,99 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, crud, auth
+
+# Async counterparts of crud.py for the async routers.
+# Single-statement reads are native async selects; multi-step writes reuse the
+# sync implementations in crud.py through AsyncSession.run_sync, so both paths
+# share one definition of the write semantics.
+
+# Users
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    return result.scalars().first()
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.User).offset(skip).limit(limit))
+    return result.scalars().all()
+
+# Password hashes are computed on the bcrypt pool before entering run_sync,
+# which would otherwise hash on the event loop thread.
+async def create_user(db: AsyncSession, user: schemas.UserCreate, role: str = "user"):
+    hashed_password = await auth.get_password_hash_async(user.password)
+    return await db.run_sync(crud.create_user, user, role, hashed_password)
+
+async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate):
+    hashed_password = await auth.get_password_hash_async(user_update.password) if user_update.password else None
+    return await db.run_sync(crud.update_user, user_id, user_update, hashed_password)
+
+async def set_password_hash(db: AsyncSession, user_id: int, hashed_password: str):
+    return await db.run_sync(crud.set_password_hash, user_id, hashed_password)
+
+async def delete_user(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.delete_user, user_id)
+
+# Assets
+async def get_assets(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Asset).where(models.Asset.user_id == user_id))
+    return result.scalars().all()
+
+async def save_assets_bulk(db: AsyncSession, assets: list[schemas.AssetCreate], user_id: int):
+    return await db.run_sync(crud.save_assets_bulk, assets, user_id)
+
+async def apply_assets_delta(db: AsyncSession, delta: schemas.AssetDelta, user_id: int):
+    return await db.run_sync(crud.apply_assets_delta, delta, user_id)
+
+# Delta sync
+async def get_sync_version(db: AsyncSession, user_id: int, collection: str) -> int:
+    result = await db.execute(
+        select(models.SyncVersion.version).where(
+            models.SyncVersion.user_id == user_id,
+            models.SyncVersion.collection == collection
+        )
+    )
+    return result.scalar() or 0
+
+# Reports
+async def get_reports(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(models.Report).where(models.Report.user_id == user_id).order_by(models.Report.timestamp.desc())
+    )
+    return result.scalars().all()
+
+async def get_report_summaries(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(*crud.REPORT_SUMMARY_COLUMNS).where(models.Report.user_id == user_id).order_by(models.Report.timestamp.desc())
+    )
+    return result.all()
+
+async def get_report(db: AsyncSession, report_id: str, user_id: int):
+    result = await db.execute(
+        select(models.Report).where(models.Report.id == report_id, models.Report.user_id == user_id)
+    )
+    return result.scalars().first()
+
+async def save_reports_bulk(db: AsyncSession, reports: list[schemas.ReportCreate], user_id: int):
+    return await db.run_sync(crud.save_reports_bulk, reports, user_id)
+
+async def apply_reports_delta(db: AsyncSession, delta: schemas.ReportDelta, user_id: int):
+    return await db.run_sync(crud.apply_reports_delta, delta, user_id)
+
+# Goals
+async def get_goal(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Goal).where(models.Goal.user_id == user_id))
+    return result.scalars().first()
+
+async def create_or_update_goal(db: AsyncSession, goal: schemas.GoalCreate, user_id: int):
+    return await db.run_sync(crud.create_or_update_goal, goal, user_id)
+
+# Models
+async def get_models(db: AsyncSession):
+    result = await db.execute(select(models.ModelConfig))
+    return result.scalars().all()
+
+async def save_models_bulk(db: AsyncSession, configs: list[schemas.ModelConfigCreate]):
+    return await db.run_sync(crud.save_models_bulk, configs)
@@ -1,3 +1,9 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -5,6 +11,8 @@ import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas, database
 
 # Secret key for JWT encoding/decoding. In production, keep this secret!
@@ -14,13 +22,106 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440 # 24 hours
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# --- Authenticated user cache ---
+# username -> (expires_at, schemas.User). Saves the users lookup on every
+# authenticated request. crud.update_user / crud.delete_user invalidate
+# entries, so role and is_active changes apply immediately in this process;
+# other worker processes pick them up within the TTL.
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30)) # seconds, 0 disables
+USER_CACHE_SIZE = 10000
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def get_cached_user(username: str):
+    with _user_cache_lock:
+        entry = _user_cache.get(username)
+        if entry and entry[0] > time.monotonic():
+            _user_cache.move_to_end(username)
+            _user_cache_stats["hits"] += 1
+            return entry[1]
+        if entry:
+            del _user_cache[username]
+        _user_cache_stats["misses"] += 1
+        return None
+
+def cache_user(user):
+    if USER_CACHE_TTL <= 0:
+        return
+    # Immutable snapshot, safe to share between requests (no session attached)
+    snapshot = schemas.User(
+        id=user.id, username=user.username, role=user.role,
+        is_active=user.is_active, created_at=user.created_at
+    )
+    with _user_cache_lock:
+        _user_cache[snapshot.username] = (time.monotonic() + USER_CACHE_TTL, snapshot)
+        _user_cache.move_to_end(snapshot.username)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+def invalidate_cached_user(user_id: int = None, username: str = None):
+    with _user_cache_lock:
+        if username is not None:
+            _user_cache.pop(username, None)
+        if user_id is not None:
+            for name in [n for n, (_, u) in _user_cache.items() if u.id == user_id]:
+                del _user_cache[name]
+        _user_cache_stats["invalidations"] += 1
+
+def clear_user_cache():
+    with _user_cache_lock:
+        _user_cache.clear()
+
+def get_user_cache_stats():
+    with _user_cache_lock:
+        return dict(_user_cache_stats, size=len(_user_cache), ttl=USER_CACHE_TTL)
+
+# --- Password hashing ---
+# bcrypt cost factor for new hashes. Existing hashes with a different cost are
+# re-hashed transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+# bcrypt is CPU bound (~100-300 ms per call) and releases the GIL, so async
+# handlers run it on a small dedicated pool instead of the event loop. At most
+# PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE calls are admitted at once;
+# beyond that callers get 503 instead of piling up behind a login burst.
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 64))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
 def verify_password(plain_password, hashed_password):
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password):
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    # "$2b$12$<salt+hash>": the second field is the cost factor
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+async def _run_hash_job(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hash_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -38,7 +139,11 @@ def get_db():
     finally:
         db.close()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -53,9 +158,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    if USER_CACHE_TTL > 0:
+        cached = get_cached_user(token_data.username)
+        if cached is not None:
+            return cached
+
+    result = await db.execute(select(models.User).where(models.User.username == token_data.username))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    cache_user(user)
     return user
 
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
@@ -1,6 +1,10 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_, func, case, select, union_all, literal, null, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import datetime
 from . import models, schemas
-from .auth import get_password_hash
+from .auth import get_password_hash, invalidate_cached_user
+from .services import model_registry
 
 def get_user(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
@@ -11,15 +15,16 @@ def get_user_by_id(db: Session, user_id: int):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate, role: str = "user"):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, role: str = "user", hashed_password: str = None):
+    # Async callers pass a hash computed off the event loop
+    hashed_password = hashed_password or get_password_hash(user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password, role=role)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
+def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate, hashed_password: str = None):
     db_user = get_user_by_id(db, user_id)
     if not db_user:
         return None
@@ -29,19 +34,23 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     if user_update.is_active is not None:
         db_user.is_active = user_update.is_active
     if user_update.password:
-        db_user.hashed_password = get_password_hash(user_update.password)
+        db_user.hashed_password = hashed_password or get_password_hash(user_update.password)
         
     db.commit()
+    invalidate_cached_user(user_id=user_id)
     db.refresh(db_user)
     return db_user
 
+def set_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+
 def delete_user(db: Session, user_id: int):
-    # Optional: Soft delete or hard delete. Hard delete for now.
-    # Note: This might fail if there are cascading constraints not set up for cascade delete
-    # but our models don't explicitly set cascade="all, delete" on relationships in models.py
-    # except defaults. Let's try hard delete.
+    # Hard delete; assets, reports, goals and strategies (with their executions
+    # and recommendations) go with it through ON DELETE CASCADE
     db.query(models.User).filter(models.User.id == user_id).delete()
     db.commit()
+    invalidate_cached_user(user_id=user_id)
 
 # Assets
 def get_assets(db: Session, user_id: int):
@@ -73,34 +82,168 @@ def delete_asset(db: Session, asset_id: str, user_id: int):
     db.query(models.Asset).filter(models.Asset.id == asset_id, models.Asset.user_id == user_id).delete()
     db.commit()
 
+def _asset_row(asset: schemas.AssetCreate, user_id: int) -> dict:
+    # schemas use camelCase (costPrice, currentPrice) to match the frontend, DB uses snake_case
+    return {
+        "id": asset.id,
+        "symbol": asset.symbol,
+        "name": asset.name,
+        "type": asset.type,
+        "quantity": asset.quantity,
+        "cost_price": asset.costPrice,
+        "current_price": asset.currentPrice,
+        "currency": asset.currency,
+        "user_id": user_id,
+    }
+
+def _upsert_rows(db: Session, model, rows: list, key: str = "id", owner: str = None):
+    # INSERT ... ON CONFLICT(id) DO UPDATE, sent as a single executemany.
+    # With owner set, an id that belongs to another user is left untouched.
+    if not rows:
+        return
+    stmt = sqlite_insert(model)
+    where = (getattr(model, owner) == stmt.excluded[owner]) if owner else None
+    # One statement per column set (rows may omit columns that should be kept)
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row.keys()), []).append(row)
+    for columns, group in groups.items():
+        update_cols = {c: stmt.excluded[c] for c in columns if c != key}
+        db.execute(stmt.on_conflict_do_update(index_elements=[key], set_=update_cols, where=where), group)
+
+# Delta sync
+class SyncConflict(Exception):
+    """A delta was based on an older version of the collection than the stored one."""
+    def __init__(self, current_version: int):
+        super().__init__(f"Collection changed, current version is {current_version}")
+        self.current_version = current_version
+
+def get_sync_version(db: Session, user_id: int, collection: str) -> int:
+    version = db.query(models.SyncVersion.version).filter(
+        models.SyncVersion.user_id == user_id,
+        models.SyncVersion.collection == collection
+    ).scalar()
+    return version or 0
+
+def _bump_sync_version(db: Session, user_id: int, collection: str, base_version: int = None) -> int:
+    # Compare-and-swap on the version row. This is the first write of the
+    # transaction, so SQLite's writer lock serializes concurrent deltas and the
+    # loser sees the new version. base_version=None bumps unconditionally.
+    q = db.query(models.SyncVersion).filter(
+        models.SyncVersion.user_id == user_id,
+        models.SyncVersion.collection == collection
+    )
+    if base_version is not None:
+        q = q.filter(models.SyncVersion.version == base_version)
+    if q.update({
+        "version": models.SyncVersion.version + 1,
+        "updated_at": datetime.datetime.utcnow()
+    }, synchronize_session=False):
+        return get_sync_version(db, user_id, collection)
+
+    current = get_sync_version(db, user_id, collection)
+    if base_version is not None and current != base_version:
+        raise SyncConflict(current)
+    db.add(models.SyncVersion(user_id=user_id, collection=collection, version=current + 1))
+    db.flush()
+    return current + 1
+
+def _apply_delta(db: Session, model, collection: str, user_id: int, delta, rows: list) -> dict:
+    try:
+        version = _bump_sync_version(db, user_id, collection, delta.base_version)
+    except SyncConflict:
+        db.rollback()
+        raise
+    deleted = 0
+    if delta.deletes:
+        deleted = db.query(model).filter(
+            model.user_id == user_id,
+            model.id.in_(delta.deletes)
+        ).delete(synchronize_session=False)
+    _upsert_rows(db, model, rows, owner="user_id")
+    db.commit()
+    return {"version": version, "upserted": len(rows), "deleted": deleted}
+
 def save_assets_bulk(db: Session, assets: list[schemas.AssetCreate], user_id: int):
-    # First delete all assets for this user (simple sync strategy as per previous file-based approach)
-    # Or we can merge. Previous app replaced the whole list.
-    db.query(models.Asset).filter(models.Asset.user_id == user_id).delete()
-    
-    for asset in assets:
-        create_asset(db, asset, user_id)
-    # create_asset commits individually, which is slow but fine for small data.
-    # We already did delete, so create_asset will insert.
+    # Replace the user's list (same semantics as the old file-based store) in one
+    # transaction: drop rows that are no longer present, upsert the rest.
+    ids = [a.id for a in assets]
+    db.query(models.Asset).filter(
+        models.Asset.user_id == user_id,
+        models.Asset.id.notin_(ids)
+    ).delete(synchronize_session=False)
+    _upsert_rows(db, models.Asset, [_asset_row(a, user_id) for a in assets], owner="user_id")
+    _bump_sync_version(db, user_id, "assets")
+    db.commit()
+
+def apply_assets_delta(db: Session, delta: schemas.AssetDelta, user_id: int) -> dict:
+    # Only the changed rows, in one transaction; raises SyncConflict on a stale base_version
+    return _apply_delta(db, models.Asset, "assets", user_id, delta, [_asset_row(a, user_id) for a in delta.upserts])
 
 # Reports
+REPORT_SUMMARY_COLUMNS = (
+    models.Report.id, models.Report.timestamp, models.Report.summary,
+    models.Report.score, models.Report.model_name,
+)
+
 def get_reports(db: Session, user_id: int):
     return db.query(models.Report).filter(models.Report.user_id == user_id).order_by(models.Report.timestamp.desc()).all()
 
+def get_report_summaries(db: Session, user_id: int):
+    # Never reads (or decompresses) the content column
+    return db.query(*REPORT_SUMMARY_COLUMNS).filter(models.Report.user_id == user_id).order_by(models.Report.timestamp.desc()).all()
+
+def get_report(db: Session, report_id: str, user_id: int):
+    return db.query(models.Report).filter(models.Report.id == report_id, models.Report.user_id == user_id).first()
+
+class MissingReportContent(ValueError):
+    """A report that is not stored yet was sent without its content."""
+    def __init__(self, report_ids: list):
+        super().__init__(f"Reports without content must already exist: {report_ids}")
+        self.report_ids = report_ids
+
+def _check_report_content(db: Session, reports: list, user_id: int):
+    # Omitting content means "keep the stored body", which only works for a known id
+    ids = [r.id for r in reports if r.content is None]
+    if not ids:
+        return
+    existing = {rid for (rid,) in db.query(models.Report.id).filter(models.Report.user_id == user_id, models.Report.id.in_(ids))}
+    missing = [rid for rid in ids if rid not in existing]
+    if missing:
+        raise MissingReportContent(missing)
+
+def _report_row(report: schemas.ReportCreate, user_id: int) -> dict:
+    row = dict(report.dict(), user_id=user_id)
+    if row["content"] is None:
+        del row["content"] # Keep the stored body
+    return row
+
 def create_report(db: Session, report: schemas.ReportCreate, user_id: int):
+    if report.content is None:
+        raise MissingReportContent([report.id])
     db_report = models.Report(**report.dict(), user_id=user_id)
     db.add(db_report)
+    _bump_sync_version(db, user_id, "reports")
     db.commit()
     db.refresh(db_report)
     return db_report
 
 def save_reports_bulk(db: Session, reports: list[schemas.ReportCreate], user_id: int):
-    db.query(models.Report).filter(models.Report.user_id == user_id).delete()
-    for r in reports:
-        db_report = models.Report(**r.dict(), user_id=user_id)
-        db.add(db_report)
+    # Upsert by id in one transaction instead of deleting and re-adding everything
+    _check_report_content(db, reports, user_id)
+    ids = [r.id for r in reports]
+    db.query(models.Report).filter(
+        models.Report.user_id == user_id,
+        models.Report.id.notin_(ids)
+    ).delete(synchronize_session=False)
+    _upsert_rows(db, models.Report, [_report_row(r, user_id) for r in reports], owner="user_id")
+    _bump_sync_version(db, user_id, "reports")
     db.commit()
 
+def apply_reports_delta(db: Session, delta: schemas.ReportDelta, user_id: int) -> dict:
+    _check_report_content(db, delta.upserts, user_id)
+    return _apply_delta(db, models.Report, "reports", user_id, delta, [_report_row(r, user_id) for r in delta.upserts])
+
 # Goals
 def get_goal(db: Session, user_id: int):
     return db.query(models.Goal).filter(models.Goal.user_id == user_id).first()
@@ -134,6 +277,7 @@ def save_models_bulk(db: Session, configs: list[schemas.ModelConfigCreate]):
         db_config = models.ModelConfig(**c.dict())
         db.add(db_config)
     db.commit()
+    model_registry.invalidate()
 
 # Strategies
 def get_strategies(db: Session, user_id: int):
@@ -166,17 +310,37 @@ def get_executions(db: Session, strategy_id: int):
 def get_execution(db: Session, execution_id: int):
     return db.query(models.StrategyExecution).filter(models.StrategyExecution.id == execution_id).first()
 
-def create_execution(db: Session, strategy_id: int):
-    db_exec = models.StrategyExecution(strategy_id=strategy_id)
+def create_execution(db: Session, strategy_id: int, snapshot_version: str = None, params_hash: str = None, cache_hit: bool = False):
+    db_exec = models.StrategyExecution(
+        strategy_id=strategy_id,
+        snapshot_version=snapshot_version,
+        params_hash=params_hash,
+        cache_hit=cache_hit
+    )
     db.add(db_exec)
     db.commit()
     db.refresh(db_exec)
     return db_exec
 
+def get_execution_cache_counts(db: Session, user_id: int):
+    # The user's executions only, through the strategy indexes
+    total, cached = db.query(
+        func.count(models.StrategyExecution.id),
+        func.sum(case((models.StrategyExecution.cache_hit == True, 1), else_=0))
+    ).join(models.Strategy, models.Strategy.id == models.StrategyExecution.strategy_id).filter(
+        models.Strategy.user_id == user_id
+    ).one()
+    return {"executions_total": total or 0, "executions_cached": cached or 0}
+
+def update_execution_analysis(db: Session, execution_id: int, analysis: str, commit: bool = True):
+    db.query(models.StrategyExecution).filter(models.StrategyExecution.id == execution_id).update(
+        {models.StrategyExecution.ai_analysis: analysis}, synchronize_session=False
+    )
+    if commit:
+        db.commit()
+
 def delete_execution(db: Session, execution_id: int):
-    # Recommendations should be deleted by cascade or manually
-    # Assuming cascade not set up perfectly in DB, delete manually
-    db.query(models.StockRecommendation).filter(models.StockRecommendation.execution_id == execution_id).delete()
+    # Recommendations and their outcomes are removed by ON DELETE CASCADE
     db.query(models.StrategyExecution).filter(models.StrategyExecution.id == execution_id).delete()
     db.commit()
 
@@ -190,6 +354,50 @@ def get_recommendations(db: Session, strategy_id: int = None, execution_id: int
     
     return q.order_by(models.StockRecommendation.date.desc()).all()
 
+def get_tracking_page(db: Session, user_id: int, limit: int, execution_id: int = None, strategy_id: int = None, after: tuple = None):
+    """
+    One page of (recommendation, execution created_at, strategy name, outcome)
+    rows, newest first. Keyset pagination on (execution created_at,
+    recommendation id): `after` is the (created_at, id) of the last row of the
+    previous page, so deep pages cost the same as the first one.
+    """
+    query = db.query(
+        models.StockRecommendation,
+        models.StrategyExecution.created_at,
+        models.Strategy.name,
+        models.RecommendationOutcome
+    ).join(
+        models.StrategyExecution, models.StockRecommendation.execution_id == models.StrategyExecution.id
+    ).join(
+        models.Strategy, models.StrategyExecution.strategy_id == models.Strategy.id
+    ).outerjoin(
+        models.RecommendationOutcome, models.RecommendationOutcome.recommendation_id == models.StockRecommendation.id
+    ).filter(
+        models.Strategy.user_id == user_id
+    )
+
+    if execution_id:
+        query = query.filter(models.StockRecommendation.execution_id == execution_id)
+    elif strategy_id:
+        query = query.filter(models.StrategyExecution.strategy_id == strategy_id)
+
+    if after:
+        cursor_time, cursor_id = after
+        query = query.filter(
+            or_(
+                models.StrategyExecution.created_at < cursor_time,
+                and_(
+                    models.StrategyExecution.created_at == cursor_time,
+                    models.StockRecommendation.id < cursor_id
+                )
+            )
+        )
+
+    return query.order_by(
+        models.StrategyExecution.created_at.desc(),
+        models.StockRecommendation.id.desc()
+    ).limit(limit).all()
+
 def create_recommendation(db: Session, recommendation: schemas.StockRecommendationCreate):
     db_rec = models.StockRecommendation(**recommendation.dict())
     db.add(db_rec)
@@ -197,9 +405,180 @@ def create_recommendation(db: Session, recommendation: schemas.StockRecommendati
     db.refresh(db_rec)
     return db_rec
 
-def save_recommendations_bulk(db: Session, recommendations: list[schemas.StockRecommendationCreate], strategy_id: int):
-    # Optional: Clear old recommendations for this strategy/date? 
-    # For now, just append. Or maybe clear today's before appending to avoid duplicates.
-    # Let's assume the caller handles logic or we just append.
-    for r in recommendations:
-        create_recommendation(db, r)
+def save_recommendations_bulk(db: Session, recommendations: list[schemas.StockRecommendationCreate], commit: bool = True):
+    """
+    Insert all recommendations with one executemany (RETURNING ids in input
+    order) and at most one commit. Returns plain dicts shaped like
+    schemas.StockRecommendation, so callers need no per-row refresh.
+    """
+    if not recommendations:
+        return []
+    now = datetime.datetime.utcnow()
+    rows = [dict(r.dict(), created_at=now) for r in recommendations]
+    stmt = insert(models.StockRecommendation).returning(
+        models.StockRecommendation.id, sort_by_parameter_order=True
+    )
+    ids = db.execute(stmt, rows).scalars().all()
+    if commit:
+        db.commit()
+    return [dict(row, id=rec_id) for row, rec_id in zip(rows, ids)]
+
+def create_execution_with_recommendations(db: Session, strategy_id: int, recommendations: list[dict], **screen_info):
+    # Execution row + all of its recommendations in a single transaction
+    db_exec = models.StrategyExecution(strategy_id=strategy_id, **screen_info)
+    db.add(db_exec)
+    db.flush() # Assigns db_exec.id without committing
+    exec_id = db_exec.id
+    recs_in = [
+        schemas.StockRecommendationCreate(strategy_id=strategy_id, execution_id=exec_id, **r)
+        for r in recommendations
+    ]
+    saved = save_recommendations_bulk(db, recs_in, commit=False)
+    db.commit()
+    return exec_id, saved
+
+# Recommendation Outcomes
+def get_recommendations_pending_outcome(db: Session, limit: int = 5000):
+    # Recommendations without an outcome row yet, or whose T+20 window is still
+    # open; least recently updated first so every open row gets a turn
+    return db.query(models.StockRecommendation).outerjoin(
+        models.RecommendationOutcome,
+        models.RecommendationOutcome.recommendation_id == models.StockRecommendation.id
+    ).filter(
+        or_(
+            models.RecommendationOutcome.recommendation_id == None,
+            models.RecommendationOutcome.is_closed == False
+        )
+    ).order_by(
+        models.RecommendationOutcome.updated_at.asc().nulls_first(),
+        models.StockRecommendation.id
+    ).limit(limit).all()
+
+def close_outcomes(db: Session, recommendations: list, commit: bool = True) -> int:
+    """
+    Close the outcomes of [(recommendation_id, symbol)] whose history could
+    not complete them (suspended / delisted symbols, fetches that keep
+    failing). Existing rows keep what was observed; recommendations without
+    a row get an empty closed one.
+    """
+    if not recommendations:
+        return 0
+    O = models.RecommendationOutcome
+    now = datetime.datetime.utcnow()
+    ids = [rec_id for rec_id, _ in recommendations]
+    existing = {rec_id for (rec_id,) in db.query(O.recommendation_id).filter(O.recommendation_id.in_(ids))}
+    db.query(O).filter(O.recommendation_id.in_(ids), O.is_closed == False).update(
+        {"is_closed": True, "updated_at": now}, synchronize_session=False
+    )
+    db.add_all([
+        O(recommendation_id=rec_id, symbol=symbol, is_closed=True, days_observed=0, updated_at=now)
+        for rec_id, symbol in recommendations if rec_id not in existing
+    ])
+    if commit:
+        db.commit()
+    return len(recommendations)
+
+def save_outcomes(db: Session, rows: list, commit: bool = True):
+    # rows: [(recommendation_id, symbol, values_dict)], written in one commit
+    now = datetime.datetime.utcnow()
+    for recommendation_id, symbol, values in rows:
+        db.merge(models.RecommendationOutcome(
+            recommendation_id=recommendation_id,
+            symbol=symbol,
+            updated_at=now,
+            **values
+        ))
+    if commit:
+        db.commit()
+
+OUTCOME_HORIZON_COLUMNS = {
+    "t1": models.RecommendationOutcome.return_t1,
+    "t3": models.RecommendationOutcome.return_t3,
+    "t5": models.RecommendationOutcome.return_t5,
+    "t20": models.RecommendationOutcome.return_t20,
+}
+
+def get_tracking_summary(db: Session, user_id: int, horizon: str = "t5", strategy_id: int = None):
+    """
+    Win rate, average and median return per strategy and per execution for the
+    given outcome horizon, computed in a single SQL statement. Medians use
+    ROW_NUMBER / COUNT window functions partitioned by strategy and execution.
+    """
+    ret_col = OUTCOME_HORIZON_COLUMNS[horizon]
+
+    base = select(
+        models.StrategyExecution.strategy_id.label("strategy_id"),
+        models.Strategy.name.label("strategy_name"),
+        models.StockRecommendation.execution_id.label("execution_id"),
+        models.StrategyExecution.created_at.label("created_at"),
+        ret_col.label("ret"),
+    ).join(
+        models.StrategyExecution, models.StockRecommendation.execution_id == models.StrategyExecution.id
+    ).join(
+        models.Strategy, models.StrategyExecution.strategy_id == models.Strategy.id
+    ).join(
+        models.RecommendationOutcome, models.RecommendationOutcome.recommendation_id == models.StockRecommendation.id
+    ).where(
+        models.Strategy.user_id == user_id,
+        ret_col.isnot(None)
+    )
+    if strategy_id:
+        base = base.where(models.StrategyExecution.strategy_id == strategy_id)
+    base = base.subquery("base")
+
+    ranked = select(
+        base,
+        func.row_number().over(partition_by=base.c.strategy_id, order_by=base.c.ret).label("s_rn"),
+        func.count().over(partition_by=base.c.strategy_id).label("s_cnt"),
+        func.row_number().over(partition_by=base.c.execution_id, order_by=base.c.ret).label("e_rn"),
+        func.count().over(partition_by=base.c.execution_id).label("e_cnt"),
+    ).subquery("ranked")
+
+    def aggregates(rn, cnt):
+        # Median = mean of the middle one (odd count) or two (even count) rows
+        middle = or_(rn == (cnt + 1) // 2, rn == (cnt + 2) // 2)
+        return (
+            func.count().label("count"),
+            (func.avg(case((ranked.c.ret > 0, 1.0), else_=0.0)) * 100).label("win_rate"),
+            func.avg(ranked.c.ret).label("avg_return"),
+            func.avg(case((middle, ranked.c.ret), else_=None)).label("median_return"),
+        )
+
+    per_strategy = select(
+        literal("strategy").label("level"),
+        ranked.c.strategy_id,
+        ranked.c.strategy_name,
+        null().label("execution_id"),
+        null().label("created_at"),
+        *aggregates(ranked.c.s_rn, ranked.c.s_cnt)
+    ).group_by(ranked.c.strategy_id, ranked.c.strategy_name)
+
+    per_execution = select(
+        literal("execution").label("level"),
+        ranked.c.strategy_id,
+        ranked.c.strategy_name,
+        ranked.c.execution_id,
+        func.max(ranked.c.created_at).label("created_at"),
+        *aggregates(ranked.c.e_rn, ranked.c.e_cnt)
+    ).group_by(ranked.c.strategy_id, ranked.c.strategy_name, ranked.c.execution_id)
+
+    rows = db.execute(union_all(per_strategy, per_execution)).all()
+
+    summary = {"horizon": horizon, "strategies": [], "executions": []}
+    for row in rows:
+        item = {
+            "strategy_id": row.strategy_id,
+            "strategy_name": row.strategy_name,
+            "execution_id": row.execution_id,
+            "execution_date": str(row.created_at)[:16] if row.created_at else None,
+            "count": row.count,
+            "win_rate": round(row.win_rate or 0, 2),
+            "avg_return": round(row.avg_return or 0, 2),
+            "median_return": round(row.median_return or 0, 2),
+        }
+        if row.level == "strategy":
+            summary["strategies"].append(item)
+        else:
+            summary["executions"].append(item)
+    summary["executions"].sort(key=lambda x: x["execution_date"] or "", reverse=True)
+    return summary
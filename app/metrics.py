@@ -0,0 +1,201 @@
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+# In-process instrumentation rendered as Prometheus text on /metrics.
+#
+# Modules record what they do through a few calls:
+#   inc / observe / set_gauge     counters, histograms, gauges with labels
+#   timer(name, **labels)         times a block into a histogram
+#   upstream(source, endpoint)    times one call to an external source and
+#                                 counts it as ok / error (exception or a
+#                                 non-2xx status passed to call.check)
+#   register_collector(fn)        pulled at scrape time, for numbers a
+#                                 module already keeps (cache hit counts,
+#                                 queue depths)
+# Every uvicorn worker keeps its own registry: scrape each worker, or run a
+# single one, for complete numbers.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_families = {} # name -> {"type", "help", "buckets", "samples": {label tuple -> value}}
+_collectors = []
+
+def _family(name: str, kind: str, help_text: str = "", buckets=None) -> dict:
+    family = _families.get(name)
+    if family is None:
+        family = _families[name] = {"type": kind, "help": help_text, "buckets": buckets, "samples": {}}
+    return family
+
+def counter(name: str, help_text: str):
+    with _lock:
+        _family(name, "counter", help_text)
+
+def gauge(name: str, help_text: str):
+    with _lock:
+        _family(name, "gauge", help_text)
+
+def histogram(name: str, help_text: str, buckets=LATENCY_BUCKETS):
+    with _lock:
+        _family(name, "histogram", help_text, tuple(sorted(buckets)))
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        samples = _family(name, "counter")["samples"]
+        key = _key(labels)
+        samples[key] = samples.get(key, 0) + value
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _family(name, "gauge")["samples"][_key(labels)] = value
+
+def observe(name: str, value: float, **labels):
+    with _lock:
+        family = _family(name, "histogram", buckets=LATENCY_BUCKETS)
+        buckets = family["buckets"]
+        entry = family["samples"].get(_key(labels))
+        if entry is None:
+            entry = family["samples"][_key(labels)] = {"counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                entry["counts"][i] += 1
+                break
+        entry["sum"] += value
+        entry["count"] += 1
+
+@contextmanager
+def timer(name: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+class UpstreamCall:
+    def __init__(self):
+        self.error = None
+
+    def check(self, status_code: int):
+        """Count a non-2xx answer as an error even though nothing was raised."""
+        if not 200 <= status_code < 300:
+            self.error = f"http_{status_code}"
+
+    def fail(self, reason: str):
+        self.error = reason
+
+counter("upstream_requests_total", "Calls to external data sources by outcome (ok / error)")
+counter("upstream_errors_total", "Failed calls to external data sources by reason")
+histogram("upstream_request_duration_seconds", "Latency of calls to external data sources")
+
+@contextmanager
+def upstream(source: str, endpoint: str = ""):
+    call = UpstreamCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        call.error = call.error or type(e).__name__
+        raise
+    finally:
+        observe("upstream_request_duration_seconds", time.perf_counter() - started, source=source, endpoint=endpoint)
+        inc("upstream_requests_total", source=source, endpoint=endpoint, outcome="error" if call.error else "ok")
+        if call.error:
+            inc("upstream_errors_total", source=source, endpoint=endpoint, reason=call.error)
+
+def timed_upstream(source: str, endpoint: str, fn):
+    """fn wrapped so every call is recorded with upstream()."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with upstream(source, endpoint):
+            return fn(*args, **kwargs)
+    wrapper._upstream_timed = True
+    return wrapper
+
+def register_collector(fn):
+    """
+    fn() -> iterable of (name, type, help, [(labels dict, value), ...]),
+    called on every scrape. Families with the same name are merged.
+    """
+    with _lock:
+        if fn not in _collectors:
+            _collectors.append(fn)
+    return fn
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(key, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _number(value) -> str:
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render() -> str:
+    with _lock:
+        families = {
+            name: dict(f, samples={k: (dict(v, counts=list(v["counts"])) if isinstance(v, dict) else v)
+                                   for k, v in f["samples"].items()})
+            for name, f in _families.items()
+        }
+        collectors = list(_collectors)
+
+    for collect in collectors:
+        try:
+            for name, kind, help_text, samples in collect():
+                family = families.setdefault(name, {"type": kind, "help": help_text, "buckets": None, "samples": {}})
+                for labels, value in samples:
+                    family["samples"][_key(labels)] = value
+        except Exception as e:
+            print(f"Metrics collector {getattr(collect, '__qualname__', collect)} failed: {e}", flush=True)
+
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        if not family["samples"]:
+            continue
+        if family["help"]:
+            lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for key, value in sorted(family["samples"].items()):
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(family["buckets"], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(key, (('le', _number(float(bound))),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(key, (('le', '+Inf'),))} {value['count']}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(round(value['sum'], 6))}")
+            lines.append(f"{name}_count{_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+def cache_samples(name: str, hits: int, misses: int, extra: dict = None) -> list:
+    """Collector rows for one cache: hits, misses and hit ratio, plus any extra counters."""
+    lookups = hits + misses
+    rows = [
+        ("cache_hits_total", "counter", "Cache lookups answered from the cache", [({"cache": name}, hits)]),
+        ("cache_misses_total", "counter", "Cache lookups that missed", [({"cache": name}, misses)]),
+        ("cache_hit_ratio", "gauge", "hits / (hits + misses) since process start", [({"cache": name}, round(hits / lookups, 4) if lookups else 0.0)]),
+    ]
+    for field, value in (extra or {}).items():
+        rows.append((f"cache_{field}_total", "counter", f"Cache {field.replace('_', ' ')}", [({"cache": name}, value)]))
+    return rows
+
+def reset():
+    # Tests only
+    with _lock:
+        for family in _families.values():
+            family["samples"].clear()
@@ -0,0 +1,202 @@
+import os
+import datetime
+import contextlib
+from sqlalchemy import inspect, text, bindparam
+from sqlalchemy.schema import CreateTable
+
+from . import models # Registers all tables on Base.metadata
+from . import database
+from .database import Base
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Lightweight schema migrations for the SQLite database.
+#
+# Every migration is (version, description, fn(conn)) and runs once, in its own
+# transaction, in version order. Applied versions are recorded in the
+# schema_migrations table. Migrations must be idempotent (IF NOT EXISTS,
+# column checks) because databases created before this runner existed already
+# contain part of the schema. Append new migrations, never edit applied ones.
+#
+# Every uvicorn worker runs the migrations at startup. An exclusive lock on
+# <database>.migrate.lock lets one process migrate at a time; the others
+# re-read the applied versions once they hold it and find nothing to do.
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+def _column_names(conn, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    if column not in _column_names(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+def _create_index(conn, name: str, table: str, columns: tuple):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+def _baseline(conn):
+    # Tables that do not exist yet (fresh database, or tables added since it was created)
+    Base.metadata.create_all(bind=conn)
+
+def _screen_cache_columns(conn):
+    _add_column(conn, "strategy_executions", "snapshot_version", "VARCHAR")
+    _add_column(conn, "strategy_executions", "params_hash", "VARCHAR")
+    _add_column(conn, "strategy_executions", "cache_hit", "BOOLEAN DEFAULT 0")
+
+# Indexes backing the hot read paths:
+#   tracking      strategies.user_id -> executions by created_at -> recommendations by execution
+#   executions    strategy_id filter, created_at sort
+#   reports       user_id filter, timestamp sort
+HOT_PATH_INDEXES = (
+    ("ix_strategies_user_id", "strategies", ("user_id",)),
+    ("ix_strategy_executions_created_at_id", "strategy_executions", ("created_at", "id")),
+    ("ix_strategy_executions_strategy_id_created_at", "strategy_executions", ("strategy_id", "created_at")),
+    ("ix_stock_recommendations_execution_id_id", "stock_recommendations", ("execution_id", "id")),
+    ("ix_reports_user_id_timestamp", "reports", ("user_id", "timestamp")),
+    ("ix_assets_user_id", "assets", ("user_id",)),
+    ("ix_goals_user_id", "goals", ("user_id",)),
+)
+
+def _hot_path_indexes(conn):
+    for name, table, columns in HOT_PATH_INDEXES:
+        _create_index(conn, name, table, columns)
+    # Refresh planner statistics for the new indexes
+    conn.execute(text("ANALYZE"))
+
+def _sync_versions(conn):
+    models.SyncVersion.__table__.create(bind=conn, checkfirst=True)
+
+def _compress_report_content(conn, batch_size: int = 500):
+    # Rewrite plain-text report bodies through models.CompressedText
+    reports = models.Report.__table__
+    stmt = reports.update().where(reports.c.id == bindparam("rid")).values(content=bindparam("body"))
+    # Paged by id so only one batch of bodies is in memory at a time
+    last_id = ""
+    while True:
+        rows = conn.execute(
+            text("SELECT id, content FROM reports WHERE typeof(content) = 'text' AND id > :last ORDER BY id LIMIT :n"),
+            {"last": last_id, "n": batch_size}
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(stmt, [{"rid": rid, "body": body} for rid, body in rows])
+        last_id = rows[-1][0]
+
+# Child tables whose foreign keys became ON DELETE CASCADE, parents first
+CASCADE_TABLES = (
+    "strategies", "strategy_executions", "stock_recommendations", "recommendation_outcomes",
+    "assets", "reports", "goals", "sync_versions",
+)
+
+def _has_cascades(conn, table) -> bool:
+    fks = inspect(conn).get_foreign_keys(table.name)
+    cascading = [fk for fk in fks if (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE"]
+    return len(cascading) == len(fks) == len(table.foreign_keys)
+
+def _rebuild_table(conn, table):
+    # SQLite cannot ALTER a constraint: create the new table, copy, drop, rename
+    # (https://www.sqlite.org/lang_altertable.html#otheralter). Runs with
+    # foreign_keys OFF so dropping the old table does not fire cascades.
+    tmp = f"_rebuild_{table.name}"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    ddl = ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {tmp} (", 1)
+    conn.execute(text(f"DROP TABLE IF EXISTS {tmp}")) # Left over from an interrupted run
+    conn.execute(text(ddl))
+    columns = ", ".join(c.name for c in table.columns if c.name in _column_names(conn, table.name))
+    conn.execute(text(f"INSERT INTO {tmp} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {tmp} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+def _cascading_foreign_keys(conn):
+    models.StrategyDailyStat.__table__.create(bind=conn, checkfirst=True)
+    for name in CASCADE_TABLES:
+        table = Base.metadata.tables[name]
+        # Rows whose parent is already gone would fail the constraint; they
+        # were unreachable anyway
+        for fk in table.foreign_keys:
+            column, parent = fk.parent.name, fk.column
+            conn.execute(text(
+                f"DELETE FROM {name} WHERE {column} IS NOT NULL AND {column} NOT IN "
+                f"(SELECT {parent.name} FROM {parent.table.name})"
+            ))
+        if not _has_cascades(conn, table):
+            _rebuild_table(conn, table)
+    violations = conn.execute(text("PRAGMA foreign_key_check")).fetchall()
+    if violations:
+        raise RuntimeError(f"Foreign key violations after rebuild: {violations[:10]}")
+_cascading_foreign_keys.foreign_keys_off = True
+
+def _llm_cache(conn):
+    models.LLMCacheEntry.__table__.create(bind=conn, checkfirst=True)
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "strategy_executions screen cache columns", _screen_cache_columns),
+    (3, "hot-path composite indexes", _hot_path_indexes),
+    (4, "sync_versions table for delta sync", _sync_versions),
+    (5, "compress report content", _compress_report_content),
+    (6, "ON DELETE CASCADE foreign keys and strategy_daily_stats", _cascading_foreign_keys),
+    (7, "llm_cache table", _llm_cache),
+]
+
+def _ensure_migrations_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+            "version INTEGER PRIMARY KEY, description VARCHAR, applied_at VARCHAR)"
+        ))
+
+def get_applied_versions(engine) -> set:
+    _ensure_migrations_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+@contextlib.contextmanager
+def _migration_lock(engine):
+    path = engine.url.database
+    if fcntl is None or not path or path == ":memory:":
+        yield
+        return
+    with open(os.path.abspath(path) + ".migrate.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX) # Blocks while another process migrates
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations in order. Returns the versions applied by this call."""
+    with _migration_lock(engine):
+        return _apply_pending(engine)
+
+def _apply_pending(engine) -> list:
+    applied = get_applied_versions(engine)
+    newly_applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        print(f"Applying migration {version}: {description}", flush=True)
+        with engine.connect() as conn:
+            foreign_keys_off = getattr(fn, "foreign_keys_off", False)
+            if foreign_keys_off:
+                # Only effective outside a transaction
+                conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+                conn.commit()
+            try:
+                with conn.begin():
+                    fn(conn)
+                    conn.execute(
+                        text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                        {"v": version, "d": description, "t": datetime.datetime.utcnow().isoformat()}
+                    )
+            finally:
+                if foreign_keys_off:
+                    conn.exec_driver_sql(f"PRAGMA foreign_keys={database.SQLITE_PRAGMAS['foreign_keys']}")
+                    conn.commit()
+        newly_applied.append(version)
+    return newly_applied
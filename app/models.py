@@ -1,7 +1,47 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, JSON, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, JSON, DateTime, Index, LargeBinary
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codec for new compressed values: "zstd" (if installed) or "zlib"
+COMPRESSION_CODEC = os.environ.get("COMPRESSION_CODEC", "zstd" if zstandard else "zlib")
+
+class CompressedText(TypeDecorator):
+    """
+    Text stored as a compressed BLOB with a one-byte codec tag (b"Z" zlib,
+    b"S" zstd), decompressed when the column is loaded. Plain TEXT values
+    written before compression are returned unchanged.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        raw = value.encode('utf-8')
+        if COMPRESSION_CODEC == "zstd" and zstandard:
+            return b"S" + zstandard.ZstdCompressor(level=3).compress(raw)
+        return b"Z" + zlib.compress(raw, 6)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        tag, body = value[:1], value[1:]
+        if tag == b"Z":
+            return zlib.decompress(body).decode('utf-8')
+        if tag == b"S":
+            if zstandard is None:
+                raise RuntimeError("zstd-compressed value but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().decompress(body).decode('utf-8')
+        return bytes(value).decode('utf-8')
 
 class User(Base):
     __tablename__ = "users"
@@ -28,7 +68,7 @@ class Asset(Base):
     cost_price = Column(Float)
     current_price = Column(Float) # Can be updated
     currency = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     owner = relationship("User", back_populates="assets")
 
@@ -38,13 +78,28 @@ class Report(Base):
     id = Column(String, primary_key=True, index=True)
     timestamp = Column(String) # Or DateTime, but keeping String to match frontend ISO format for now
     summary = Column(Text)
-    content = Column(Text)
+    content = Column(CompressedText) # Full AI output, only loaded for the detail view
     score = Column(Integer)
     model_name = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
 
     owner = relationship("User", back_populates="reports")
 
+    __table_args__ = (
+        # A user's reports, newest first
+        Index("ix_reports_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+class SyncVersion(Base):
+    __tablename__ = "sync_versions"
+
+    # Per-user version counter of a synced collection ("assets", "reports").
+    # Bumped by every write; delta writes must name the version they were based on.
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    collection = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class Goal(Base):
     __tablename__ = "goals"
 
@@ -52,7 +107,7 @@ class Goal(Base):
     target_profit = Column(Float)
     target_date = Column(String)
     available_capital = Column(Float)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     owner = relationship("User", back_populates="goals")
 
@@ -90,27 +145,38 @@ class Strategy(Base):
     schedule_time = Column(String, nullable=True) # "09:30"
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
-    executions = relationship("StrategyExecution", back_populates="strategy")
+    executions = relationship("StrategyExecution", back_populates="strategy", passive_deletes=True)
 
 class StrategyExecution(Base):
     __tablename__ = "strategy_executions"
 
     id = Column(Integer, primary_key=True, index=True)
-    strategy_id = Column(Integer, ForeignKey("strategies.id"))
+    strategy_id = Column(Integer, ForeignKey("strategies.id", ondelete="CASCADE"))
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     ai_analysis = Column(Text, nullable=True) # Analysis for this batch
+    # Screen result cache bookkeeping
+    snapshot_version = Column(String, nullable=True) # Spot snapshot the results came from
+    params_hash = Column(String, nullable=True)
+    cache_hit = Column(Boolean, default=False)
 
     strategy = relationship("Strategy", back_populates="executions")
-    recommendations = relationship("StockRecommendation", back_populates="execution")
+    recommendations = relationship("StockRecommendation", back_populates="execution", passive_deletes=True)
+
+    __table_args__ = (
+        # Tracking pages walk executions newest first (keyset on created_at, id)
+        Index("ix_strategy_executions_created_at_id", "created_at", "id"),
+        # Executions of one strategy, newest first
+        Index("ix_strategy_executions_strategy_id_created_at", "strategy_id", "created_at"),
+    )
 
 class StockRecommendation(Base):
     __tablename__ = "stock_recommendations"
 
     id = Column(Integer, primary_key=True, index=True)
-    strategy_id = Column(Integer, ForeignKey("strategies.id")) # Keep for legacy/direct query if needed, or make nullable
-    execution_id = Column(Integer, ForeignKey("strategy_executions.id"), nullable=True)
+    strategy_id = Column(Integer, ForeignKey("strategies.id", ondelete="CASCADE"), index=True) # Keep for legacy/direct query if needed, or make nullable
+    execution_id = Column(Integer, ForeignKey("strategy_executions.id", ondelete="CASCADE"), nullable=True)
     symbol = Column(String, index=True)
     name = Column(String)
     date = Column(String, index=True) # YYYY-MM-DD
@@ -128,3 +194,79 @@ class StockRecommendation(Base):
 
     # strategy = relationship("Strategy", back_populates="recommendations") # Remove back_populates to avoid conflict if we removed it from Strategy
     execution = relationship("StrategyExecution", back_populates="recommendations")
+    outcome = relationship("RecommendationOutcome", back_populates="recommendation", uselist=False, passive_deletes=True)
+
+    __table_args__ = (
+        # Recommendations of one execution in keyset order
+        Index("ix_stock_recommendations_execution_id_id", "execution_id", "id"),
+    )
+
+class RecommendationOutcome(Base):
+    __tablename__ = "recommendation_outcomes"
+
+    # One row per recommendation, filled in by the outcome tracker job
+    recommendation_id = Column(Integer, ForeignKey("stock_recommendations.id", ondelete="CASCADE"), primary_key=True)
+    symbol = Column(String, index=True)
+    base_date = Column(String, index=True) # Trading day the returns are measured from (T)
+    base_close = Column(Float)
+
+    # Close-to-close returns in %, NULL until that trading day has closed
+    return_t1 = Column(Float, nullable=True)
+    return_t3 = Column(Float, nullable=True)
+    return_t5 = Column(Float, nullable=True)
+    return_t20 = Column(Float, nullable=True)
+
+    # Max favourable / adverse excursion (intraday high / low vs base_close, %)
+    # over the days observed so far, up to T+20
+    max_favorable = Column(Float, nullable=True)
+    max_adverse = Column(Float, nullable=True)
+
+    days_observed = Column(Integer, default=0)
+    last_close = Column(Float, nullable=True)
+    last_close_date = Column(String, nullable=True)
+    is_closed = Column(Boolean, default=False, index=True) # True once T+20 is known
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    recommendation = relationship("StockRecommendation", back_populates="outcome")
+
+class StrategyDailyStat(Base):
+    __tablename__ = "strategy_daily_stats"
+
+    # Roll-up of executions aged out by the retention job, one row per strategy
+    # and execution day. Stored as sums / counts so batches can be added in
+    # any order; averages are sum / n.
+    strategy_id = Column(Integer, ForeignKey("strategies.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(String, primary_key=True) # YYYY-MM-DD
+    executions = Column(Integer, default=0)
+    recommendations = Column(Integer, default=0)
+    sum_change_percent = Column(Float, default=0)
+
+    sum_return_t1 = Column(Float, default=0)
+    n_return_t1 = Column(Integer, default=0)
+    wins_t1 = Column(Integer, default=0)
+    sum_return_t3 = Column(Float, default=0)
+    n_return_t3 = Column(Integer, default=0)
+    wins_t3 = Column(Integer, default=0)
+    sum_return_t5 = Column(Float, default=0)
+    n_return_t5 = Column(Integer, default=0)
+    wins_t5 = Column(Integer, default=0)
+    sum_return_t20 = Column(Float, default=0)
+    n_return_t20 = Column(Integer, default=0)
+    wins_t20 = Column(Integer, default=0)
+
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    # Completion responses keyed by sha256(model, canonical messages, temperature);
+    # see services/llm_cache.py. Least recently used rows are evicted first.
+    key = Column(String, primary_key=True)
+    model_name = Column(String)
+    response = Column(CompressedText) # Raw JSON body of the completion
+    size_bytes = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
@@ -0,0 +1,141 @@
+import os
+import gzip
+import json
+import hashlib
+from starlette.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# App-wide response layer.
+#
+# FastJSONResponse renders with orjson when installed (several times faster
+# than json.dumps, numpy scalars / arrays supported, NaN -> null instead of
+# a 500). ResponseLayerMiddleware adds, for complete (non-streaming)
+# responses:
+#   - a weak ETag on GET 200s that do not set one, answering a matching
+#     If-None-Match with 304 and no body
+#   - br / gzip compression negotiated from Accept-Encoding, for
+#     compressible types above COMPRESS_MIN_BYTES
+# Streaming responses (SSE) pass through untouched.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Close to gzip -6 speed, noticeably smaller output
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+def _default(value):
+    # Whatever orjson does not know natively (pandas Timestamp, Decimal, ...)
+    return str(value)
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def make_etag(body: bytes) -> str:
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" match
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def choose_encoding(accept_encoding: str):
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class ResponseLayerMiddleware:
+    def __init__(self, app, min_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        method = scope["method"]
+        start = None
+        streaming = False
+
+        async def wrapped_send(message):
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message # Held until the body shows whether it is complete
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Streaming: send as-is from here on
+                streaming = True
+                await send(start)
+                await send(message)
+                return
+            await self._finish(start, message.get("body", b""), method, request_headers, send)
+
+        await self.app(scope, receive, wrapped_send)
+
+    async def _finish(self, start, body: bytes, method: str, request_headers: Headers, send):
+        headers = MutableHeaders(raw=list(start["headers"]))
+        status = start["status"]
+
+        if method == "GET" and status == 200:
+            etag = headers.get("etag")
+            if etag is None and "no-store" not in headers.get("cache-control", ""):
+                etag = make_etag(body)
+                headers["ETag"] = etag
+            if etag and etag_matches(request_headers.get("if-none-match", ""), etag):
+                for name in ("content-length", "content-type"):
+                    if name in headers:
+                        del headers[name]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        content_type = headers.get("content-type", "")
+        if (len(body) >= self.min_size and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES)):
+            encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+            headers.add_vary_header("Accept-Encoding")
+            if encoding:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
@@ -1,20 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from .. import schemas, crud, auth, database
+from .. import schemas, async_crud, auth, database
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(auth.get_db)):
-    user = crud.get_user(db, form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(auth.get_async_db)):
+    user = await async_crud.get_user(db, form_data.username)
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Upgrade the stored hash when BCRYPT_ROUNDS changed since it was created
+    if auth.password_needs_rehash(user.hashed_password):
+        new_hash = await auth.get_password_hash_async(form_data.password)
+        await async_crud.set_password_hash(db, user.id, new_hash)
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
@@ -22,11 +26,11 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register", response_model=schemas.User)
-async def register_user(user: schemas.UserCreate, db: Session = Depends(auth.get_db)):
-    db_user = crud.get_user(db, username=user.username)
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(auth.get_async_db)):
+    db_user = await async_crud.get_user(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user, role="user")
+    return await async_crud.create_user(db=db, user=user, role="user")
 
 @router.get("/me", response_model=schemas.User)
 async def read_users_me(current_user: schemas.User = Depends(auth.get_current_active_user)):
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from .. import schemas, crud, auth, models
-from ..auth import get_db
+from .. import schemas, async_crud, crud, auth, models
+from ..auth import get_async_db
 
 router = APIRouter(prefix="/api", tags=["data"])
 
 # Assets
+SYNC_VERSION_HEADER = "X-Sync-Version"
+
+def missing_content(e: crud.MissingReportContent):
+    return HTTPException(status_code=422, detail={"message": "New reports need content", "report_ids": e.report_ids})
+
+def sync_conflict(e: crud.SyncConflict):
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Stale base_version, reload and retry", "current_version": e.current_version}
+    )
+
 @router.get("/assets", response_model=List[schemas.AssetBase])
-def read_assets(current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    assets = crud.get_assets(db, current_user.id)
+async def read_assets(response: Response, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    # Version first: if a write lands in between, the client holds an older
+    # version and its next delta gets a 409 instead of silently overwriting
+    version = await async_crud.get_sync_version(db, current_user.id, "assets")
+    response.headers[SYNC_VERSION_HEADER] = str(version)
+    assets = await async_crud.get_assets(db, current_user.id)
     # Convert DB models to Pydantic schemas (mapping snake_case to camelCase)
     return [
         schemas.AssetBase(
@@ -25,24 +40,70 @@ def read_assets(current_user: models.User = Depends(auth.get_current_active_user
     ]
 
 @router.post("/assets")
-def save_assets(assets: List[schemas.AssetCreate], current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    crud.save_assets_bulk(db, assets, current_user.id)
+async def save_assets(assets: List[schemas.AssetCreate], current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    await async_crud.save_assets_bulk(db, assets, current_user.id)
     return {"status": "success"}
 
+@router.post("/assets/delta", response_model=schemas.SyncResult)
+async def sync_assets(delta: schemas.AssetDelta, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await async_crud.apply_assets_delta(db, delta, current_user.id)
+    except crud.SyncConflict as e:
+        raise sync_conflict(e)
+
 # Reports
-@router.get("/reports", response_model=List[schemas.ReportBase])
-def read_reports(current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    return crud.get_reports(db, current_user.id)
+def not_modified(request: Request, response: Response, etag: str):
+    # Conditional GET: 304 when the client already holds this version
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+@router.get("/reports", response_model=List[schemas.ReportSummary])
+async def read_reports(request: Request, response: Response, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    # Summaries only; bodies come from /reports/{id}. Every report write bumps
+    # the sync version, so it doubles as the list's ETag.
+    version = await async_crud.get_sync_version(db, current_user.id, "reports")
+    response.headers[SYNC_VERSION_HEADER] = str(version)
+    cached = not_modified(request, response, f'W/"reports-{current_user.id}-{version}"')
+    if cached:
+        return cached
+    return await async_crud.get_report_summaries(db, current_user.id)
+
+@router.get("/reports/{report_id}", response_model=schemas.ReportBase)
+async def read_report(report_id: str, request: Request, response: Response, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    version = await async_crud.get_sync_version(db, current_user.id, "reports")
+    cached = not_modified(request, response, f'W/"report-{report_id}-{version}"')
+    if cached:
+        return cached
+    report = await async_crud.get_report(db, report_id, current_user.id)
+    if not report or report.content is None:
+        # No body: rows written before new reports required one
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
 
 @router.post("/reports")
-def save_reports(reports: List[schemas.ReportCreate], current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    crud.save_reports_bulk(db, reports, current_user.id)
+async def save_reports(reports: List[schemas.ReportCreate], current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    try:
+        await async_crud.save_reports_bulk(db, reports, current_user.id)
+    except crud.MissingReportContent as e:
+        raise missing_content(e)
     return {"status": "success"}
 
+@router.post("/reports/delta", response_model=schemas.SyncResult)
+async def sync_reports(delta: schemas.ReportDelta, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await async_crud.apply_reports_delta(db, delta, current_user.id)
+    except crud.SyncConflict as e:
+        raise sync_conflict(e)
+    except crud.MissingReportContent as e:
+        raise missing_content(e)
+
 # Goals
 @router.get("/goals", response_model=schemas.GoalBase)
-def read_goals(current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    goal = crud.get_goal(db, current_user.id)
+async def read_goals(current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    goal = await async_crud.get_goal(db, current_user.id)
     if not goal:
         return {"targetProfit": 0, "targetDate": "", "availableCapital": 0}
     return schemas.GoalBase(
@@ -52,16 +113,16 @@ def read_goals(current_user: models.User = Depends(auth.get_current_active_user)
     )
 
 @router.post("/goals")
-def save_goals(goal: schemas.GoalCreate, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    crud.create_or_update_goal(db, goal, current_user.id)
+async def save_goals(goal: schemas.GoalCreate, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    await async_crud.create_or_update_goal(db, goal, current_user.id)
     return {"status": "success"}
 
 # Models (Admin only)
 @router.get("/models", response_model=List[schemas.ModelConfigBase])
-def read_models(current_user: models.User = Depends(auth.get_current_admin_user), db: Session = Depends(get_db)):
-    return crud.get_models(db)
+async def read_models(current_user: models.User = Depends(auth.get_current_admin_user), db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_models(db)
 
 @router.post("/models")
-def save_models(models: List[schemas.ModelConfigCreate], current_user: models.User = Depends(auth.get_current_admin_user), db: Session = Depends(get_db)):
-    crud.save_models_bulk(db, models)
+async def save_models(models: List[schemas.ModelConfigCreate], current_user: models.User = Depends(auth.get_current_admin_user), db: AsyncSession = Depends(get_async_db)):
+    await async_crud.save_models_bulk(db, models)
     return {"status": "success"}
@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from .. import schemas, crud, models, auth
-from ..services import stock_screener
+from .. import schemas, crud, models, auth, metrics
+from ..services import stock_screener, strategy_optimizer, llm_cache, llm_stream, llm_gateway, model_registry, prompt_context, market_digest
+from ..write_queue import write_queue
 import datetime
 import requests
 import json
 import math
-import akshare as ak
-import pandas as pd
+import os
+import base64
+from ..startup_profile import lazy_import
+ak = lazy_import("akshare", instrument="akshare")
+pd = lazy_import("pandas")
 from ..routers.data import router as data_router # Just to check imports, but we define new router
 
 router = APIRouter(prefix="/api/strategies", tags=["strategies"])
@@ -44,33 +50,80 @@ def execute_strategy(strategy_id: int, current_user: models.User = Depends(auth.
     if not db_strategy:
         raise HTTPException(status_code=404, detail="Strategy not found")
         
-    # 2. Run Logic
-    results = stock_screener.execute_strategy(db_strategy.params)
+    # 2. Run Logic (memoized per spot snapshot + params)
+    results, screen_info = stock_screener.run_screen(db_strategy.params)
     
-    # 3. Create Execution Record
-    db_exec = crud.create_execution(db, strategy_id)
-
-    # 4. Save Recommendations
+    # 3. Create Execution Record + 4. Save Recommendations (one transaction)
     today_str = datetime.datetime.now().strftime("%Y-%m-%d")
-    saved_recs = []
-    
-    for res in results:
-        rec_in = schemas.StockRecommendationCreate(
-            strategy_id=strategy_id,
-            execution_id=db_exec.id,
-            symbol=res['symbol'],
-            name=res['name'],
-            date=today_str,
-            price=res['price'],
-            change_percent=res['change_percent'],
-            volume_ratio=res['volume_ratio'],
-            turnover_rate=res['turnover_rate'],
-            reason=res['reason']
-        )
-        saved_recs.append(crud.create_recommendation(db, rec_in))
+    recs = [
+        {
+            "symbol": res['symbol'],
+            "name": res['name'],
+            "date": today_str,
+            "price": res['price'],
+            "change_percent": res['change_percent'],
+            "volume_ratio": res['volume_ratio'],
+            "turnover_rate": res['turnover_rate'],
+            "reason": res['reason']
+        }
+        for res in results
+    ]
+    _, saved_recs = crud.create_execution_with_recommendations(
+        db, strategy_id, recs,
+        snapshot_version=screen_info["snapshot_version"],
+        params_hash=screen_info["params_hash"],
+        cache_hit=screen_info["cache_hit"]
+    )
         
     return saved_recs
 
+@router.post("/{strategy_id}/sweep", response_model=schemas.StrategySweepResponse)
+def sweep_strategy(strategy_id: int, req: schemas.StrategySweepRequest, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(auth.get_db)):
+    db_strategy = db.query(models.Strategy).filter(models.Strategy.id == strategy_id, models.Strategy.user_id == current_user.id).first()
+    if not db_strategy:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+
+    if not 0 < req.time_budget <= strategy_optimizer.MAX_SWEEP_SECONDS:
+        raise HTTPException(status_code=422, detail=f"time_budget must be between 0 and {strategy_optimizer.MAX_SWEEP_SECONDS} seconds")
+    try:
+        strategy_optimizer.check_grid_size(req.grid)
+    except strategy_optimizer.GridTooLarge as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid grid: {e}")
+
+    checkpoint_path = strategy_optimizer.checkpoint_path_for(strategy_id, db_strategy.params or {}, req.grid, req.top_n)
+    if not req.resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    try:
+        return strategy_optimizer.run_sweep(
+            db_strategy.params or {},
+            req.grid,
+            metric=req.metric,
+            top_n=req.top_n,
+            time_budget=req.time_budget,
+            checkpoint_path=checkpoint_path,
+            limit=req.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/screen_cache/stats", response_model=schemas.ScreenCacheStats)
+def read_screen_cache_stats(current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(auth.get_db)):
+    stats = stock_screener.get_cache_stats()
+    stats.update(crud.get_execution_cache_counts(db, current_user.id))
+    return stats
+
+@router.get("/llm_cache/stats", response_model=schemas.LLMCacheStats)
+def read_llm_cache_stats(current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(auth.get_db)):
+    return llm_cache.get_stats(db)
+
+@router.get("/llm_gateway/stats")
+async def read_llm_gateway_stats(current_user: models.User = Depends(auth.get_current_active_user)):
+    # Per provider: in-flight limit, queue depth, latency / queue wait percentiles
+    return llm_gateway.get_metrics()
+
 @router.get("/{strategy_id}/executions", response_model=List[schemas.StrategyExecution])
 def read_executions(strategy_id: int, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(auth.get_db)):
     db_strategy = db.query(models.Strategy).filter(models.Strategy.id == strategy_id, models.Strategy.user_id == current_user.id).first()
@@ -127,7 +180,9 @@ def fetch_realtime_prices_batch(symbols: List[str]) -> dict:
         try:
             print(f"DEBUG: Fetching tracking batch {i}: {url}", flush=True)
             headers = { "Referer": "http://finance.sina.com.cn" }
-            resp = requests.get(url, headers=headers, timeout=5)
+            with metrics.upstream("sina_hq", "batch") as call:
+                resp = requests.get(url, headers=headers, timeout=5)
+                call.check(resp.status_code)
             print(f"DEBUG: Batch {i} status: {resp.status_code}", flush=True)
             
             if resp.status_code == 200:
@@ -162,48 +217,73 @@ def fetch_realtime_prices_batch(symbols: List[str]) -> dict:
             
     return price_map
 
+def encode_tracking_cursor(created_at: datetime.datetime, rec_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{rec_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_tracking_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, rec_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(created_at), int(rec_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/tracking/summary", response_model=schemas.TrackingSummary)
+def get_strategy_tracking_summary(
+    horizon: str = Query("t5"),
+    strategy_id: Optional[int] = Query(None),
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(auth.get_db)
+):
+    if horizon not in crud.OUTCOME_HORIZON_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"horizon must be one of {list(crud.OUTCOME_HORIZON_COLUMNS)}")
+    return crud.get_tracking_summary(db, current_user.id, horizon, strategy_id=strategy_id)
+
 @router.get("/tracking", response_model=List[schemas.StockTrackingItem])
 def get_strategy_tracking(
+    response: Response,
     execution_id: Optional[int] = Query(None),
     strategy_id: Optional[int] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
     current_user: models.User = Depends(auth.get_current_active_user), 
     db: Session = Depends(auth.get_db)
 ):
-    # 1. Get recent recommendations (limit 50) joined with Strategy and Execution
-    query = db.query(
-        models.StockRecommendation, 
-        models.StrategyExecution.created_at, 
-        models.Strategy.name
-    ).join(
-        models.StrategyExecution, models.StockRecommendation.execution_id == models.StrategyExecution.id
-    ).join(
-        models.Strategy, models.StrategyExecution.strategy_id == models.Strategy.id
-    ).filter(
-        models.Strategy.user_id == current_user.id
+    # 1. Get one page of recommendations joined with Strategy, Execution and the materialized outcome.
+    # Fetch one extra row to know whether there is a next page
+    after = decode_tracking_cursor(cursor) if cursor else None
+    results = crud.get_tracking_page(
+        db, current_user.id, limit + 1,
+        execution_id=execution_id, strategy_id=strategy_id, after=after
     )
 
-    if execution_id:
-        query = query.filter(models.StockRecommendation.execution_id == execution_id)
-    elif strategy_id:
-        query = query.filter(models.StockRecommendation.strategy_id == strategy_id)
-    
-    results = query.order_by(
-        models.StrategyExecution.created_at.desc()
-    ).limit(50).all()
+    if len(results) > limit:
+        results = results[:limit]
+        last_rec, last_time, _, _ = results[-1]
+        response.headers["X-Next-Cursor"] = encode_tracking_cursor(last_time, last_rec.id)
     
     if not results:
         return []
         
-    # 2. Fetch real-time prices (Optimized: Batch fetch only needed symbols)
-    symbols = list(set([rec.symbol for rec, _, _ in results]))
+    # 2. Fetch real-time prices only for recommendations whose T+20 window is still open.
+    # Closed windows are served straight from the outcome table, unless they were
+    # closed without any history (no last_close): those still need a live price.
+    def closed_price(outcome):
+        return outcome.last_close if outcome and outcome.is_closed else None
+
+    symbols = list(set([rec.symbol for rec, _, _, outcome in results if closed_price(outcome) is None]))
     print(f"DEBUG: Tracking symbols: {symbols}", flush=True)
     price_map = fetch_realtime_prices_batch(symbols)
     print(f"DEBUG: Price Map keys: {list(price_map.keys())}", flush=True)
         
     tracking_items = []
     
-    for rec, exec_time, strategy_name in results:
-        current_price = price_map.get(rec.symbol)
+    for rec, exec_time, strategy_name, outcome in results:
+        window_closed = bool(outcome and outcome.is_closed)
+        current_price = closed_price(outcome)
+        if current_price is None:
+            current_price = price_map.get(rec.symbol)
         # print(f"DEBUG: Symbol {rec.symbol} (RecPrice: {rec.price}) -> Map Price {current_price}", flush=True)
         
         if current_price is None:
@@ -234,39 +314,55 @@ def get_strategy_tracking(
             recommend_price=rec.price,
             current_price=current_price,
             return_percent=return_pct,
-            execution_id=rec.execution_id if rec.execution_id else 0
+            execution_id=rec.execution_id if rec.execution_id else 0,
+            return_t1=outcome.return_t1 if outcome else None,
+            return_t3=outcome.return_t3 if outcome else None,
+            return_t5=outcome.return_t5 if outcome else None,
+            return_t20=outcome.return_t20 if outcome else None,
+            max_favorable=outcome.max_favorable if outcome else None,
+            max_adverse=outcome.max_adverse if outcome else None,
+            window_closed=window_closed
         ))
         
     return tracking_items
 
 # --- AI Analysis ---
 
+ANALYSIS_SYSTEM_PROMPT = "你是一位A股短线交易专家。"
+ANALYSIS_COLUMNS = [("name", "名称"), ("symbol", "代码"), ("price", "现价"), ("change", "涨幅%"),
+                    ("volume_ratio", "量比"), ("turnover", "换手%")]
+
 @router.post("/executions/{execution_id}/analyze")
-def analyze_execution(execution_id: int, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(auth.get_db)):
+async def analyze_execution(execution_id: int, use_cache: bool = True, stream: bool = False, current_user: models.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(auth.get_async_db)):
+    # Async route: the model call goes through the LLM gateway without
+    # holding a threadpool worker for the whole generation
     # 1. Get Execution
-    db_exec = crud.get_execution(db, execution_id)
+    db_exec = await db.run_sync(crud.get_execution, execution_id)
     if not db_exec:
         raise HTTPException(status_code=404, detail="Execution not found")
 
     # 2. Get Recommendations
-    recs = crud.get_recommendations(db, execution_id=execution_id)
+    recs = await db.run_sync(lambda s: crud.get_recommendations(s, execution_id=execution_id))
     if not recs:
         raise HTTPException(status_code=400, detail="No recommendations to analyze")
     
-    # Take top 10 to analyze
-    top_recs = recs[:10] 
-    
-    # 3. Prepare Prompt
-    stocks_info = "\n".join([
-        f"- {r.name} ({r.symbol}): 现价 {r.price}, 涨幅 {r.change_percent}%, 量比 {r.volume_ratio}, 换手 {r.turnover_rate}%"
-        for r in top_recs
-    ])
+    # 3. Prepare Prompt: candidates as one compact table, strongest movers
+    # first (the screener's ranking), trimmed to the analysis token budget
+    # instead of a fixed top 10
+    ranked = sorted(recs, key=lambda r: r.change_percent or 0, reverse=True)
+    rows = [{"name": r.name, "symbol": r.symbol, "price": r.price, "change": r.change_percent,
+             "volume_ratio": r.volume_ratio, "turnover": r.turnover_rate} for r in ranked]
+    stocks_info, context_stats = prompt_context.ContextBuilder(prompt_context.ANALYSIS_CONTEXT_TOKENS).add_table(
+        "", ANALYSIS_COLUMNS, rows, min_rows=min(3, len(rows)),
+        overflow=lambda dropped: f"（另有 {len(dropped)} 只涨幅较低的候选未列出）"
+    ).build()
+    print(f"DEBUG: Analysis context for execution {execution_id}: {context_stats}", flush=True)
     
     prompt = f"""
     请作为一位短线交易专家，分析以下今日选出的股票，给出短线操作建议。
     
     选股策略结果：
-    {stocks_info}
+{stocks_info}
     
     请严格按照以下格式输出：
 
@@ -283,60 +379,47 @@ def analyze_execution(execution_id: int, current_user: models.User = Depends(aut
     （给出推荐优先级排序）
     """
     
-    # 4. Call AI
-    import os
-    import json
-    MODELS_FILE = "user_models.json"
-    
-    model_config = None
-    if os.path.exists(MODELS_FILE):
-        try:
-            with open(MODELS_FILE, 'r', encoding='utf-8') as f:
-                models_list = json.load(f)
-                # First try to find a model specifically for stock_selection
-                for m in models_list:
-                    if m.get('is_active') and "stock_selection" in m.get('modules', []):
-                        model_config = m
-                        break
-                
-                # Fallback to ai_report if not found
-                if not model_config:
-                    for m in models_list:
-                        if m.get('is_active') and "ai_report" in m.get('modules', []):
-                            model_config = m
-                            break
-        except:
-            pass
-            
+    # 4. Call AI: a stock_selection model, falling back to the ai_report one
+    model_config = model_registry.get_model("stock_selection", "ai_report")
     if not model_config:
         raise HTTPException(status_code=500, detail="No AI model configured for stock_selection or ai_report")
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {model_config['api_key']}"
-    }
-    
-    payload = {
-        "model": model_config['name'],
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
+    # Shared market digest as the system message: same prefix for every analysis
+    messages = [{"role": "user", "content": prompt}]
+    market_context = market_digest.get_text()
+    if market_context:
+        messages.insert(0, {"role": "system", "content": prompt_context.with_market_context(ANALYSIS_SYSTEM_PROMPT, market_context)})
+    temperature = 0.7
+
+    if stream:
+        # Tokens are relayed as they arrive; the analysis is saved once the stream completes
+        async def save(text):
+            await write_queue.submit_async(crud.update_execution_analysis, execution_id, text, commit=False)
+        return StreamingResponse(
+            llm_stream.stream_completion(
+                model_config, messages, temperature,
+                timeout=120, use_cache=use_cache, on_complete=save, user_key=current_user.id
+            ),
+            media_type="text/event-stream",
+            headers=llm_stream.SSE_HEADERS
+        )
+
+    async def call():
+        print(f"Analyzing with {model_config['provider']}...")
+        return await llm_gateway.chat_completion(model_config, messages, temperature, user_key=current_user.id, timeout=120)
     
     try:
-        print(f"Analyzing with {model_config['provider']}...")
-        resp = requests.post(model_config['base_url'], headers=headers, json=payload, timeout=120)
-        if resp.status_code != 200:
-             raise HTTPException(status_code=resp.status_code, detail=resp.text)
-        
-        result_json = resp.json()
+        # Same execution -> same prompt: re-analysis is served from the LLM cache
+        result_json, cache_hit = await llm_cache.acached_completion(model_config, messages, temperature, call, use_cache=use_cache)
         ai_content = result_json['choices'][0]['message']['content']
         
         # Save Analysis to Execution Record
-        db_exec.ai_analysis = ai_content
-        db.commit()
+        await write_queue.submit_async(crud.update_execution_analysis, execution_id, ai_content, commit=False)
             
-        return {"analysis": ai_content}
+        return {"analysis": ai_content, "cached": cache_hit}
         
+    except llm_gateway.LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"AI Analysis Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
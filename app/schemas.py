@@ -56,16 +56,24 @@ class Asset(AssetBase):
         orm_mode = True
 
 # Report
-class ReportBase(BaseModel):
+class ReportSummary(BaseModel):
+    # List view: everything but the (large) content
     id: str
     timestamp: str
     summary: str
-    content: str
     score: int
-    model_name: str
+    model_name: Optional[str] = None
 
-class ReportCreate(ReportBase):
-    pass
+    class Config:
+        orm_mode = True
+
+class ReportBase(ReportSummary):
+    content: str
+
+class ReportCreate(ReportSummary):
+    # content may be omitted by clients that only hold the summary list;
+    # the stored body is kept in that case
+    content: Optional[str] = None
 
 class Report(ReportBase):
     user_id: int
@@ -73,6 +81,23 @@ class Report(ReportBase):
     class Config:
         orm_mode = True
 
+# Delta sync: only added/changed (upserts) and removed (deletes) items,
+# applied on top of base_version
+class AssetDelta(BaseModel):
+    base_version: int
+    upserts: List[AssetCreate] = []
+    deletes: List[str] = []
+
+class ReportDelta(BaseModel):
+    base_version: int
+    upserts: List[ReportCreate] = []
+    deletes: List[str] = []
+
+class SyncResult(BaseModel):
+    version: int
+    upserted: int
+    deleted: int
+
 # Goal
 class GoalBase(BaseModel):
     targetProfit: float
@@ -96,13 +121,12 @@ class ModelConfigBase(BaseModel):
     api_key: str
     base_url: str
     modules: List[str]
+    is_active: bool = True
 
 class ModelConfigCreate(ModelConfigBase):
     pass
 
 class ModelConfig(ModelConfigBase):
-    is_active: bool
-
     class Config:
         orm_mode = True
 
@@ -134,6 +158,8 @@ class StrategyExecutionBase(BaseModel):
 
 class StrategyExecution(StrategyExecutionBase):
     id: int
+    snapshot_version: Optional[str] = None
+    cache_hit: Optional[bool] = False
 
     class Config:
         orm_mode = True
@@ -173,3 +199,83 @@ class StockTrackingItem(BaseModel):
     current_price: float
     return_percent: float
     execution_id: int
+    # Materialized outcome (close-to-close %, filled by the outcome tracker)
+    return_t1: Optional[float] = None
+    return_t3: Optional[float] = None
+    return_t5: Optional[float] = None
+    return_t20: Optional[float] = None
+    max_favorable: Optional[float] = None
+    max_adverse: Optional[float] = None
+    window_closed: bool = False
+
+class TrackingAggregate(BaseModel):
+    strategy_id: int
+    strategy_name: str
+    execution_id: Optional[int] = None
+    execution_date: Optional[str] = None
+    count: int
+    win_rate: float
+    avg_return: float
+    median_return: float
+
+class TrackingSummary(BaseModel):
+    horizon: str
+    strategies: List[TrackingAggregate]
+    executions: List[TrackingAggregate]
+
+class ScreenCacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    saved_seconds: float
+    size: int
+    max_size: int
+    snapshot_version: Optional[str] = None
+    snapshot_age: Optional[float] = None
+    executions_total: int
+    executions_cached: int
+
+class LLMCacheStats(BaseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    bypassed: int
+    hit_ratio: float
+    stores: int
+    evictions: int
+    saved_seconds: float
+    saved_tokens: int
+    entries: int
+    size_bytes: int
+    lifetime_hits: int
+    max_entries: int
+    max_bytes: int
+
+# Parameter Sweep
+class StrategySweepRequest(BaseModel):
+    # {"min_change": [2, 3, 5], "max_market_cap": {"start": 50, "stop": 300, "step": 50}}
+    grid: dict
+    metric: str = "avg_return" # avg_return / win_rate / total_return
+    top_n: int = 10 # Picks per day, like the live screener
+    time_budget: float = 60 # Seconds, at most strategy_optimizer.MAX_SWEEP_SECONDS
+    resume: bool = True
+    limit: int = 20
+
+class StrategySweepResult(BaseModel):
+    rank: int
+    params: dict
+    picks: int
+    active_days: int
+    avg_return: float
+    win_rate: float
+    total_return: float
+
+class StrategySweepResponse(BaseModel):
+    metric: str
+    combinations: int
+    total_days: int
+    evaluated_days: int
+    complete: bool
+    elapsed: float
+    results: List[StrategySweepResult]
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+import traceback
+
+from . import cache_backend
+
+# Tiny in-process scheduler: each job runs in its own daemon thread,
+# sleeping `interval` seconds between runs; jobs must be safe to run again
+# after a crash. With several uvicorn workers every worker starts the same
+# jobs; shared jobs claim each run in the cache backend so only one worker
+# does the work per interval.
+
+_claims = cache_backend.namespace("job")
+
+_jobs = {}
+_lock = threading.Lock()
+
+def claim(name: str, interval: float) -> bool:
+    """
+    True for the one worker that takes this run of `name`; every worker gets
+    False until the claim lapses, a bit before the next run is due.
+    """
+    return _claims.add(name, {"pid": os.getpid(), "at": time.time()}, ttl=max(interval * 0.9, 1))
+
+def _run_loop(name: str, interval: float, fn, stop_event: threading.Event, initial_delay: float, shared: bool):
+    if stop_event.wait(initial_delay):
+        return
+    while not stop_event.is_set():
+        if shared and not claim(name, interval):
+            _jobs[name]['skipped'] += 1 # Another worker runs it this interval
+            stop_event.wait(interval)
+            continue
+        started = time.time()
+        try:
+            fn()
+            _jobs[name]['last_success'] = time.time()
+        except Exception as e:
+            print(f"Background job {name} failed: {e}", flush=True)
+            traceback.print_exc()
+        _jobs[name]['last_run'] = started
+        _jobs[name]['last_duration'] = round(time.time() - started, 3)
+        stop_event.wait(interval)
+
+def start_periodic_job(name: str, interval: float, fn, initial_delay: float = 5, shared: bool = False):
+    """
+    Start `fn` every `interval` seconds. Starting an already running job is a no-op.
+    shared=True: at most one worker process runs it per interval.
+    """
+    with _lock:
+        if name in _jobs and _jobs[name]['thread'].is_alive():
+            return
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=_run_loop,
+            args=(name, interval, fn, stop_event, initial_delay, shared),
+            name=f"job-{name}",
+            daemon=True
+        )
+        _jobs[name] = {
+            "thread": thread,
+            "stop": stop_event,
+            "interval": interval,
+            "shared": shared,
+            "skipped": 0,
+            "last_run": None,
+            "last_success": None,
+            "last_duration": None,
+        }
+        thread.start()
+
+def stop_all_jobs():
+    with _lock:
+        for job in _jobs.values():
+            job['stop'].set()
+
+def get_job_status() -> dict:
+    return {
+        name: {k: v for k, v in job.items() if k not in ('thread', 'stop')}
+        for name, job in _jobs.items()
+    }
@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+from .. import metrics
+
+# Pluggable key/value cache shared by all uvicorn workers.
+#
+#   CACHE_BACKEND=memory  per-process dict (single worker, tests)
+#   CACHE_BACKEND=sqlite  one WAL SQLite file (CACHE_URL, default cache.db):
+#                         shared by every worker on the host, survives restarts
+#   CACHE_BACKEND=redis   any server speaking the Redis protocol
+#                         (CACHE_URL=redis://[:password@]host:port/db): shared
+#                         across hosts
+#
+# Backends store bytes with an optional TTL; namespace() adds a key prefix
+# and JSON serialization. Only data goes through the cache, never pickles: a
+# shared Redis must not be able to run code in the workers. Cache failures are logged and counted,
+# never raised into the request: a miss is always a valid answer.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")
+CACHE_URL = os.environ.get("CACHE_URL", "")
+SQLITE_PURGE_EVERY = 500 # Writes between expired-row sweeps
+
+class CacheError(Exception):
+    pass
+
+class MemoryBackend:
+    name = "memory"
+    shared = False # Visible to this process only
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {} # key -> (value, expires_at or None)
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def add(self, key: str, value: bytes, ttl: float = None) -> bool:
+        """Set only if absent (or expired); True when this call stored it."""
+        with self._lock:
+            now = time.time()
+            if self._live(key, now):
+                return False
+            self._data[key] = (value, now + ttl if ttl else None)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+class SQLiteBackend:
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str = "cache.db"):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread, autocommit; WAL lets workers read while one writes
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None)
+        )
+        self._after_write()
+
+    def add(self, key: str, value: bytes, ttl: float = None) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE cache_entries.expires_at IS NOT NULL AND cache_entries.expires_at <= ?",
+            (key, value, now + ttl if ttl else None, now)
+        )
+        self._after_write()
+        return cur.rowcount == 1
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % SQLITE_PURGE_EVERY == 0:
+            self._conn().execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+class RedisBackend:
+    """Minimal RESP client: GET / SET [PX] [NX] / DEL / DBSIZE, one connection per thread."""
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.reader = sock, sock.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = self._local.reader = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise CacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read() for _ in range(count)]
+        raise CacheError(f"Unexpected reply {line!r}")
+
+    def _send(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read()
+
+    def command(self, *args):
+        # One reconnect attempt: the server may have closed an idle connection
+        for attempt in (1, 2):
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            try:
+                return self._send(*args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt == 2:
+                    raise
+
+    def get(self, key: str):
+        return self.command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        if ttl:
+            self.command("SET", key, value, "PX", max(int(ttl * 1000), 1))
+        else:
+            self.command("SET", key, value)
+
+    def add(self, key: str, value: bytes, ttl: float = None) -> bool:
+        args = ["SET", key, value, "NX"] + (["PX", max(int(ttl * 1000), 1)] if ttl else [])
+        return self.command(*args) == "OK"
+
+    def delete(self, key: str):
+        self.command("DEL", key)
+
+    def size(self) -> int:
+        return self.command("DBSIZE")
+
+def create_backend(kind: str = CACHE_BACKEND, url: str = CACHE_URL):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(url or "cache.db")
+    if kind == "redis":
+        return RedisBackend(url or "redis://127.0.0.1:6379/0")
+    raise ValueError(f"Unknown CACHE_BACKEND {kind!r} (memory, sqlite or redis)")
+
+_lock = threading.Lock()
+_state = {"backend": None}
+_stats = {} # namespace -> {"hits", "misses", "sets", "errors"}
+
+def get_backend():
+    with _lock:
+        if _state["backend"] is None:
+            _state["backend"] = create_backend()
+            print(f"DEBUG: Cache backend: {_state['backend'].name}", flush=True)
+        return _state["backend"]
+
+def configure(backend):
+    """Swap the backend (tests, or a server that builds its own)."""
+    with _lock:
+        _state["backend"] = backend
+
+def _count(namespace: str, field: str):
+    with _lock:
+        stats = _stats.setdefault(namespace, {"hits": 0, "misses": 0, "sets": 0, "errors": 0})
+        stats[field] += 1
+
+class Namespace:
+    """Prefixed, serializing view of the backend with a dict-like surface."""
+    def __init__(self, name: str, ttl: float = None):
+        self.name = name
+        self.ttl = ttl
+
+    def _dumps(self, value) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+    def _loads(self, raw: bytes):
+        return json.loads(raw)
+
+    def _key(self, key) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            raw = get_backend().get(self._key(key))
+        except Exception as e:
+            print(f"Cache get {self.name} failed: {e}", flush=True)
+            _count(self.name, "errors")
+            return default
+        if raw is None:
+            _count(self.name, "misses")
+            return default
+        try:
+            value = self._loads(raw)
+        except ValueError as e:
+            # Not ours (e.g. a pickle left by an older release): a miss
+            print(f"Cache get {self.name} undecodable: {e}", flush=True)
+            _count(self.name, "errors")
+            return default
+        _count(self.name, "hits")
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        try:
+            get_backend().set(self._key(key), self._dumps(value), ttl or self.ttl)
+            _count(self.name, "sets")
+        except Exception as e:
+            print(f"Cache set {self.name} failed: {e}", flush=True)
+            _count(self.name, "errors")
+
+    def add(self, key, value, ttl: float = None) -> bool:
+        try:
+            return get_backend().add(self._key(key), self._dumps(value), ttl or self.ttl)
+        except Exception as e:
+            print(f"Cache add {self.name} failed: {e}", flush=True)
+            _count(self.name, "errors")
+            return False
+
+    def delete(self, key):
+        try:
+            get_backend().delete(self._key(key))
+        except Exception as e:
+            print(f"Cache delete {self.name} failed: {e}", flush=True)
+            _count(self.name, "errors")
+
+    def setdefault(self, key, value):
+        self.add(key, value)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+_MISSING = object()
+
+def namespace(name: str, ttl: float = None) -> Namespace:
+    return Namespace(name, ttl)
+
+def get_stats() -> dict:
+    backend = get_backend()
+    try:
+        size = backend.size()
+    except Exception:
+        size = None
+    with _lock:
+        namespaces = {}
+        for name, stats in _stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            namespaces[name] = dict(stats, hit_ratio=round(stats["hits"] / lookups, 4) if lookups else 0.0)
+    return {"backend": backend.name, "shared": backend.shared, "size": size, "namespaces": namespaces}
+
+@metrics.register_collector
+def _collect_metrics():
+    # No backend.size() here: a scrape must not wait on the cache server
+    with _lock:
+        stats = {name: dict(s) for name, s in _stats.items()}
+    rows = []
+    for name, s in stats.items():
+        rows += metrics.cache_samples(f"shared:{name}", s["hits"], s["misses"], {"errors": s["errors"]})
+    return rows
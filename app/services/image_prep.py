@@ -0,0 +1,143 @@
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .. import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Preprocessing for /api/recognize_assets uploads: bounded upload read,
+# downscale + recompress to a resolution that is plenty for reading a
+# holdings table, and a cache of parsed holdings keyed by image content.
+# Without Pillow the image is sent as uploaded and keyed by its bytes.
+MAX_UPLOAD_BYTES = int(os.environ.get("RECOGNIZE_MAX_UPLOAD_MB", 10)) * 1024 * 1024
+UPLOAD_CHUNK = 256 * 1024
+TARGET_MAX_SIDE = int(os.environ.get("RECOGNIZE_MAX_SIDE", 1600)) # Longest edge sent to the model
+JPEG_QUALITY = 85
+MAX_PIXELS = 40_000_000 # Decompression-bomb guard
+ALLOWED_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp"}
+
+RECOGNITION_CACHE_SIZE = 256
+RECOGNITION_CACHE_TTL = 7 * 24 * 60 * 60
+
+class ImageRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+async def read_upload(file, limit: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Read an UploadFile in chunks, stopping as soon as it exceeds limit."""
+    if file.content_type and file.content_type not in ALLOWED_TYPES:
+        raise ImageRejected(415, f"Unsupported image type {file.content_type}")
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            raise ImageRejected(413, f"Image larger than {limit // (1024 * 1024)} MB")
+        chunks.append(chunk)
+    if not total:
+        raise ImageRejected(400, "Empty upload")
+    return b"".join(chunks)
+
+def preprocess(raw: bytes, mime_type: str = "image/jpeg") -> dict:
+    """
+    Returns {"data", "mime", "key", "original_bytes", "bytes", "size", "resized"}.
+    key identifies the image content: the same screenshot re-uploaded, or
+    re-saved with different metadata / container, maps to the same key.
+    """
+    if Image is None:
+        return {"data": raw, "mime": mime_type, "key": hashlib.sha256(raw).hexdigest(),
+                "original_bytes": len(raw), "bytes": len(raw), "size": None, "resized": False}
+    try:
+        img = Image.open(io.BytesIO(raw))
+        if img.width * img.height > MAX_PIXELS:
+            raise ImageRejected(413, f"Image has more than {MAX_PIXELS} pixels")
+        img = ImageOps.exif_transpose(img) # Phone photos carry their rotation in EXIF
+    except ImageRejected:
+        raise
+    except Exception as e:
+        raise ImageRejected(400, f"Not a readable image: {e}")
+
+    flattened = img.mode in ("RGBA", "LA", "P")
+    if flattened:
+        # Flatten transparency onto white so text stays legible after JPEG
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    resized = max(img.size) > TARGET_MAX_SIDE
+    if resized:
+        img.thumbnail((TARGET_MAX_SIDE, TARGET_MAX_SIDE), Image.LANCZOS)
+
+    digest = hashlib.sha256(f"{img.width}x{img.height}".encode())
+    digest.update(img.tobytes())
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    data, mime = out.getvalue(), "image/jpeg"
+    if not resized and not flattened and len(raw) <= len(data) and mime_type in ALLOWED_TYPES:
+        data, mime = raw, mime_type # Already small and opaque: keep the original encoding
+    return {"data": data, "mime": mime, "key": digest.hexdigest(), "original_bytes": len(raw),
+            "bytes": len(data), "size": img.size, "resized": resized}
+
+# --- Parsed holdings cache ---
+_cache_lock = threading.Lock()
+_cache = OrderedDict() # (image key, model name) -> (holdings, stored_at, compute_seconds)
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "saved_seconds": 0.0, "bytes_in": 0, "bytes_sent": 0}
+
+def get_cached(key: str, model_name: str):
+    with _cache_lock:
+        entry = _cache.get((key, model_name))
+        if entry is None or time.time() - entry[1] > RECOGNITION_CACHE_TTL:
+            _cache.pop((key, model_name), None)
+            _cache_stats["misses"] += 1
+            return None
+        _cache.move_to_end((key, model_name))
+        _cache_stats["hits"] += 1
+        _cache_stats["saved_seconds"] += entry[2]
+        return [dict(item) for item in entry[0]]
+
+def put_cached(key: str, model_name: str, holdings: list, compute_seconds: float):
+    with _cache_lock:
+        _cache[(key, model_name)] = ([dict(item) for item in holdings], time.time(), compute_seconds)
+        _cache.move_to_end((key, model_name))
+        while len(_cache) > RECOGNITION_CACHE_SIZE:
+            _cache.popitem(last=False)
+            _cache_stats["evictions"] += 1
+
+def record_transfer(original_bytes: int, sent_bytes: int):
+    with _cache_lock:
+        _cache_stats["bytes_in"] += original_bytes
+        _cache_stats["bytes_sent"] += sent_bytes
+
+def get_cache_stats() -> dict:
+    with _cache_lock:
+        lookups = _cache_stats["hits"] + _cache_stats["misses"]
+        return dict(
+            _cache_stats,
+            saved_seconds=round(_cache_stats["saved_seconds"], 3),
+            hit_ratio=round(_cache_stats["hits"] / lookups, 4) if lookups else 0.0,
+            size=len(_cache),
+            max_size=RECOGNITION_CACHE_SIZE,
+            pillow=Image is not None,
+        )
+
+@metrics.register_collector
+def _collect_metrics():
+    with _cache_lock:
+        return metrics.cache_samples("recognition", _cache_stats["hits"], _cache_stats["misses"],
+                                     {"evictions": _cache_stats["evictions"]})
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import datetime
+import threading
+from sqlalchemy import func
+
+from .. import models, metrics
+from ..write_queue import write_queue
+
+# Content-addressed cache for chat completions, persisted in the llm_cache
+# table. The key is sha256(model name, canonical messages, temperature), so a
+# resent report prompt or a re-analyzed execution is answered from the
+# database instead of waiting up to minutes on the provider again.
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 2000))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_MB", 64)) * 1024 * 1024
+# The size bounds are checked every N stores (a COUNT / SUM over the table),
+# so the cache may run up to N - 1 entries over them in between
+LLM_CACHE_EVICT_EVERY = int(os.environ.get("LLM_CACHE_EVICT_EVERY", 50))
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "saved_seconds": 0.0, "saved_tokens": 0}
+_evict_state = {"stores": 0} # Stores written since process start, paces evict()
+
+def _canonical_messages(messages: list) -> str:
+    # Key order and surrounding whitespace of text content do not change the prompt
+    canonical = []
+    for m in messages:
+        m = dict(m)
+        if isinstance(m.get("content"), str):
+            m["content"] = m["content"].strip()
+        canonical.append(m)
+    return json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+def cache_key(model: str, messages: list, temperature: float, endpoint: str = "") -> str:
+    # endpoint (the provider base_url) keeps same-named models behind different proxies apart
+    raw = "\x00".join([model or "", endpoint or "", repr(float(temperature)), _canonical_messages(messages)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def lookup(db, key: str):
+    """The cached entry for key, or None. Does not record the hit (see touch)."""
+    return db.get(models.LLMCacheEntry, key)
+
+def touch(db, key: str):
+    # Write-queue job: count the hit and move the entry to the LRU tail
+    E = models.LLMCacheEntry
+    db.query(E).filter(E.key == key).update(
+        {E.hits: E.hits + 1, E.last_used_at: datetime.datetime.utcnow()}, synchronize_session=False
+    )
+
+def evict(db, max_entries: int = None, max_bytes: int = None) -> int:
+    """Delete least recently used entries until both bounds hold (no commit)."""
+    max_entries = LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    max_bytes = LLM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    E = models.LLMCacheEntry
+    count, size = db.query(func.count(E.key), func.coalesce(func.sum(E.size_bytes), 0)).one()
+    if count <= max_entries and size <= max_bytes:
+        return 0
+    victims = []
+    for key, nbytes in db.query(E.key, E.size_bytes).order_by(E.last_used_at, E.key).all():
+        if count <= max_entries and size <= max_bytes:
+            break
+        victims.append(key)
+        count -= 1
+        size -= nbytes or 0
+    db.query(E).filter(E.key.in_(victims)).delete(synchronize_session=False)
+    with _stats_lock:
+        _stats["evictions"] += len(victims)
+    return len(victims)
+
+def store(db, key: str, model_name: str, response: dict, elapsed: float, max_entries: int = None, max_bytes: int = None,
+          evict_every: int = None) -> int:
+    """Write-queue job: save one response, every evict_every stores evict over the size bounds. Returns evictions."""
+    body = json.dumps(response, ensure_ascii=False)
+    usage = response.get("usage") or {}
+    now = datetime.datetime.utcnow()
+    db.merge(models.LLMCacheEntry(
+        key=key, model_name=model_name, response=body, size_bytes=len(body.encode('utf-8')),
+        total_tokens=int(usage.get("total_tokens") or 0), elapsed_seconds=elapsed,
+        hits=0, created_at=now, last_used_at=now
+    ))
+    db.flush()
+    evict_every = LLM_CACHE_EVICT_EVERY if evict_every is None else evict_every
+    with _stats_lock:
+        _evict_state["stores"] += 1
+        due = _evict_state["stores"] % max(evict_every, 1) == 0
+    return evict(db, max_entries, max_bytes) if due else 0
+
+def _cacheable(response) -> bool:
+    try:
+        return bool(response["choices"][0]["message"]["content"])
+    except (KeyError, IndexError, TypeError):
+        return False
+
+def get_response(model_config: dict, messages: list, temperature: float, queue=None):
+    """The cached completion for this prompt (recording the hit), or None."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    queue = queue or write_queue
+    key = cache_key(model_config['name'], messages, temperature, model_config.get('base_url'))
+    db = queue.session_factory()
+    try:
+        entry = lookup(db, key)
+        cached = (json.loads(entry.response), entry.elapsed_seconds or 0.0, entry.total_tokens or 0) if entry else None
+    finally:
+        db.close()
+    with _stats_lock:
+        if not cached:
+            _stats["misses"] += 1
+            return None
+        response, elapsed, tokens = cached
+        _stats["hits"] += 1
+        _stats["saved_seconds"] += elapsed
+        _stats["saved_tokens"] += tokens
+    queue.submit(touch, key)
+    return response
+
+def put_response(model_config: dict, messages: list, temperature: float, response: dict, elapsed: float, queue=None):
+    if not LLM_CACHE_ENABLED or not _cacheable(response):
+        return
+    key = cache_key(model_config['name'], messages, temperature, model_config.get('base_url'))
+    (queue or write_queue).submit(store, key, model_config['name'], response, elapsed)
+    with _stats_lock:
+        _stats["stores"] += 1
+
+def cached_completion(model_config: dict, messages: list, temperature: float, call, use_cache: bool = True, queue=None):
+    """
+    Returns (response_json, cache_hit). call() performs the real request and
+    returns the parsed body. use_cache=False skips the lookup but still
+    stores the fresh answer, so it doubles as "refresh".
+    """
+    if use_cache:
+        cached = get_response(model_config, messages, temperature, queue=queue)
+        if cached is not None:
+            return cached, True
+    elif LLM_CACHE_ENABLED:
+        with _stats_lock:
+            _stats["bypassed"] += 1
+
+    started = time.time()
+    response = call()
+    put_response(model_config, messages, temperature, response, time.time() - started, queue=queue)
+    return response, False
+
+async def acached_completion(model_config: dict, messages: list, temperature: float, call, use_cache: bool = True, queue=None):
+    """cached_completion for async routes: call is a coroutine function."""
+    if use_cache:
+        cached = await asyncio.to_thread(get_response, model_config, messages, temperature, queue)
+        if cached is not None:
+            return cached, True
+    elif LLM_CACHE_ENABLED:
+        with _stats_lock:
+            _stats["bypassed"] += 1
+
+    started = time.time()
+    response = await call()
+    put_response(model_config, messages, temperature, response, time.time() - started, queue=queue)
+    return response, False
+
+def get_stats(db) -> dict:
+    E = models.LLMCacheEntry
+    entries, size, lifetime_hits = db.query(
+        func.count(E.key), func.coalesce(func.sum(E.size_bytes), 0), func.coalesce(func.sum(E.hits), 0)
+    ).one()
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(
+            _stats,
+            saved_seconds=round(_stats["saved_seconds"], 3),
+            hit_ratio=round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+            enabled=LLM_CACHE_ENABLED,
+            entries=entries,
+            size_bytes=size,
+            lifetime_hits=lifetime_hits,
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+            max_bytes=LLM_CACHE_MAX_BYTES,
+        )
+
+@metrics.register_collector
+def _collect_metrics():
+    # Counters only: entry counts need a database query, see get_stats
+    with _stats_lock:
+        return metrics.cache_samples("llm_response", _stats["hits"], _stats["misses"],
+                                     {"evictions": _stats["evictions"], "bypassed": _stats["bypassed"]})
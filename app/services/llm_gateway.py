@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+
+import httpx
+
+from .. import metrics
+
+# Shared async gateway for every call to an OpenAI-compatible chat endpoint.
+#
+#   - one pooled httpx.AsyncClient per ModelConfig.base_url (keep-alive, no
+#     per-call TLS handshake)
+#   - at most N requests in flight per provider; the rest wait in a queue
+#     that is served round-robin across users, so one user firing ten
+#     analyses cannot starve everybody else
+#   - queue depth, wait time and latency per provider (get_metrics)
+LLM_MAX_INFLIGHT = int(os.environ.get("LLM_MAX_INFLIGHT", 4))
+# Per-provider overrides, e.g. LLM_PROVIDER_LIMITS='{"deepseek": 8, "openai": 16}'
+LLM_PROVIDER_LIMITS = json.loads(os.environ.get("LLM_PROVIDER_LIMITS", "{}"))
+LLM_CONNECT_TIMEOUT = 10
+LLM_POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=8, keepalive_expiry=60)
+LATENCY_WINDOW = 500 # Samples kept per provider for the percentiles
+
+class LLMError(Exception):
+    """Non-200 answer (or transport failure) from the provider."""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class FairLimiter:
+    """
+    At most `limit` concurrent holders. Waiters are queued per key (user) and
+    served round-robin across keys, FIFO within a key. Single event loop only.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.inflight = 0
+        self._waiters = OrderedDict() # key -> deque of futures
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._waiters.values())
+
+    async def acquire(self, key):
+        if self.inflight < self.limit and not self._waiters:
+            self.inflight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on
+                self.release()
+            else:
+                queue = self._waiters.get(key)
+                if queue and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiters[key]
+            raise
+
+    def release(self):
+        while self._waiters:
+            key, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            # Served key moves to the back of the rotation
+            del self._waiters[key]
+            if queue:
+                self._waiters[key] = queue
+            if not future.done():
+                future.set_result(None) # Slot changes hands, inflight unchanged
+                return
+        self.inflight -= 1
+
+class _Provider:
+    def __init__(self, name: str):
+        self.name = name
+        self.limiter = FairLimiter(int(LLM_PROVIDER_LIMITS.get(name, LLM_MAX_INFLIGHT)))
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+        self.first_tokens = deque(maxlen=LATENCY_WINDOW)
+
+_providers = {}
+_clients = {} # base_url -> (event loop, AsyncClient)
+
+def _provider(model_config: dict) -> _Provider:
+    name = model_config.get('provider') or model_config['base_url']
+    if name not in _providers:
+        _providers[name] = _Provider(name)
+    return _providers[name]
+
+def get_client(base_url: str) -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(base_url)
+    if entry is None or entry[0] is not loop or entry[1].is_closed:
+        # A client is tied to the loop it was first used on (tests start their own loops)
+        _clients[base_url] = (loop, httpx.AsyncClient(limits=LLM_POOL_LIMITS))
+    return _clients[base_url][1]
+
+async def aclose():
+    clients = list(_clients.values())
+    _clients.clear()
+    for _, client in clients:
+        with contextlib.suppress(Exception):
+            await client.aclose()
+
+def _request(model_config: dict, messages: list, temperature: float, stream: bool = False):
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {model_config['api_key']}"
+    }
+    payload = {
+        "model": model_config['name'],
+        "messages": messages,
+        "temperature": temperature
+    }
+    if stream:
+        headers["Accept"] = "text/event-stream"
+        payload["stream"] = True
+    return headers, payload
+
+@contextlib.asynccontextmanager
+async def _slot(model_config: dict, user_key):
+    provider = _provider(model_config)
+    queued_at = time.perf_counter()
+    await provider.limiter.acquire(user_key)
+    started = time.perf_counter()
+    provider.waits.append(started - queued_at)
+    metrics.observe("llm_queue_wait_seconds", started - queued_at, provider=provider.name)
+    provider.requests += 1
+    try:
+        with metrics.upstream("llm", provider.name) as call:
+            try:
+                yield provider
+            except LLMError as e:
+                call.fail(f"http_{e.status_code}")
+                raise
+    except Exception:
+        provider.errors += 1
+        raise
+    finally:
+        provider.latencies.append(time.perf_counter() - started)
+        provider.limiter.release()
+
+async def chat_completion(model_config: dict, messages: list, temperature: float = 1.0, user_key="anonymous", timeout: float = 180) -> dict:
+    """One (non-streaming) completion; returns the parsed response body."""
+    headers, payload = _request(model_config, messages, temperature)
+    async with _slot(model_config, user_key):
+        try:
+            resp = await get_client(model_config['base_url']).post(
+                model_config['base_url'], headers=headers, json=payload,
+                timeout=httpx.Timeout(timeout, connect=LLM_CONNECT_TIMEOUT)
+            )
+        except httpx.HTTPError as e:
+            raise LLMError(502, f"{type(e).__name__}: {e}")
+        if resp.status_code != 200:
+            print(f"API Error: {resp.text}")
+            raise LLMError(resp.status_code, resp.text)
+        return resp.json()
+
+def parse_stream_line(line: str):
+    """
+    Content carried by one line of an OpenAI-compatible SSE body: the delta
+    text ("" when there is none), or None at the closing [DONE].
+    """
+    if not line or not line.startswith("data:"):
+        return "" # Blank separators, ": keep-alive" comments, event names
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return ""
+    return "".join((choice.get("delta") or {}).get("content") or "" for choice in chunk.get("choices") or [])
+
+async def stream_chat(model_config: dict, messages: list, temperature: float = 1.0, user_key="anonymous", timeout: float = 180):
+    """Async generator of content deltas; the timeout applies between chunks."""
+    headers, payload = _request(model_config, messages, temperature, stream=True)
+    async with _slot(model_config, user_key) as provider:
+        started = time.perf_counter()
+        first = True
+        try:
+            async with get_client(model_config['base_url']).stream(
+                "POST", model_config['base_url'], headers=headers, json=payload,
+                timeout=httpx.Timeout(timeout, connect=LLM_CONNECT_TIMEOUT)
+            ) as resp:
+                if resp.status_code != 200:
+                    body = (await resp.aread()).decode("utf-8", "replace")
+                    print(f"API Error: {body}")
+                    raise LLMError(resp.status_code, body)
+                async for line in resp.aiter_lines():
+                    delta = parse_stream_line(line)
+                    if delta is None:
+                        return
+                    if delta:
+                        if first:
+                            provider.first_tokens.append(time.perf_counter() - started)
+                            first = False
+                        yield delta
+        except httpx.HTTPError as e:
+            raise LLMError(502, f"{type(e).__name__}: {e}")
+
+def _percentile(samples, q: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+def get_metrics() -> dict:
+    providers = {}
+    for name, p in list(_providers.items()):
+        providers[name] = {
+            "limit": p.limiter.limit,
+            "inflight": p.limiter.inflight,
+            "queued": p.limiter.queued,
+            "requests": p.requests,
+            "errors": p.errors,
+            "latency_p50": _percentile(p.latencies, 0.5),
+            "latency_p95": _percentile(p.latencies, 0.95),
+            "queue_wait_p50": _percentile(p.waits, 0.5),
+            "queue_wait_p95": _percentile(p.waits, 0.95),
+            "first_token_p50": _percentile(p.first_tokens, 0.5),
+        }
+    return {"default_limit": LLM_MAX_INFLIGHT, "clients": len(_clients), "providers": providers}
+
+
+metrics.histogram("llm_queue_wait_seconds", "Time a completion waited for a provider slot")
+
+@metrics.register_collector
+def _collect_metrics():
+    providers = list(_providers.values())
+    return [
+        ("llm_inflight_requests", "gauge", "Completions holding a provider slot",
+         [({"provider": p.name}, p.limiter.inflight) for p in providers]),
+        ("llm_queued_requests", "gauge", "Completions waiting for a provider slot",
+         [({"provider": p.name}, p.limiter.queued) for p in providers]),
+        ("llm_provider_limit", "gauge", "Concurrent completions allowed per provider",
+         [({"provider": p.name}, p.limiter.limit) for p in providers]),
+    ]
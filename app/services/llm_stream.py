@@ -0,0 +1,69 @@
+import json
+import time
+import asyncio
+
+from . import llm_cache, llm_gateway
+
+# Server-Sent Events relay for OpenAI-compatible streaming completions.
+#
+# The provider is called with "stream": true and every content delta is
+# forwarded as soon as it arrives, so the first tokens show up after about a
+# second instead of after the whole generation. Events sent to the client:
+#
+#   data: {"delta": "..."}                          one or more text chunks
+#   event: done   data: {"content": "...", "cached": bool}
+#   event: error  data: {"detail": "..."}
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no", # Keep nginx from buffering the stream
+}
+
+def sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_completion(model_config: dict, messages: list, temperature: float, timeout: float = 180,
+                            use_cache: bool = True, on_complete=None, user_key="anonymous"):
+    """
+    Async generator of SSE frames for one completion, through the LLM
+    gateway. on_complete(text) (a coroutine function) runs once the full
+    answer is known, not when the client disconnects midway; the answer is
+    also stored in the LLM cache, and a cached answer is replayed as a
+    single delta.
+    """
+    if use_cache:
+        cached = await asyncio.to_thread(llm_cache.get_response, model_config, messages, temperature)
+        if cached is not None:
+            text = cached['choices'][0]['message']['content']
+            yield sse_event({"delta": text})
+            if on_complete:
+                await on_complete(text)
+            yield sse_event({"content": text, "cached": True}, event="done")
+            return
+
+    started = time.time()
+    parts = []
+    first_token = None
+    try:
+        async for delta in llm_gateway.stream_chat(model_config, messages, temperature, user_key=user_key, timeout=timeout):
+            if first_token is None:
+                first_token = time.time() - started
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+    except llm_gateway.LLMError as e:
+        print(f"Stream error: {e.detail}")
+        yield sse_event({"detail": e.detail}, event="error")
+        return
+
+    text = "".join(parts)
+    elapsed = time.time() - started
+    print(f"DEBUG: Streamed {len(text)} chars from {model_config['provider']} "
+          f"(first token {first_token or 0:.2f}s, total {elapsed:.2f}s)", flush=True)
+    if text:
+        if on_complete:
+            await on_complete(text)
+        llm_cache.put_response(model_config, messages, temperature, {
+            "model": model_config['name'],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        }, elapsed)
+    yield sse_event({"content": text, "cached": False}, event="done")
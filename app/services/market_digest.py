@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import datetime
+import threading
+
+from ..startup_profile import lazy_import
+ak = lazy_import("akshare", instrument="akshare")
+pd = lazy_import("pandas")
+
+from . import stock_screener, cache_backend
+from .prompt_context import compact_text, estimate_tokens
+
+# One compact market digest shared by every LLM prompt.
+#
+# A background job builds it from the spot snapshot (breadth, turnover),
+# the key indices, the leading / lagging industry boards, the macro series
+# and the latest headlines, and keeps it in memory and in the shared cache
+# backend (other workers and the next process pick it up). Prompts include
+# the same text in the system message, so it is computed once per refresh
+# and forms a stable prompt prefix instead of being rebuilt per request.
+MARKET_DIGEST_INTERVAL = int(os.environ.get("MARKET_DIGEST_INTERVAL", 15 * 60))
+MARKET_DIGEST_TOKENS = int(os.environ.get("MARKET_DIGEST_TOKENS", 400))
+MAX_AGE = 24 * 60 * 60 # An older digest is not served
+
+KEY_INDICES = ("上证指数", "深证成指", "创业板指", "沪深300", "科创50")
+SECTOR_COUNT = 3
+HEADLINE_COUNT = 5
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_state = {"digest": None, "builds": 0}
+_shared = cache_backend.namespace("market", ttl=MAX_AGE)
+_source_fns = {"macro": None, "news": None} # Set by configure(): server.py owns these fetchers
+
+def configure(macro_fn=None, news_fn=None):
+    _source_fns["macro"] = macro_fn
+    _source_fns["news"] = news_fn
+
+# --- Sections (each returns lines; empty when the data is missing) ---
+
+def summarize_breadth(df: pd.DataFrame) -> list:
+    if df is None or df.empty or '涨跌幅' not in df.columns:
+        return []
+    change = pd.to_numeric(df['涨跌幅'], errors='coerce').dropna()
+    up, down = int((change > 0).sum()), int((change < 0).sum())
+    line = f"A股 上涨 {up} / 下跌 {down} / 平盘 {len(change) - up - down}, 中位涨跌幅 {change.median():.2f}%"
+    line += f", 涨幅≥9.9% {int((change >= 9.9).sum())} 只, 跌幅≥9.9% {int((change <= -9.9).sum())} 只"
+    lines = [line]
+    if '成交额' in df.columns:
+        turnover = pd.to_numeric(df['成交额'], errors='coerce').sum()
+        lines.append(f"两市成交额 {turnover / 1e8:.0f} 亿")
+    return lines
+
+def summarize_indices(df: pd.DataFrame) -> list:
+    if df is None or df.empty:
+        return []
+    parts = []
+    for name in KEY_INDICES:
+        row = df[df['名称'] == name]
+        if row.empty:
+            continue
+        row = row.iloc[0]
+        parts.append(f"{name} {float(row['最新价']):.2f} ({float(row['涨跌幅']):+.2f}%)")
+    return ["; ".join(parts)] if parts else []
+
+def summarize_sectors(df: pd.DataFrame) -> list:
+    if df is None or df.empty:
+        return []
+    df = df.assign(_chg=pd.to_numeric(df['涨跌幅'], errors='coerce')).dropna(subset=['_chg']).sort_values('_chg', ascending=False)
+    def fmt(row):
+        leader = f", 领涨 {row['领涨股票']}" if '领涨股票' in row and row['领涨股票'] else ""
+        return f"{row['板块名称']} {row['_chg']:+.2f}%{leader}"
+    lines = ["领涨行业: " + "; ".join(fmt(r) for _, r in df.head(SECTOR_COUNT).iterrows())]
+    lines.append("领跌行业: " + "; ".join(f"{r['板块名称']} {r['_chg']:+.2f}%" for _, r in df.tail(SECTOR_COUNT).iloc[::-1].iterrows()))
+    return lines
+
+def summarize_macro(macro: dict) -> list:
+    if not macro:
+        return []
+    parts = []
+    for key, label in (("cpi", "CPI同比"), ("ppi", "PPI同比"), ("deposit_volume", "M2同比"), ("gdp", "GDP同比")):
+        series = macro.get(key) or []
+        if series:
+            latest = series[-1]
+            delta = f", 前值 {series[-2]['value']}" if len(series) > 1 else ""
+            parts.append(f"{label} {latest['value']}% ({latest['date']}{delta})")
+    lpr = macro.get("lpr") or []
+    if lpr:
+        parts.append(f"LPR 1Y {lpr[-1]['value_1y']}% / 5Y {lpr[-1]['value_5y']}%")
+    return ["; ".join(parts)] if parts else []
+
+def summarize_headlines(news: list) -> list:
+    return [f"- {n.get('title', '').strip()}" for n in (news or [])[:HEADLINE_COUNT] if n.get('title')]
+
+def compose(sections: dict, built_at: datetime.datetime) -> str:
+    """sections: title -> lines. Titled blocks in a fixed order, capped at MARKET_DIGEST_TOKENS."""
+    blocks = [f"市场摘要 ({built_at.strftime('%Y-%m-%d %H:%M')})"]
+    for title, lines in sections.items():
+        if lines:
+            blocks.append(f"{title}:")
+            blocks.extend(lines)
+    return compact_text("\n".join(blocks), MARKET_DIGEST_TOKENS)
+
+# --- Build / serve ---
+
+def _fetch_sources() -> tuple:
+    fetchers = {
+        "breadth": lambda: summarize_breadth(stock_screener.get_spot_snapshot()[0]),
+        "indices": lambda: summarize_indices(ak.stock_zh_index_spot_em(symbol="沪深重要指数")),
+        "sectors": lambda: summarize_sectors(ak.stock_board_industry_name_em()),
+        "macro": lambda: summarize_macro(_source_fns["macro"]()) if _source_fns["macro"] else [],
+        "headlines": lambda: summarize_headlines(_source_fns["news"](HEADLINE_COUNT)) if _source_fns["news"] else [],
+    }
+    results, status = {}, {}
+    for name, fetch in fetchers.items():
+        try:
+            results[name] = fetch()
+            status[name] = "ok" if results[name] else "empty"
+        except Exception as e:
+            print(f"Market digest source {name} failed: {e}", flush=True)
+            results[name] = []
+            status[name] = "error"
+    return results, status
+
+SECTION_TITLES = {"indices": "指数", "breadth": "市场宽度", "sectors": "行业", "macro": "宏观", "headlines": "要闻"}
+
+def build() -> dict:
+    with _build_lock: # Job and a cold request never build twice at once
+        results, status = _fetch_sources()
+        built_at = datetime.datetime.now()
+        text = compose({SECTION_TITLES[k]: results[k] for k in SECTION_TITLES}, built_at)
+        # Version the content, not the header line: outside trading hours the
+        # data does not move, and the prompt prefix stays byte-identical
+        body = text.split("\n", 1)[-1]
+        version = hashlib.sha1(body.encode("utf-8")).hexdigest()[:12]
+        with _lock:
+            current = _state["digest"]
+            if current and current["version"] == version:
+                digest = dict(current, checked_at=built_at.timestamp(), sources=status)
+            else:
+                digest = {"text": text, "version": version, "built_at": built_at.timestamp(),
+                          "checked_at": built_at.timestamp(), "tokens": estimate_tokens(text), "sources": status}
+            changed = digest["text"] != (current or {}).get("text")
+            _state["digest"] = digest
+            _state["builds"] += 1
+        _shared.set("digest", digest)
+        if changed:
+            print(f"DEBUG: Market digest {version} built ({digest['tokens']} tokens, sources {status})", flush=True)
+        return digest
+
+def load_saved() -> bool:
+    """Serve the digest of the previous process until the job rebuilds it."""
+    digest = _shared.get("digest")
+    if digest is None or time.time() - digest.get("checked_at", 0) > MAX_AGE:
+        return False
+    with _lock:
+        if _state["digest"] is None:
+            _state["digest"] = digest
+    return True
+
+def get_digest():
+    """Current digest dict, or None when none was confirmed in the last MAX_AGE."""
+    with _lock:
+        digest = _state["digest"]
+    if digest is None or time.time() - digest["checked_at"] > MARKET_DIGEST_INTERVAL:
+        # The refresh job may have run in another worker
+        shared = _shared.get("digest") if cache_backend.get_backend().shared else None
+        if shared and (digest is None or shared["checked_at"] > digest["checked_at"]):
+            with _lock:
+                _state["digest"] = digest = shared
+    if digest is None or time.time() - digest["checked_at"] > MAX_AGE:
+        return None
+    return digest
+
+def get_text() -> str:
+    digest = get_digest()
+    return digest["text"] if digest else ""
+
+def get_stats() -> dict:
+    digest = get_digest()
+    with _lock:
+        builds = _state["builds"]
+    if digest is None:
+        return {"available": False, "builds": builds}
+    return {"available": True, "builds": builds, **{k: v for k, v in digest.items() if k != "text"}}
+
+def refresh_job():
+    build()
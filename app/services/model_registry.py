@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+
+from .. import models, database
+
+# In-memory view of the model_configs table, indexed by module.
+#
+# Loaded once, rebuilt lazily after crud.save_models_bulk invalidates it,
+# and re-read by a background job every MODEL_REGISTRY_REFRESH seconds so
+# changes made by another process (another worker, migrate_json_to_db.py)
+# show up too. Model selection on the request path is a dict lookup.
+MODEL_REGISTRY_REFRESH = int(os.environ.get("MODEL_REGISTRY_REFRESH", 30))
+
+_lock = threading.Lock()
+_state = {"by_module": {}, "configs": [], "loaded": False, "loaded_at": None, "reloads": 0, "session_factory": None}
+
+def _config_dict(c) -> dict:
+    return {
+        "id": c.id, "provider": c.provider, "name": c.name, "api_key": c.api_key,
+        "base_url": c.base_url, "modules": list(c.modules or []), "is_active": c.is_active,
+    }
+
+def configure(session_factory):
+    """Read from another database (tests); drops the current index."""
+    with _lock:
+        _state["session_factory"] = session_factory
+        _state["loaded"] = False
+
+def load() -> int:
+    """Rebuild the index from the database. Returns the number of active configs."""
+    db = (_state["session_factory"] or database.SessionLocal)()
+    try:
+        configs = [_config_dict(c) for c in db.query(models.ModelConfig).filter(models.ModelConfig.is_active == True).all()]
+    finally:
+        db.close()
+    by_module = {}
+    for config in configs:
+        for module in config["modules"]:
+            by_module.setdefault(module, config) # First active config wins, as before
+    with _lock:
+        changed = configs != _state["configs"]
+        _state.update(by_module=by_module, configs=configs, loaded=True, loaded_at=time.time())
+        _state["reloads"] += 1
+    if changed:
+        print(f"DEBUG: Model registry loaded {len(configs)} active configs for modules {sorted(by_module)}", flush=True)
+    return len(configs)
+
+def invalidate():
+    # Called after writes; the next lookup reloads
+    with _lock:
+        _state["loaded"] = False
+
+def get_model(*modules: str):
+    """First active config serving one of modules (in preference order), or None."""
+    if not _state["loaded"]:
+        load()
+    by_module = _state["by_module"]
+    for module in modules:
+        config = by_module.get(module)
+        if config is not None:
+            return dict(config)
+    return None
+
+def refresh_job():
+    load()
+
+def get_stats() -> dict:
+    with _lock:
+        return {
+            "active_configs": len(_state["configs"]),
+            "modules": sorted(_state["by_module"]),
+            "loaded": _state["loaded"],
+            "loaded_at": _state["loaded_at"],
+            "reloads": _state["reloads"],
+        }
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from ..startup_profile import lazy_import
+ak = lazy_import("akshare", instrument="akshare")
+pd = lazy_import("pandas")
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import crud, database
+from ..write_queue import write_queue
+
+# Trading-day horizons stored per recommendation (close-to-close, in %)
+OUTCOME_HORIZONS = (1, 3, 5, 20)
+MAX_HORIZON = max(OUTCOME_HORIZONS)
+
+# Calendar days after which an outcome the latest attempt could not complete
+# is closed as it is: T+20 trading days is about 28 calendar days, plus room
+# for holidays and retries
+OUTCOME_MAX_AGE_DAYS = 45
+
+# Background refresh interval (seconds)
+OUTCOME_REFRESH_INTERVAL = 30 * 60
+
+# A-share close; before this the last daily bar is still moving
+MARKET_CLOSE = (15, 5)
+
+def fetch_daily_history(symbol: str, start_date: str) -> pd.DataFrame:
+    """Daily qfq bars from start_date (YYYY-MM-DD) onwards, with only finished sessions."""
+    start = (datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=10)).strftime("%Y%m%d")
+    end = datetime.now().strftime("%Y%m%d")
+    hist = ak.stock_zh_a_hist(symbol=symbol, period="daily", start_date=start, end_date=end, adjust="qfq")
+    if hist is None or hist.empty:
+        return pd.DataFrame(columns=['日期', '收盘', '最高', '最低'])
+
+    hist = hist[['日期', '收盘', '最高', '最低']].copy()
+    hist['日期'] = pd.to_datetime(hist['日期']).dt.strftime("%Y-%m-%d")
+    hist = hist.sort_values('日期').reset_index(drop=True)
+
+    now = datetime.now()
+    if (now.hour, now.minute) < MARKET_CLOSE and len(hist) and hist['日期'].iloc[-1] == now.strftime("%Y-%m-%d"):
+        hist = hist.iloc[:-1]
+    return hist
+
+def compute_outcome(hist: pd.DataFrame, rec_date: str):
+    """
+    Returns the outcome columns for a recommendation made on rec_date, or None
+    when the base day has not closed yet. T is the last trading day on or
+    before rec_date; T+k is the k-th trading day after it.
+    """
+    if hist.empty or hist['日期'].iloc[-1] < rec_date:
+        return None
+    base_rows = hist.index[hist['日期'] <= rec_date]
+    if len(base_rows) == 0:
+        return None
+    base_idx = base_rows[-1]
+    base_close = float(hist.at[base_idx, '收盘'])
+    if base_close <= 0:
+        return None
+
+    window = hist.iloc[base_idx + 1: base_idx + 1 + MAX_HORIZON]
+    values = {
+        "base_date": hist.at[base_idx, '日期'],
+        "base_close": base_close,
+        "days_observed": len(window),
+        "is_closed": len(window) >= MAX_HORIZON,
+        "max_favorable": None,
+        "max_adverse": None,
+        "last_close": base_close,
+        "last_close_date": hist.at[base_idx, '日期'],
+    }
+    closes = window['收盘'].tolist()
+    for h in OUTCOME_HORIZONS:
+        values[f"return_t{h}"] = round((closes[h - 1] / base_close - 1) * 100, 2) if len(closes) >= h else None
+
+    if len(window):
+        values["max_favorable"] = round((float(window['最高'].max()) / base_close - 1) * 100, 2)
+        values["max_adverse"] = round((float(window['最低'].min()) / base_close - 1) * 100, 2)
+        values["last_close"] = float(closes[-1])
+        values["last_close_date"] = window['日期'].iloc[-1]
+    return values
+
+def refresh_outcomes(db, max_workers: int = 4) -> int:
+    """Fill / advance outcomes for every recommendation whose T+20 window is still open."""
+    pending = crud.get_recommendations_pending_outcome(db)
+    if not pending:
+        return 0
+
+    by_symbol = {}
+    for rec in pending:
+        by_symbol.setdefault(rec.symbol, []).append(rec)
+
+    def load(symbol):
+        start_date = min(r.date for r in by_symbol[symbol])
+        try:
+            return symbol, fetch_daily_history(symbol, start_date)
+        except Exception as e:
+            print(f"Outcome history fetch failed for {symbol}: {e}", flush=True)
+            return symbol, None
+
+    # Only after this attempt: recommendations past the max age that it
+    # could not complete are closed as they are
+    cutoff = (datetime.now() - timedelta(days=OUTCOME_MAX_AGE_DAYS)).strftime("%Y-%m-%d")
+    updated = 0
+    writes = []
+    expired = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for symbol, hist in executor.map(load, list(by_symbol.keys())):
+            rows = []
+            for rec in by_symbol[symbol]:
+                values = compute_outcome(hist, rec.date) if hist is not None else None
+                if values:
+                    if rec.date < cutoff and not values["is_closed"]:
+                        values["is_closed"] = True # Window will not fill any more
+                    rows.append((rec.id, symbol, values))
+                elif rec.date < cutoff:
+                    expired.append((rec.id, symbol))
+            if rows:
+                # Many small per-symbol writes: let the write queue batch them
+                writes.append(write_queue.submit(crud.save_outcomes, rows, commit=False))
+                updated += len(rows)
+    if expired:
+        writes.append(write_queue.submit(crud.close_outcomes, expired, commit=False))
+        print(f"DEBUG: Closed {len(expired)} outcomes older than {OUTCOME_MAX_AGE_DAYS} days without history", flush=True)
+    for future in writes:
+        future.result()
+    print(f"DEBUG: Refreshed {updated} recommendation outcomes", flush=True)
+    return updated
+
+def run_outcome_job():
+    db = database.SessionLocal()
+    try:
+        refresh_outcomes(db)
+    finally:
+        db.close()
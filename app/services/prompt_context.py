@@ -0,0 +1,266 @@
+import os
+import re
+import math
+import hashlib
+import time
+import threading
+
+from .. import metrics
+
+# Token-budgeted prompt context for the LLM calls.
+#
+# Prompts used to grow with the user's data (every holding, every news item,
+# fixed top-N recommendations), and latency / cost grew with them. A
+# ContextBuilder takes sections in priority order, renders row data as
+# compact tables (field names once, not per row), always keeps required
+# text and each table's min_rows, then fills the remaining budget with the
+# most valuable rows; what does not fit is dropped or summarized.
+ANALYSIS_CONTEXT_TOKENS = int(os.environ.get("ANALYSIS_CONTEXT_TOKENS", 1200))
+REPORT_CONTEXT_TOKENS = int(os.environ.get("REPORT_CONTEXT_TOKENS", 2500))
+SHARED_SECTION_TTL = 300
+MARKET_CONTEXT_TOKENS = 400 # Cap for the shared market background section
+
+_CJK = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count: ~1 token per CJK character, ~4 characters per token otherwise."""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def _cell(value) -> str:
+    if value is None or value == "":
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".") if abs(value) < 1e6 else f"{value:.0f}"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+def table_header(columns: list) -> str:
+    return "| " + " | ".join(label for _, label in columns) + " |\n|" + "---|" * len(columns)
+
+def table_row(columns: list, row: dict) -> str:
+    return "| " + " | ".join(_cell(row.get(key)) for key, _ in columns) + " |"
+
+def format_table(columns: list, rows: list) -> str:
+    """columns: [(key, label)]; rows: dicts."""
+    return "\n".join([table_header(columns)] + [table_row(columns, r) for r in rows])
+
+class ContextBuilder:
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.sections = []
+
+    def add_text(self, title: str, text: str, required: bool = True, priority: int = 0):
+        self.sections.append({"kind": "text", "title": title, "text": (text or "").strip(),
+                              "required": required, "priority": priority})
+        return self
+
+    def add_table(self, title: str, columns: list, rows: list, min_rows: int = 1, priority: int = 0, overflow=None):
+        """rows must be ordered most valuable first; overflow(dropped_rows) -> summary line."""
+        self.sections.append({"kind": "table", "title": title, "columns": columns, "rows": list(rows),
+                              "min_rows": min_rows, "priority": priority, "overflow": overflow})
+        return self
+
+    def build(self):
+        """Returns (text, stats). stats: tokens, budget, kept/dropped rows per table."""
+        rendered = {}
+        used = 0
+        order = sorted(range(len(self.sections)), key=lambda i: self.sections[i]["priority"])
+
+        # 1. Fixed parts: required text, table headers and their minimum rows
+        for i in order:
+            s = self.sections[i]
+            if s["kind"] == "text":
+                if s["required"]:
+                    rendered[i] = [s["text"]]
+                    used += estimate_tokens(s["title"]) + estimate_tokens(s["text"]) + 2
+            else:
+                # A table without guaranteed rows pays for its header only once a row fits
+                keep = s["rows"][:s["min_rows"]]
+                rendered[i] = [table_header(s["columns"])] + [table_row(s["columns"], r) for r in keep] if keep else []
+                used += sum(estimate_tokens(line) + 1 for line in rendered[i])
+                if keep:
+                    used += estimate_tokens(s["title"]) + 2
+                s["kept"] = len(keep)
+
+        # 2. Optional text and remaining rows, by priority, while they fit
+        for i in order:
+            s = self.sections[i]
+            if s["kind"] == "text":
+                if not s["required"]:
+                    cost = estimate_tokens(s["title"]) + estimate_tokens(s["text"]) + 2
+                    if used + cost <= self.budget:
+                        rendered[i] = [s["text"]]
+                        used += cost
+                continue
+            for row in s["rows"][s["kept"]:]:
+                line = table_row(s["columns"], row)
+                cost = estimate_tokens(line) + 1
+                if not rendered[i]:
+                    cost += estimate_tokens(s["title"]) + estimate_tokens(table_header(s["columns"])) + 3
+                if used + cost > self.budget:
+                    break
+                if not rendered[i]:
+                    rendered[i].append(table_header(s["columns"]))
+                rendered[i].append(line)
+                used += cost
+                s["kept"] += 1
+            if s["kept"] < len(s["rows"]) and s["overflow"]:
+                note = s["overflow"](s["rows"][s["kept"]:])
+                # Give rows back until the summary line fits too
+                while used + estimate_tokens(note) + 1 > self.budget and s["kept"] > s["min_rows"]:
+                    used -= estimate_tokens(rendered[i].pop()) + 1
+                    s["kept"] -= 1
+                    note = s["overflow"](s["rows"][s["kept"]:])
+                rendered[i].append(note)
+                used += estimate_tokens(note) + 1
+
+        parts = []
+        stats = {"budget": self.budget, "sections": {}}
+        for i, s in enumerate(self.sections):
+            if s["kind"] == "table":
+                stats["sections"][s["title"] or f"table_{i}"] = {"rows": s["kept"], "dropped": len(s["rows"]) - s["kept"]}
+            if i not in rendered or not any(rendered[i]):
+                continue
+            body = "\n".join(rendered[i])
+            parts.append(f"**{s['title']}:**\n{body}" if s["title"] else body)
+        text = "\n\n".join(parts)
+        stats["tokens"] = estimate_tokens(text)
+        return text, stats
+
+# --- Shared sections ---
+# Context that is the same for every user (market background) is rendered
+# once and reused, which also keeps it byte-identical across prompts.
+_shared_lock = threading.Lock()
+_shared = {} # key -> (expires_at, text)
+_shared_stats = {"hits": 0, "builds": 0}
+
+def shared_section(key: str, build, ttl: float = SHARED_SECTION_TTL) -> str:
+    now = time.time()
+    with _shared_lock:
+        entry = _shared.get(key)
+        if entry and entry[0] > now:
+            _shared_stats["hits"] += 1
+            return entry[1]
+    text = build()
+    with _shared_lock:
+        for stale in [k for k, (expires_at, _) in _shared.items() if expires_at <= now]:
+            del _shared[stale]
+        _shared[key] = (now + ttl, text)
+        _shared_stats["builds"] += 1
+    return text
+
+def compact_text(text: str, max_tokens: int) -> str:
+    """Strip indentation and blank lines; cut at a line boundary once max_tokens is reached."""
+    lines, used = [], 0
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+def market_context_section(text: str) -> str:
+    # Every user's report carries the same market background: compact it once per content
+    key = "market:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return shared_section(key, lambda: compact_text(text, MARKET_CONTEXT_TOKENS))
+
+def with_market_context(system_prompt: str, market_context: str) -> str:
+    """Market background goes in the system message: shared, stable prefix across users."""
+    if not market_context:
+        return system_prompt
+    return f"{system_prompt}\n\n**市场宏观背景:**\n{market_context_section(market_context)}"
+
+def get_shared_stats() -> dict:
+    with _shared_lock:
+        return dict(_shared_stats, sections=len(_shared))
+
+# --- Portfolio report prompt ---
+# Built server-side from structured holdings so large portfolios stay inside
+# REPORT_CONTEXT_TOKENS: heaviest positions first, the tail of small
+# positions collapsed into one summary line, then news as space allows.
+# The market background rides in the system message (see with_market_context).
+REPORT_MIN_HOLDINGS = 5
+
+REPORT_SYSTEM_PROMPT = "你是一位拥有20年经验的华尔街高级投资顾问。请根据用户的资产组合（包含技术面数据和仓位权重）、当前模拟的市场新闻以及市场大环境，生成一份专业的投资分析报告。风格需要专业、客观、犀利，使用金融术语但保持易读性。请使用Markdown格式输出。"
+
+REPORT_TASK = """**任务要求:**
+1. **资产健康度评分**: 给组合打分 (0-100)。
+2. **摘要理由**: 一句话点评组合健康度。
+3. **深度持仓分析**: 必须结合【仓位权重】、【技术面指标】(如均线趋势、MACD信号、BOLL位置) 和 【基本面盈亏】对主要持仓进行点评。重点关注重仓股的风险。
+4. **仓位配置建议**: 基于当前的持仓分布，评估是否过于集中或分散，并提出调整建议。
+5. **目标达成分析**: 结合【用户投资目标与资源】，评估当前组合是否能按期达成盈利目标。如果有差距，请结合【可用追加资金】给出具体的补救或加速方案。
+6. **宏观影响**: 结合新闻，解释宏观事件对该组合的具体影响。
+7. **操作建议**: 使用表格形式列出建议：| 标的 | 建议方向 (买入/卖出/持有/减仓) | 逻辑简述 |。
+
+**重要：返回格式要求**:
+请务必在回复的最开始，使用以下XML标签包裹元数据，然后才是正文内容：
+<meta>
+score: [0-100的数字]
+summary: [一句话摘要理由]
+</meta>
+
+正文内容(Markdown)..."""
+
+HOLDING_COLUMNS = [("name", "名称"), ("symbol", "代码"), ("quantity", "持仓"), ("cost_price", "成本"),
+                   ("current_price", "现价"), ("pnl_percent", "盈亏%"), ("value", "市值"), ("weight", "权重%"),
+                   ("trend", "均线趋势"), ("ma5", "MA5"), ("ma20", "MA20"), ("macd_signal", "MACD"),
+                   ("macd_hist", "MACD柱"), ("boll_position", "BOLL")]
+NEWS_COLUMNS = [("title", "标题"), ("source", "来源"), ("summary", "摘要")]
+
+def _num(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def build_portfolio_messages(holdings: list, news: list, goals: dict = None, market_context: str = "",
+                             budget: int = REPORT_CONTEXT_TOKENS):
+    """Returns (messages, stats) for the portfolio report."""
+    rows = []
+    for h in holdings:
+        quantity, cost, price = _num(h.get("quantity")), _num(h.get("cost_price")), _num(h.get("current_price"))
+        rows.append(dict(h, value=round(quantity * price, 2), cost_value=quantity * cost,
+                         pnl_percent=round((price - cost) / cost * 100, 2) if cost > 0 else 0.0))
+    total_value = sum(r["value"] for r in rows)
+    total_cost = sum(r["cost_value"] for r in rows)
+    for r in rows:
+        r["weight"] = round(r["value"] / total_value * 100, 2) if total_value > 0 else 0.0
+    rows.sort(key=lambda r: r["value"], reverse=True)
+
+    def rest_of_holdings(dropped):
+        weight = sum(r["weight"] for r in dropped)
+        value = sum(r["value"] for r in dropped)
+        cost = sum(r["cost_value"] for r in dropped)
+        pnl = (value - cost) / cost * 100 if cost > 0 else 0.0
+        return f"（其余 {len(dropped)} 只小仓位合计: 市值 {value:.2f}, 权重 {weight:.2f}%, 盈亏 {pnl:.2f}%）"
+
+    pnl = total_value - total_cost
+    totals = (f"- 总投入成本: {total_cost:.2f}\n- 当前总市值: {total_value:.2f}\n"
+              f"- 当前盈亏: {pnl:.2f} ({pnl / total_cost * 100 if total_cost > 0 else 0:.2f}%)")
+    goals_info = (f"- 盈利目标: {goals.get('targetProfit')}\n- 期望达成时间: {goals.get('targetDate')}\n"
+                  f"- 可用追加资金: {goals.get('availableCapital')}") if goals else "未设置投资目标"
+
+    builder = ContextBuilder(budget)
+    builder.add_table("用户资产组合 (含技术指标与仓位权重)", HOLDING_COLUMNS, rows,
+                      min_rows=min(REPORT_MIN_HOLDINGS, len(rows)), priority=0, overflow=rest_of_holdings)
+    builder.add_text("账户总体表现", totals, priority=0)
+    builder.add_text("用户投资目标与资源", goals_info, priority=0)
+    builder.add_table("近期市场新闻", NEWS_COLUMNS, news, min_rows=0, priority=2,
+                      overflow=lambda dropped: f"（另有 {len(dropped)} 条新闻未列出）")
+    builder.add_text("", REPORT_TASK, priority=0)
+    context, stats = builder.build()
+    messages = [{"role": "system", "content": with_market_context(REPORT_SYSTEM_PROMPT, market_context)},
+                {"role": "user", "content": context}]
+    return messages, stats
+
+@metrics.register_collector
+def _collect_metrics():
+    with _shared_lock:
+        # Every build follows a miss
+        return metrics.cache_samples("prompt_shared_section", _shared_stats["hits"], _shared_stats["builds"])
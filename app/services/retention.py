@@ -0,0 +1,145 @@
+import os
+import time
+import datetime
+from sqlalchemy import select, func, case, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import models, database
+from .outcome_tracker import OUTCOME_HORIZONS
+
+# Retention rules for screen results (env-overridable)
+RETENTION_RULES = {
+    # Raw executions / recommendations / outcomes older than this are aged out...
+    "raw_days": int(os.environ.get("RETENTION_RAW_DAYS", 90)),
+    # ...except the newest N executions of every strategy
+    "keep_latest": int(os.environ.get("RETENTION_KEEP_LATEST", 5)),
+    # Roll aged-out rows into strategy_daily_stats before deleting them
+    "rollup": os.environ.get("RETENTION_ROLLUP", "1") != "0",
+}
+
+RETENTION_INTERVAL = 6 * 60 * 60
+# Small delete transactions keep the SQLite write lock short; the pause
+# between batches lets queued writers in
+RETENTION_BATCH_SIZE = 200 # executions per transaction (recommendations cascade)
+RETENTION_BATCH_PAUSE = 0.05
+
+# Compaction: pages returned per incremental_vacuum run, and the free-page
+# ratio at which a database not yet in incremental mode gets a full VACUUM
+VACUUM_PAGES = 2000
+VACUUM_FREE_RATIO = 0.25
+
+def expired_execution_ids(db, cutoff: datetime.datetime, keep_latest: int, limit: int) -> list:
+    E = models.StrategyExecution
+    ranked = select(
+        E.id, E.created_at,
+        func.row_number().over(partition_by=E.strategy_id, order_by=(E.created_at.desc(), E.id.desc())).label("rn")
+    ).subquery()
+    return db.execute(
+        select(ranked.c.id)
+        .where(ranked.c.created_at < cutoff, ranked.c.rn > keep_latest)
+        .order_by(ranked.c.id)
+        .limit(limit)
+    ).scalars().all()
+
+def rollup_executions(db, execution_ids: list) -> int:
+    """Add the given executions to strategy_daily_stats (additive upsert, no commit)."""
+    E, R, O = models.StrategyExecution, models.StockRecommendation, models.RecommendationOutcome
+    day = func.date(E.created_at)
+    columns = [
+        E.strategy_id,
+        day.label("day"),
+        func.count(func.distinct(E.id)).label("executions"),
+        func.count(R.id).label("recommendations"),
+        func.coalesce(func.sum(R.change_percent), 0).label("sum_change_percent"),
+    ]
+    for h in OUTCOME_HORIZONS:
+        ret = getattr(O, f"return_t{h}")
+        columns += [
+            func.coalesce(func.sum(ret), 0).label(f"sum_return_t{h}"),
+            func.count(ret).label(f"n_return_t{h}"),
+            func.sum(case((ret > 0, 1), else_=0)).label(f"wins_t{h}"),
+        ]
+    rows = db.execute(
+        select(*columns)
+        .select_from(E)
+        .outerjoin(R, R.execution_id == E.id)
+        .outerjoin(O, O.recommendation_id == R.id)
+        .where(E.id.in_(execution_ids), E.strategy_id.isnot(None))
+        .group_by(E.strategy_id, day)
+    ).mappings().all()
+    if not rows:
+        return 0
+
+    now = datetime.datetime.utcnow()
+    stmt = sqlite_insert(models.StrategyDailyStat)
+    additive = [c for c in rows[0].keys() if c not in ("strategy_id", "day")]
+    set_ = {c: getattr(models.StrategyDailyStat, c) + stmt.excluded[c] for c in additive}
+    set_["updated_at"] = stmt.excluded.updated_at
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=["strategy_id", "day"], set_=set_),
+        [dict(row, updated_at=now) for row in rows]
+    )
+    return len(rows)
+
+def apply_retention(db, rules: dict = None, now: datetime.datetime = None, batch_size: int = RETENTION_BATCH_SIZE) -> dict:
+    """Roll up and delete aged-out executions in small batches. Returns counters."""
+    rules = dict(RETENTION_RULES, **(rules or {}))
+    stats = {"executions": 0, "daily_rows": 0, "batches": 0}
+    # Recommendations and outcomes go through ON DELETE CASCADE; without
+    # foreign_keys the deletes would leave them orphaned
+    if not db.execute(text("PRAGMA foreign_keys")).scalar():
+        print("Retention skipped: PRAGMA foreign_keys is off", flush=True)
+        return stats
+
+    cutoff = (now or datetime.datetime.utcnow()) - datetime.timedelta(days=rules["raw_days"])
+    while True:
+        ids = expired_execution_ids(db, cutoff, rules["keep_latest"], batch_size)
+        if not ids:
+            break
+        if rules["rollup"]:
+            stats["daily_rows"] += rollup_executions(db, ids)
+        db.query(models.StrategyExecution).filter(
+            models.StrategyExecution.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.commit()
+        stats["executions"] += len(ids)
+        stats["batches"] += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(RETENTION_BATCH_PAUSE)
+    return stats
+
+def compact(engine=None) -> dict:
+    """Return free pages to the OS and refresh planner statistics."""
+    engine = engine or database.engine
+    with engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        action = "none"
+        if mode == 2 and free:
+            # Frees one page per step and pysqlite's execute() steps only once;
+            # executescript runs it to completion
+            conn.commit()
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            action = "incremental_vacuum"
+        elif mode != 2 and pages and free / pages >= VACUUM_FREE_RATIO:
+            # Full rewrite, once: also switches the file to incremental mode
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            action = "vacuum"
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.commit()
+        remaining = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return {"action": action, "free_pages_before": free, "free_pages_after": remaining, "page_count": pages}
+
+def run_retention_job():
+    db = database.SessionLocal()
+    try:
+        stats = apply_retention(db)
+    finally:
+        db.close()
+    vacuum = compact()
+    print(f"DEBUG: Retention removed {stats['executions']} executions in {stats['batches']} batches, "
+          f"{stats['daily_rows']} daily rows updated; compaction {vacuum}", flush=True)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import os
+from ..startup_profile import lazy_import
+pd = lazy_import("pandas")
+from datetime import datetime
+
+# Local store of daily A-share spot snapshots (one pickle per trading day).
+# Written by the screener whenever it pulls stock_zh_a_spot_em, read by the
+# parameter sweep so strategies can be evaluated without hitting the network.
+HISTORY_DIR = "spot_history"
+
+# Only the columns the screener and the sweep actually use
+SNAPSHOT_COLUMNS = ['代码', '名称', '最新价', '涨跌幅', '换手率', '量比', '流通市值', '成交额', '成交量', '最高']
+
+def _snapshot_path(date_str: str) -> str:
+    return os.path.join(HISTORY_DIR, f"{date_str}.pkl")
+
+def save_snapshot(df: pd.DataFrame, date_str: str = None):
+    """
+    Persist today's spot snapshot. Later calls on the same day overwrite
+    the earlier one so the stored file always holds the latest (closing) view.
+    """
+    if df is None or df.empty:
+        return
+    if date_str is None:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    cols = [c for c in SNAPSHOT_COLUMNS if c in df.columns]
+    snapshot = df[cols].copy()
+    snapshot['代码'] = snapshot['代码'].astype(str)
+    for c in cols:
+        if c not in ('代码', '名称'):
+            snapshot[c] = pd.to_numeric(snapshot[c], errors='coerce')
+    # Write to a temp file first so a concurrent reader never sees a partial pickle
+    tmp_path = _snapshot_path(date_str) + ".tmp"
+    snapshot.to_pickle(tmp_path)
+    os.replace(tmp_path, _snapshot_path(date_str))
+
+def load_snapshot(date_str: str) -> pd.DataFrame:
+    path = _snapshot_path(date_str)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    return pd.read_pickle(path)
+
+def list_dates() -> list:
+    if not os.path.isdir(HISTORY_DIR):
+        return []
+    return sorted(f[:-4] for f in os.listdir(HISTORY_DIR) if f.endswith(".pkl"))
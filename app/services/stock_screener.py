@@ -1,9 +1,22 @@
-import akshare as ak
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+
+from ..startup_profile import lazy_import
+ak = lazy_import("akshare", instrument="akshare")
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
 from datetime import datetime, timedelta
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import io
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future
+from . import spot_history, cache_backend
+from .. import metrics
 
 def check_stock_details(row, params):
     """
@@ -112,73 +125,245 @@ def check_stock_details(row, params):
         print(f"Error checking {row['代码']}: {e}")
         return None
 
-def execute_strategy(params: dict):
+def screen_snapshot(df: pd.DataFrame, params: dict):
     """
-    Execute stock screening strategy based on params.
+    Run the strategy filters on one spot snapshot.
     Includes advanced filtering for K-line, volume, and intraday trends.
     """
-    try:
-        # 1. Fetch Spot Data (All A-Shares)
-        df = ak.stock_zh_a_spot_em()
-        
-        # 2. Basic Filtering (Pre-filter to reduce API calls for detailed data)
-        filtered_df = df.copy()
+    # 2. Basic Filtering (Pre-filter to reduce API calls for detailed data)
+    prefilter_started = time.perf_counter()
+    filtered_df = df.copy()
+    
+    # Exclude ST, *ST
+    filtered_df = filtered_df[~filtered_df['名称'].str.contains('ST')]
+    filtered_df = filtered_df[~filtered_df['名称'].str.contains('退')]
+    
+    # Change %
+    if 'min_change' in params:
+        filtered_df = filtered_df[filtered_df['涨跌幅'] >= float(params['min_change'])]
+    if 'max_change' in params:
+        filtered_df = filtered_df[filtered_df['涨跌幅'] <= float(params['max_change'])]
         
-        # Exclude ST, *ST
-        filtered_df = filtered_df[~filtered_df['名称'].str.contains('ST')]
-        filtered_df = filtered_df[~filtered_df['名称'].str.contains('退')]
+    # Turnover
+    if 'min_turnover' in params:
+        filtered_df = filtered_df[filtered_df['换手率'] >= float(params['min_turnover'])]
+    if 'max_turnover' in params:
+        filtered_df = filtered_df[filtered_df['换手率'] <= float(params['max_turnover'])]
         
-        # Change %
-        if 'min_change' in params:
-            filtered_df = filtered_df[filtered_df['涨跌幅'] >= float(params['min_change'])]
-        if 'max_change' in params:
-            filtered_df = filtered_df[filtered_df['涨跌幅'] <= float(params['max_change'])]
-            
-        # Turnover
-        if 'min_turnover' in params:
-            filtered_df = filtered_df[filtered_df['换手率'] >= float(params['min_turnover'])]
-        if 'max_turnover' in params:
-            filtered_df = filtered_df[filtered_df['换手率'] <= float(params['max_turnover'])]
-            
-        # Volume Ratio (量比)
-        if 'min_volume_ratio' in params:
-            filtered_df['量比'] = pd.to_numeric(filtered_df['量比'], errors='coerce')
-            filtered_df = filtered_df[filtered_df['量比'] >= float(params['min_volume_ratio'])]
-            
-        # Market Cap (流通市值)
-        if 'min_market_cap' in params:
-            filtered_df = filtered_df[filtered_df['流通市值'] >= float(params['min_market_cap']) * 100000000]
-        if 'max_market_cap' in params:
-            filtered_df = filtered_df[filtered_df['流通市值'] <= float(params['max_market_cap']) * 100000000]
-
-        # Limit candidates for detailed check to avoid API rate limits/timeout
-        # Increase candidate pool slightly but process in parallel
-        candidates = filtered_df.sort_values(by='涨跌幅', ascending=False).head(30)
+    # Volume Ratio (量比)
+    if 'min_volume_ratio' in params:
+        filtered_df['量比'] = pd.to_numeric(filtered_df['量比'], errors='coerce')
+        filtered_df = filtered_df[filtered_df['量比'] >= float(params['min_volume_ratio'])]
         
-        final_results = []
-        
-        # Use ThreadPoolExecutor for concurrent fetching
-        # Max workers 5-10 to be polite to the data source and avoid blocking
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_stock = {executor.submit(check_stock_details, row, params): row for _, row in candidates.iterrows()}
-            
-            for future in as_completed(future_to_stock):
-                res = future.result()
-                if res:
-                    final_results.append(res)
-                    if len(final_results) >= 10:
-                        # Note: This break only stops collecting, but other threads might still be running.
-                        # We can't easily cancel them, but we can stop submitting if we weren't submitting all at once.
-                        # Given we submitted all 30, we just wait or break loop. 
-                        # Since we want top results, maybe we should wait for all 30 and take top 10?
-                        # The original logic was "find first 10". Let's stick to that but we can't easily kill threads.
-                        # Actually, better to collect all valid from top 30 and return top 10.
-                        pass
-
-        # Sort by change percent again to be sure
-        final_results.sort(key=lambda x: x['change_percent'], reverse=True)
-        return final_results[:10]
+    # Market Cap (流通市值)
+    if 'min_market_cap' in params:
+        filtered_df = filtered_df[filtered_df['流通市值'] >= float(params['min_market_cap']) * 100000000]
+    if 'max_market_cap' in params:
+        filtered_df = filtered_df[filtered_df['流通市值'] <= float(params['max_market_cap']) * 100000000]
+
+    # Limit candidates for detailed check to avoid API rate limits/timeout
+    # Increase candidate pool slightly but process in parallel
+    candidates = filtered_df.sort_values(by='涨跌幅', ascending=False).head(30)
+    metrics.observe("screener_stage_seconds", time.perf_counter() - prefilter_started, stage="prefilter")
+    
+    final_results = []
+    
+    # Use ThreadPoolExecutor for concurrent fetching
+    # Max workers 5-10 to be polite to the data source and avoid blocking
+    with metrics.timer("screener_stage_seconds", stage="detail_checks"), ThreadPoolExecutor(max_workers=5) as executor:
+        future_to_stock = {executor.submit(check_stock_details, row, params): row for _, row in candidates.iterrows()}
         
+        for future in as_completed(future_to_stock):
+            res = future.result()
+            if res:
+                final_results.append(res)
+                if len(final_results) >= 10:
+                    # Note: This break only stops collecting, but other threads might still be running.
+                    # We can't easily cancel them, but we can stop submitting if we weren't submitting all at once.
+                    # Given we submitted all 30, we just wait or break loop. 
+                    # Since we want top results, maybe we should wait for all 30 and take top 10?
+                    # The original logic was "find first 10". Let's stick to that but we can't easily kill threads.
+                    # Actually, better to collect all valid from top 30 and return top 10.
+                    pass
+
+    # Sort by change percent again to be sure
+    final_results.sort(key=lambda x: x['change_percent'], reverse=True)
+    return final_results[:10]
+
+# --- Spot snapshot & result cache ---
+# The spot list is shared for SNAPSHOT_TTL seconds; each refresh gets a new
+# version. Screen results are memoized per (snapshot version, params hash),
+# so identical strategies executed against the same snapshot are served
+# from memory instead of re-running the filters and K-line checks.
+SNAPSHOT_TTL = 60
+RESULT_CACHE_SIZE = 128
+
+_snapshot_lock = threading.Lock()
+_snapshot = {"df": None, "version": None, "fetched_at": 0.0}
+SNAPSHOT_FETCH_WAIT = 15 # Seconds another worker's in-flight fetch is waited for
+_shared_spot = cache_backend.namespace("spot", ttl=SNAPSHOT_TTL * 2)
+
+_cache_lock = threading.Lock()
+_result_cache = OrderedDict() # (version, params_hash) -> (results, compute_seconds)
+_inflight = {} # (version, params_hash) -> Future, so concurrent misses compute once
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "saved_seconds": 0.0}
+
+def _canonical(value):
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return str(value)
+
+def params_hash(params: dict) -> str:
+    """Stable hash of strategy params: key order and 3 vs 3.0 do not matter."""
+    raw = json.dumps(_canonical(params or {}), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+def _share_snapshot(entry: dict):
+    # The frame travels as JSON ("split" keeps column order and string codes)
+    _shared_spot.set("snapshot", dict(entry, df=entry["df"].to_json(orient="split", force_ascii=False)))
+
+def _shared_snapshot():
+    entry = _shared_spot.get("snapshot")
+    if entry and time.time() - entry["fetched_at"] < SNAPSHOT_TTL:
+        df = pd.read_json(io.StringIO(entry["df"]), orient="split", dtype=False, convert_dates=False)
+        return dict(entry, df=df)
+    return None
+
+def _fetch_snapshot() -> dict:
+    # 1. Fetch Spot Data (All A-Shares)
+    with metrics.timer("screener_stage_seconds", stage="spot_fetch"):
+        df = ak.stock_zh_a_spot_em()
+
+    # Keep a local copy for offline backtests / parameter sweeps
+    try:
+        spot_history.save_snapshot(df)
+    except Exception as e:
+        print(f"Spot snapshot save failed: {e}")
+
+    now = time.time()
+    return {"df": df, "fetched_at": now, "version": datetime.fromtimestamp(now).strftime("%Y%m%dT%H%M%S.%f")}
+
+def get_spot_snapshot():
+    """Returns (df, version), refreshing the spot list at most once per SNAPSHOT_TTL."""
+    with _snapshot_lock:
+        if _snapshot["df"] is not None and time.time() - _snapshot["fetched_at"] < SNAPSHOT_TTL:
+            return _snapshot["df"], _snapshot["version"]
+
+        # With a shared cache backend one worker fetches and the others
+        # adopt its snapshot (same version, so result cache keys line up)
+        entry = None
+        if cache_backend.get_backend().shared:
+            entry = _shared_snapshot()
+            if entry is None and not _shared_spot.add("fetching", os.getpid(), ttl=SNAPSHOT_FETCH_WAIT):
+                deadline = time.time() + SNAPSHOT_FETCH_WAIT
+                while entry is None and time.time() < deadline:
+                    time.sleep(0.2)
+                    entry = _shared_snapshot()
+            if entry is None:
+                entry = _fetch_snapshot()
+                _share_snapshot(entry)
+                _shared_spot.delete("fetching")
+        else:
+            entry = _fetch_snapshot()
+
+        _snapshot.update(df=entry["df"], fetched_at=entry["fetched_at"], version=entry["version"])
+        return _snapshot["df"], _snapshot["version"]
+
+def run_screen(params: dict):
+    """
+    Execute the strategy, memoized on (snapshot version, params hash).
+    Returns (results, info) where info = {snapshot_version, params_hash, cache_hit}.
+    """
+    info = {"snapshot_version": None, "params_hash": params_hash(params), "cache_hit": False}
+    try:
+        with metrics.timer("screener_stage_seconds", stage="snapshot"):
+            df, version = get_spot_snapshot()
+    except Exception as e:
+        print(f"Strategy Execution Error: {e}")
+        return [], info
+    info["snapshot_version"] = version
+    key = (version, info["params_hash"])
+
+    with _cache_lock:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            _cache_stats["saved_seconds"] += cached[1]
+            info["cache_hit"] = True
+            return copy.deepcopy(cached[0]), info
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+            _cache_stats["misses"] += 1
+
+    if not owner:
+        # Same params already being screened on this snapshot: wait for that run
+        try:
+            results = future.result()
+        except Exception:
+            return [], info
+        with _cache_lock:
+            _cache_stats["hits"] += 1
+        info["cache_hit"] = True
+        return copy.deepcopy(results), info
+
+    started = time.time()
+    try:
+        with metrics.timer("screener_stage_seconds", stage="screen"):
+            results = screen_snapshot(df, params)
     except Exception as e:
         print(f"Strategy Execution Error: {e}")
-        return []
+        with _cache_lock:
+            _inflight.pop(key, None)
+        future.set_exception(e)
+        return [], info
+
+    with _cache_lock:
+        _result_cache[key] = (results, time.time() - started)
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+            _cache_stats["evictions"] += 1
+        _inflight.pop(key, None)
+    future.set_result(results)
+    return copy.deepcopy(results), info
+
+def execute_strategy(params: dict):
+    """
+    Execute stock screening strategy based on params.
+    Includes advanced filtering for K-line, volume, and intraday trends.
+    """
+    results, _ = run_screen(params)
+    return results
+
+def get_cache_stats() -> dict:
+    with _cache_lock:
+        lookups = _cache_stats["hits"] + _cache_stats["misses"]
+        return {
+            "hits": _cache_stats["hits"],
+            "misses": _cache_stats["misses"],
+            "hit_ratio": round(_cache_stats["hits"] / lookups, 4) if lookups else 0.0,
+            "evictions": _cache_stats["evictions"],
+            "saved_seconds": round(_cache_stats["saved_seconds"], 3),
+            "size": len(_result_cache),
+            "max_size": RESULT_CACHE_SIZE,
+            "snapshot_version": _snapshot["version"],
+            "snapshot_age": round(time.time() - _snapshot["fetched_at"], 1) if _snapshot["fetched_at"] else None,
+        }
+
+metrics.histogram("screener_stage_seconds", "Screener time per stage: snapshot (cached or fetched), spot_fetch, prefilter, detail_checks, screen (all of screen_snapshot)")
+
+@metrics.register_collector
+def _collect_metrics():
+    with _cache_lock:
+        return metrics.cache_samples("screen_result", _cache_stats["hits"], _cache_stats["misses"],
+                                     {"evictions": _cache_stats["evictions"]})
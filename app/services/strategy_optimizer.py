@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import itertools
+from ..startup_profile import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+from . import spot_history
+
+# Spot-level predicates: (param key, column, comparison, scale).
+# Same semantics as stock_screener.execute_strategy.
+RANGE_PREDICATES = [
+    ('min_change', '涨跌幅', 'ge', 1),
+    ('max_change', '涨跌幅', 'le', 1),
+    ('min_turnover', '换手率', 'ge', 1),
+    ('max_turnover', '换手率', 'le', 1),
+    ('min_volume_ratio', '量比', 'ge', 1),
+    ('min_market_cap', '流通市值', 'ge', 100000000),
+    ('max_market_cap', '流通市值', 'le', 100000000),
+]
+RANGE_KEYS = [p[0] for p in RANGE_PREDICATES]
+
+# Cheap intraday predicates applied on top of the shared range mask
+INTRADAY_KEYS = ['check_strong_trend', 'check_new_high_pullback']
+
+# check_ma_alignment / check_volume_up need per-symbol K-line history that is
+# not stored locally, so they are ignored by the sweep.
+SWEEPABLE_KEYS = RANGE_KEYS + INTRADAY_KEYS
+
+METRICS = ('avg_return', 'win_rate', 'total_return')
+
+CHECKPOINT_DIR = "sweep_checkpoints"
+# Grids are checked against this before any value list is built
+MAX_SWEEP_COMBINATIONS = int(os.environ.get("MAX_SWEEP_COMBINATIONS", 5000))
+MAX_SWEEP_SECONDS = 300 # Upper bound on a request's time_budget
+
+class GridTooLarge(ValueError):
+    pass
+
+def count_values(spec) -> int:
+    """Length of expand_values(spec) without building it."""
+    if isinstance(spec, dict):
+        start = float(spec['start'])
+        stop = float(spec['stop'])
+        step = float(spec.get('step', 1))
+        if step <= 0:
+            raise ValueError("step must be positive")
+        if stop < start:
+            return 0
+        return int((stop - start) / step + 0.5) + 1
+    if isinstance(spec, (list, tuple)):
+        return len(spec)
+    return 1
+
+def check_grid_size(grid: dict) -> int:
+    total = 1
+    for spec in grid.values():
+        total *= count_values(spec)
+        if total > MAX_SWEEP_COMBINATIONS:
+            raise GridTooLarge(f"Parameter grid exceeds {MAX_SWEEP_COMBINATIONS} combinations")
+    return total
+
+def expand_values(spec):
+    """
+    A grid value is either an explicit list or a range dict
+    {"start": 1, "stop": 5, "step": 1} (stop inclusive).
+    """
+    if isinstance(spec, dict):
+        start = float(spec['start'])
+        stop = float(spec['stop'])
+        step = float(spec.get('step', 1))
+        if step <= 0:
+            raise ValueError("step must be positive")
+        values = np.arange(start, stop + step / 2, step)
+        return [round(float(v), 6) for v in values]
+    if isinstance(spec, (list, tuple)):
+        return list(spec)
+    return [spec]
+
+def expand_grid(base_params: dict, grid: dict) -> list:
+    unknown = [k for k in grid if k not in SWEEPABLE_KEYS]
+    if unknown:
+        raise ValueError(f"Unsupported sweep params: {unknown}")
+    check_grid_size(grid)
+    keys = sorted(grid.keys())
+    value_lists = [expand_values(grid[k]) for k in keys]
+    combos = []
+    for values in itertools.product(*value_lists):
+        params = dict(base_params or {})
+        params.update(dict(zip(keys, values)))
+        combos.append(params)
+    return combos
+
+def _range_key(params: dict) -> tuple:
+    return tuple((k, float(params[k])) for k in RANGE_KEYS if params.get(k) is not None)
+
+def _atom_mask(df: pd.DataFrame, key: str, value: float) -> np.ndarray:
+    for k, col, op, scale in RANGE_PREDICATES:
+        if k == key:
+            series = df[col]
+            if op == 'ge':
+                return (series >= value * scale).to_numpy()
+            return (series <= value * scale).to_numpy()
+    raise KeyError(key)
+
+def _intraday_mask(df: pd.DataFrame, params: dict) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    if not (params.get('check_strong_trend') or params.get('check_new_high_pullback')):
+        return mask
+    volume = df['成交量'] * 100
+    avg_price = (df['成交额'] / volume.where(volume > 0)).to_numpy()
+    price = df['最新价'].to_numpy()
+    # Rows without volume are left untouched, like the live worker does
+    has_avg = ~np.isnan(avg_price)
+    if params.get('check_strong_trend'):
+        mask &= ~has_avg | (price >= avg_price)
+    if params.get('check_new_high_pullback'):
+        high = df['最高'].to_numpy()
+        mask &= ~has_avg | ((price >= high * 0.98) & (price > avg_price))
+    return mask
+
+def _evaluate_day(date_str: str, next_date: str, combos: list, top_n: int) -> dict:
+    """
+    Worker: evaluate every combo on one trading day.
+    Returns {combo_index: [picks, sum_return_pct, wins]}.
+    """
+    today = spot_history.load_snapshot(date_str)
+    tomorrow = spot_history.load_snapshot(next_date)
+    if today.empty or tomorrow.empty:
+        return {}
+
+    today = today[~today['名称'].str.contains('ST|退', na=False)]
+    today = today[today['最新价'] > 0].reset_index(drop=True)
+
+    next_price = tomorrow.set_index('代码')['最新价']
+    next_price = next_price[~next_price.index.duplicated()]
+    fwd = (today['代码'].map(next_price) / today['最新价'] - 1) * 100
+    fwd = fwd.to_numpy()
+    change = today['涨跌幅'].to_numpy()
+
+    # Masks are shared per day: atoms by (key, value), the AND of all range
+    # predicates by the range part of the params. Combos that only differ in
+    # the intraday flags reuse the same range mask.
+    atom_cache = {}
+    range_cache = {}
+    out = {}
+    for idx, params in enumerate(combos):
+        rkey = _range_key(params)
+        range_mask = range_cache.get(rkey)
+        if range_mask is None:
+            range_mask = np.ones(len(today), dtype=bool)
+            for key, value in rkey:
+                atom = atom_cache.get((key, value))
+                if atom is None:
+                    atom = _atom_mask(today, key, value)
+                    atom_cache[(key, value)] = atom
+                range_mask = range_mask & atom
+            range_cache[rkey] = range_mask
+
+        mask = range_mask
+        if any(params.get(k) for k in INTRADAY_KEYS):
+            mask = range_mask & _intraday_mask(today, params)
+        idxs = np.flatnonzero(mask & ~np.isnan(fwd))
+        if len(idxs) == 0:
+            out[idx] = [0, 0.0, 0]
+            continue
+        # Same ranking as the live screener: strongest movers first
+        picks = idxs[np.argsort(-change[idxs], kind='stable')[:top_n]]
+        rets = fwd[picks]
+        out[idx] = [int(len(picks)), float(rets.sum()), int((rets > 0).sum())]
+    return out
+
+def _signature(base_params: dict, grid: dict, top_n: int) -> str:
+    raw = json.dumps({"base": base_params, "grid": grid, "top_n": top_n}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _load_checkpoint(path: str, signature: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('signature') == signature:
+            return data.get('days', {})
+    except Exception as e:
+        print(f"Sweep checkpoint load failed: {e}")
+    return {}
+
+def _save_checkpoint(path: str, signature: str, days: dict):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"signature": signature, "days": days}, f)
+    os.replace(tmp_path, path)
+
+def _aggregate(combos: list, days: dict, grid_keys: list) -> list:
+    rows = []
+    for idx, params in enumerate(combos):
+        picks = 0
+        total = 0.0
+        wins = 0
+        active_days = 0
+        for day_result in days.values():
+            stats = day_result.get(str(idx))
+            if not stats or stats[0] == 0:
+                continue
+            picks += stats[0]
+            total += stats[1]
+            wins += stats[2]
+            active_days += 1
+        rows.append({
+            "params": {k: params.get(k) for k in grid_keys},
+            "picks": picks,
+            "active_days": active_days,
+            "avg_return": round(total / picks, 4) if picks else 0.0,
+            "win_rate": round(wins / picks * 100, 2) if picks else 0.0,
+            "total_return": round(total, 4),
+        })
+    return rows
+
+def run_sweep(base_params: dict, grid: dict, metric: str = "avg_return", top_n: int = 10,
+              time_budget: float = None, max_workers: int = None, checkpoint_path: str = None,
+              limit: int = 20) -> dict:
+    """
+    Evaluate every parameter combination of `grid` (merged over `base_params`)
+    against the locally stored spot history, using a process pool with one
+    task per trading day. Each pick is scored by its next-day close-to-close
+    return. Completed days are written to `checkpoint_path`, so a sweep cut
+    short by `time_budget` picks up where it left off on the next call.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}")
+    combos = expand_grid(base_params, grid)
+    if not combos:
+        raise ValueError("Empty parameter grid")
+
+    dates = spot_history.list_dates()
+    day_pairs = list(zip(dates[:-1], dates[1:]))
+    signature = _signature(base_params, grid, top_n)
+    days = _load_checkpoint(checkpoint_path, signature)
+    pending = [(d, n) for d, n in day_pairs if d not in days]
+
+    start = time.time()
+    timed_out = False
+    if pending:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {executor.submit(_evaluate_day, d, n, combos, top_n): d for d, n in pending}
+            remaining = None if time_budget is None else max(time_budget - (time.time() - start), 0)
+            try:
+                for future in as_completed(futures, timeout=remaining):
+                    day = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Sweep day {day} failed: {e}")
+                        continue
+                    days[day] = {str(k): v for k, v in result.items()}
+                    _save_checkpoint(checkpoint_path, signature, days)
+            except FuturesTimeout:
+                timed_out = True
+        finally:
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+    grid_keys = sorted(grid.keys())
+    rows = _aggregate(combos, days, grid_keys)
+    rows.sort(key=lambda r: (r[metric], r['picks']), reverse=True)
+    for rank, row in enumerate(rows, start=1):
+        row['rank'] = rank
+
+    return {
+        "metric": metric,
+        "combinations": len(combos),
+        "total_days": len(day_pairs),
+        "evaluated_days": len([d for d, _ in day_pairs if d in days]),
+        "complete": not timed_out and len(days) >= len(day_pairs),
+        "elapsed": round(time.time() - start, 3),
+        "results": rows[:limit],
+    }
+
+def checkpoint_path_for(strategy_id: int, base_params: dict, grid: dict, top_n: int) -> str:
+    # One file per (strategy, sweep): concurrent sweeps of a strategy do not share a checkpoint
+    return os.path.join(CHECKPOINT_DIR, f"strategy_{strategy_id}_{_signature(base_params, grid, top_n)[:16]}.json")
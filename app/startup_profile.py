@@ -0,0 +1,103 @@
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from . import metrics
+
+# Lazy imports and a startup timing breakdown.
+#
+# akshare / pandas / tushare take about a second to import and most
+# requests never touch them. lazy_import() returns a stand-in that imports
+# the real module on first attribute access and records how long that took,
+# so a worker becomes healthy without paying for them. phase() times the
+# startup steps; report() feeds /api/health. With instrument="<source>"
+# every public function fetched from the module is timed as an upstream
+# call (akshare: one scrape per function).
+PROCESS_START = time.perf_counter() # Roughly when the app package was first imported
+
+_lock = threading.Lock()
+_imports = {} # module name -> {"seconds", "loaded_at", "trigger"}
+_phases = {} # phase name -> {"seconds", "status"}
+
+class LazyModule:
+    def __init__(self, name: str, instrument: str = None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_instrument", instrument)
+        object.__setattr__(self, "_wrapped", {}) # attr -> (original, timed wrapper)
+
+    def _load(self):
+        module = object.__getattribute__(self, "_module")
+        if module is not None:
+            return module
+        name = object.__getattribute__(self, "_name")
+        started = time.perf_counter()
+        preloaded = name in sys.modules
+        module = importlib.import_module(name)
+        seconds = time.perf_counter() - started
+        object.__setattr__(self, "_module", module)
+        with _lock:
+            if name not in _imports:
+                frame = sys._getframe(2)
+                _imports[name] = {
+                    "seconds": round(seconds, 4),
+                    "loaded_at": round(started - PROCESS_START, 3), # Seconds after process start
+                    "trigger": "preloaded" if preloaded else f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}",
+                }
+        if not preloaded:
+            print(f"DEBUG: Lazy import of {name} took {seconds:.3f}s", flush=True)
+        return module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        source = object.__getattribute__(self, "_instrument")
+        if source is None or attr.startswith("_") or isinstance(value, type) or not callable(value):
+            return value
+        if getattr(value, "_upstream_timed", False):
+            return value
+        wrapped = object.__getattribute__(self, "_wrapped")
+        entry = wrapped.get(attr)
+        if entry is None or entry[0] is not value: # Re-wrap when the function was replaced
+            entry = wrapped[attr] = (value, metrics.timed_upstream(source, attr, value))
+        return entry[1]
+
+    def __setattr__(self, attr, value):
+        if getattr(value, "_upstream_timed", False):
+            value = value.__wrapped__ # Never store our own wrapper on the module
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {object.__getattribute__(self, '_name')}>"
+
+def lazy_import(name: str, instrument: str = None) -> LazyModule:
+    return LazyModule(name, instrument)
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        with _lock:
+            _phases[name] = {"seconds": round(time.perf_counter() - started, 4), "status": status}
+
+def record_phase(name: str, seconds: float, status: str = "ok"):
+    # For steps that run in the background and report when done
+    with _lock:
+        _phases[name] = {"seconds": round(seconds, 4), "status": status}
+
+def report() -> dict:
+    with _lock:
+        return {
+            "uptime_seconds": round(time.perf_counter() - PROCESS_START, 3),
+            "phases": {k: dict(v) for k, v in _phases.items()},
+            "lazy_imports": {k: dict(v) for k, v in _imports.items()},
+        }
@@ -0,0 +1,122 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from . import database, metrics
+
+class WriteQueue:
+    """
+    Funnels small writes through one writer thread and commits them in
+    batches. SQLite allows a single writer at a time, so many tiny
+    transactions from different threads mostly wait on each other; grouping
+    them turns N commits (N fsyncs) into one.
+
+    A job is a callable fn(db, *args, **kwargs) that stages changes on the
+    given session and must NOT commit. If a batch fails to commit, its jobs
+    are replayed one by one so a single bad job does not sink the others.
+    """
+
+    def __init__(self, session_factory=None, max_batch: int = 100, max_delay: float = 0.01):
+        self.session_factory = session_factory or database.SessionLocal
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"jobs": 0, "batches": 0, "commits": 0, "failed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-write-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self.start()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    async def submit_async(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None) # Finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._apply(batch)
+
+    def _apply(self, batch):
+        self.stats["batches"] += 1
+        self.stats["jobs"] += len(batch)
+        db = self.session_factory()
+        try:
+            results = []
+            for fn, args, kwargs, _ in batch:
+                results.append(fn(db, *args, **kwargs))
+            db.commit()
+            self.stats["commits"] += 1
+            for (_, _, _, future), result in zip(batch, results):
+                future.set_result(result)
+            return
+        except Exception as e:
+            db.rollback()
+            print(f"Write batch of {len(batch)} failed ({e}), retrying jobs individually", flush=True)
+        finally:
+            db.close()
+
+        for fn, args, kwargs, future in batch:
+            db = self.session_factory()
+            try:
+                result = fn(db, *args, **kwargs)
+                db.commit()
+                self.stats["commits"] += 1
+                future.set_result(result)
+            except Exception as e:
+                db.rollback()
+                self.stats["failed"] += 1
+                future.set_exception(e)
+            finally:
+                db.close()
+
+# Shared queue for the app database
+write_queue = WriteQueue()
+
+@metrics.register_collector
+def _collect_metrics():
+    stats = dict(write_queue.stats)
+    return [
+        ("write_queue_depth", "gauge", "Write jobs waiting for the writer thread", [({}, write_queue._queue.qsize())]),
+        ("write_queue_jobs_total", "counter", "Write jobs applied", [({}, stats["jobs"])]),
+        ("write_queue_commits_total", "counter", "Write queue commits", [({}, stats["commits"])]),
+        ("write_queue_failed_total", "counter", "Write jobs that failed on their own", [({}, stats["failed"])]),
+    ]
@@ -0,0 +1,81 @@
+"""
+Benchmark: authenticated request throughput with and without the user cache
+in app/auth.py.
+
+Mounts the auth router on a bare FastAPI app backed by a temporary database,
+logs in once, then hammers GET /api/auth/me (JWT decode + current user
+dependency chain) from several client threads.
+
+    python bench_auth_cache.py [requests] [threads]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import auth, models
+from app.database import Base, create_tuned_async_engine
+from app.routers import auth as auth_router
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+def build_app():
+    path = os.path.join(tempfile.mkdtemp(), "auth_bench.db")
+    engine = create_tuned_async_engine(f"sqlite+aiosqlite:///{path}")
+    SessionFactory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with SessionFactory() as db:
+            db.add(models.User(username="bench", hashed_password=auth.get_password_hash("bench"), role="user"))
+            await db.commit()
+    asyncio.run(setup())
+
+    async def override_db():
+        async with SessionFactory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    app.dependency_overrides[auth.get_async_db] = override_db
+    return app
+
+def run(label, client, headers):
+    auth.clear_user_cache()
+    latencies = []
+
+    def one(_):
+        started = time.perf_counter()
+        resp = client.get("/api/auth/me", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        assert resp.status_code == 200, resp.text
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(one, range(REQUESTS)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:<22} req/s={REQUESTS / elapsed:>8.1f}  p50={p50:>6.2f} ms  p99={p99:>6.2f} ms")
+
+if __name__ == "__main__":
+    print(f"{REQUESTS} requests, {THREADS} client threads")
+    print("-" * 70)
+    with TestClient(build_app()) as client:
+        token = client.post("/api/auth/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        ttl = auth.USER_CACHE_TTL
+        auth.USER_CACHE_TTL = 0
+        run("no user cache", client, headers)
+        auth.USER_CACHE_TTL = ttl or 30
+        run(f"user cache (ttl={auth.USER_CACHE_TTL:g}s)", client, headers)
+        print(f"cache stats: {auth.get_user_cache_stats()}")
@@ -0,0 +1,108 @@
+"""
+Benchmark: bulk write paths in app/crud.py vs the previous per-row versions.
+
+Runs against a throwaway SQLite file (so commit/fsync cost is real) and
+reports commit count and wall time for 1,000-row batches.
+
+    python bench_crud_bulk.py [rows]
+"""
+import os
+import sys
+import time
+import uuid
+import tempfile
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas, crud
+from app.database import Base
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+# --- Previous implementations (kept here for comparison only) ---
+
+def legacy_save_assets_bulk(db, assets, user_id):
+    db.query(models.Asset).filter(models.Asset.user_id == user_id).delete()
+    for asset in assets:
+        db_asset = models.Asset(
+            id=asset.id, symbol=asset.symbol, name=asset.name, type=asset.type,
+            quantity=asset.quantity, cost_price=asset.costPrice,
+            current_price=asset.currentPrice, currency=asset.currency, user_id=user_id
+        )
+        db.merge(db_asset)
+        db.commit()
+
+def legacy_save_reports_bulk(db, reports, user_id):
+    db.query(models.Report).filter(models.Report.user_id == user_id).delete()
+    for r in reports:
+        db.add(models.Report(**r.dict(), user_id=user_id))
+    db.commit()
+
+def legacy_save_recommendations(db, recs):
+    saved = []
+    for r in recs:
+        db_rec = models.StockRecommendation(**r.dict())
+        db.add(db_rec)
+        db.commit()
+        db.refresh(db_rec)
+        saved.append(db_rec)
+    return saved
+
+# --- Fixtures ---
+
+def make_assets(n):
+    return [schemas.AssetCreate(
+        id=str(uuid.uuid4()), symbol=f"{600000 + i}", name=f"股票{i}", type="STOCK",
+        quantity=100 + i, costPrice=10.0, currentPrice=11.0, currency="CNY"
+    ) for i in range(n)]
+
+def make_reports(n):
+    return [schemas.ReportCreate(
+        id=str(uuid.uuid4()), timestamp=f"2026-01-01T00:00:{i % 60:02d}", summary="摘要",
+        content="正文" * 500, score=60, model_name="deepseek-chat"
+    ) for i in range(n)]
+
+def make_recs(n, strategy_id, execution_id):
+    return [schemas.StockRecommendationCreate(
+        strategy_id=strategy_id, execution_id=execution_id, symbol=f"{600000 + i}", name=f"股票{i}",
+        date="2026-01-01", price=10.0, change_percent=3.0, volume_ratio=1.5, turnover_rate=5.0,
+        reason={"hit_criteria": ["涨幅: 3%"]}
+    ) for i in range(n)]
+
+def run(label, fn):
+    tmp_dir = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    commits = [0]
+    event.listen(engine, "commit", lambda conn: commits.__setitem__(0, commits[0] + 1))
+    db = sessionmaker(bind=engine)()
+
+    user = models.User(username="bench", hashed_password="x")
+    db.add(user)
+    db.commit()
+    strategy = models.Strategy(name="bench", params={}, user_id=user.id)
+    db.add(strategy)
+    db.commit()
+    execution = models.StrategyExecution(strategy_id=strategy.id)
+    db.add(execution)
+    db.commit()
+
+    commits[0] = 0
+    start = time.perf_counter()
+    fn(db, user.id, strategy.id, execution.id)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} commits={commits[0]:>5}  time={elapsed * 1000:>9.1f} ms")
+    db.close()
+    engine.dispose()
+
+if __name__ == "__main__":
+    assets = make_assets(ROWS)
+    reports = make_reports(ROWS)
+    print(f"Rows per batch: {ROWS}")
+    print("-" * 72)
+    run("assets   legacy (merge+commit per row)", lambda db, u, s, e: legacy_save_assets_bulk(db, assets, u))
+    run("assets   bulk upsert", lambda db, u, s, e: crud.save_assets_bulk(db, assets, u))
+    run("reports  legacy (delete all + re-add)", lambda db, u, s, e: legacy_save_reports_bulk(db, reports, u))
+    run("reports  bulk upsert", lambda db, u, s, e: crud.save_reports_bulk(db, reports, u))
+    run("recs     legacy (commit+refresh per row)", lambda db, u, s, e: legacy_save_recommendations(db, make_recs(ROWS, s, e)))
+    run("recs     bulk insert ... returning", lambda db, u, s, e: crud.save_recommendations_bulk(db, make_recs(ROWS, s, e)))
@@ -0,0 +1,126 @@
+"""
+Load test: latency of an ordinary authenticated endpoint (GET /api/auth/me)
+while 100 logins hit POST /api/auth/token at the same time.
+
+Starts the auth router under uvicorn on a free local port with a temporary
+database. The burst is run twice:
+  - "bcrypt on event loop": verify_password called inline, as before
+  - "bcrypt worker pool":   auth.verify_password_async (bounded pool + 503 backpressure)
+
+    python bench_login_burst.py [concurrent_logins]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+import requests
+import uvicorn
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import auth, models
+from app.database import Base, create_tuned_async_engine
+from app.routers import auth as auth_router
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+PROBE_INTERVAL = 0.01
+
+def build_app():
+    path = os.path.join(tempfile.mkdtemp(), "login_bench.db")
+    engine = create_tuned_async_engine(f"sqlite+aiosqlite:///{path}")
+    SessionFactory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with SessionFactory() as db:
+            db.add(models.User(username="bench", hashed_password=auth.get_password_hash("bench"), role="user"))
+            await db.commit()
+    asyncio.run(setup())
+
+    async def override_db():
+        async with SessionFactory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    app.dependency_overrides[auth.get_async_db] = override_db
+    return app
+
+def start_server(app):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server.install_signal_handlers = lambda: None
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+def probe(base_url, headers, stop_event):
+    # Sequential GET /me calls until stopped, returning their latencies
+    latencies = []
+    session = requests.Session()
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        session.get(f"{base_url}/api/auth/me", headers=headers, timeout=60)
+        latencies.append(time.perf_counter() - started)
+        time.sleep(PROBE_INTERVAL)
+    return latencies
+
+def burst(label, base_url, headers):
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as probe_pool:
+        idle = probe_pool.submit(probe, base_url, headers, stop_event)
+        time.sleep(1)
+        stop_event.set()
+        idle_latencies = idle.result()
+
+    statuses = {}
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as probe_pool:
+        busy = probe_pool.submit(probe, base_url, headers, stop_event)
+
+        def login(_):
+            resp = requests.post(f"{base_url}/api/auth/token", data={"username": "bench", "password": "bench"}, timeout=120)
+            return resp.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=LOGINS) as pool:
+            for code in pool.map(login, range(LOGINS)):
+                statuses[code] = statuses.get(code, 0) + 1
+        burst_time = time.perf_counter() - started
+        stop_event.set()
+        busy_latencies = busy.result()
+
+    print(f"{label}")
+    print(f"  /me idle         p50={percentile(idle_latencies, 0.5):>8.1f} ms  p99={percentile(idle_latencies, 0.99):>8.1f} ms")
+    print(f"  /me during burst p50={percentile(busy_latencies, 0.5):>8.1f} ms  p99={percentile(busy_latencies, 0.99):>8.1f} ms  max={max(busy_latencies) * 1000:>8.1f} ms")
+    print(f"  {LOGINS} logins in {burst_time:.2f}s, status codes: {statuses}")
+
+if __name__ == "__main__":
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS}, hash workers={auth.PASSWORD_HASH_WORKERS}, queue={auth.PASSWORD_HASH_QUEUE}")
+    print("-" * 80)
+    server, base_url = start_server(build_app())
+    token = requests.post(f"{base_url}/api/auth/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    pooled = auth.verify_password_async
+    async def inline_verify(plain_password, hashed_password):
+        return auth.verify_password(plain_password, hashed_password)
+    auth.verify_password_async = inline_verify
+    burst("bcrypt on event loop", base_url, headers)
+
+    auth.verify_password_async = pooled
+    burst("bcrypt worker pool", base_url, headers)
+
+    server.should_exit = True
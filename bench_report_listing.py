@@ -0,0 +1,115 @@
+"""
+Benchmark: report list payload and latency for 500 reports.
+
+Compares, on a temporary database:
+  - full listing      every report with its content (the previous GET /api/reports)
+  - summary listing   GET /api/reports (id, timestamp, summary, score, model_name)
+  - conditional GET   GET /api/reports with If-None-Match -> 304
+  - one report body   GET /api/reports/{id}
+and prints how much the compressed content column saves on disk.
+
+    python bench_report_listing.py [reports] [rounds]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+from typing import List
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import auth, models, schemas, async_crud
+from app.database import Base, create_tuned_async_engine
+from app.routers import auth as auth_router, data as data_router
+
+N_REPORTS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+SECTIONS = ["## 市场概况", "## 持仓分析", "## 风险提示", "## 操作建议"]
+PHRASES = [
+    "当前组合集中度偏高，建议适度分散。", "**贵州茅台** 估值处于历史中位附近。",
+    "- 科技板块短期波动加大，注意仓位控制。", "宏观流动性保持合理充裕，利率中枢下移。",
+    "- 新能源产业链景气度回升，关注龙头公司。", "北向资金连续净流入，市场风险偏好改善。",
+]
+
+def fake_report_body(rng) -> str:
+    # ~8 KB of markdown, similar to the AI analysis output
+    parts = []
+    for section in SECTIONS:
+        parts.append(section)
+        parts.extend(rng.choice(PHRASES) for _ in range(60))
+    return "\n".join(parts)
+
+def build_app():
+    path = os.path.join(tempfile.mkdtemp(), "reports_bench.db")
+    engine = create_tuned_async_engine(f"sqlite+aiosqlite:///{path}")
+    SessionFactory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    rng = random.Random(0)
+    reports = [
+        schemas.ReportCreate(
+            id=f"report-{i}", timestamp=f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}T09:30:00",
+            summary="组合整体健康，科技仓位偏重。", content=fake_report_body(rng), score=rng.randint(40, 95),
+            model_name="deepseek-chat"
+        )
+        for i in range(N_REPORTS)
+    ]
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with SessionFactory() as db:
+            db.add(models.User(username="bench", hashed_password=auth.get_password_hash("bench"), role="user"))
+            await db.commit()
+            await async_crud.save_reports_bulk(db, reports, 1)
+        async with engine.connect() as conn:
+            stored = (await conn.execute(text("SELECT sum(length(content)) FROM reports"))).scalar()
+        return stored
+    stored = asyncio.run(setup())
+    raw = sum(len(r.content.encode("utf-8")) for r in reports)
+
+    async def override_db():
+        async with SessionFactory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    app.include_router(data_router.router)
+    app.dependency_overrides[auth.get_async_db] = override_db
+
+    @app.get("/legacy/reports", response_model=List[schemas.ReportBase])
+    async def legacy_reports(current_user: models.User = Depends(auth.get_current_active_user), db=Depends(auth.get_async_db)):
+        return await async_crud.get_reports(db, current_user.id)
+
+    return app, raw, stored
+
+def timed(label, client, url, headers, expect):
+    latencies = []
+    size = 0
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        resp = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        assert resp.status_code == expect, (resp.status_code, resp.text[:200])
+        size = len(resp.content)
+    latencies.sort()
+    print(f"{label:<18} status={expect}  payload={size / 1024:>9.1f} KiB  "
+          f"p50={latencies[len(latencies) // 2] * 1000:>7.2f} ms  max={latencies[-1] * 1000:>7.2f} ms")
+
+if __name__ == "__main__":
+    app, raw, stored = build_app()
+    print(f"{N_REPORTS} reports, {ROUNDS} rounds, codec={models.COMPRESSION_CODEC}")
+    print(f"content on disk: {stored / 1024:.1f} KiB compressed vs {raw / 1024:.1f} KiB raw ({raw / max(stored, 1):.1f}x)")
+    print("-" * 90)
+    with TestClient(app) as client:
+        token = client.post("/api/auth/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        timed("full listing", client, "/legacy/reports", headers, 200)
+        timed("summary listing", client, "/api/reports", headers, 200)
+        etag = client.get("/api/reports", headers=headers).headers["etag"]
+        timed("conditional GET", client, "/api/reports", dict(headers, **{"If-None-Match": etag}), 304)
+        timed("one report body", client, "/api/reports/report-7", headers, 200)
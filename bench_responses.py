@@ -0,0 +1,90 @@
+"""
+Response layer benchmark: serialization time and payload size per endpoint.
+
+For payloads shaped like /api/macro, /api/strategies/tracking, /api/reports
+and /api/stock_info it compares Starlette's JSONResponse (json.dumps) with
+FastJSONResponse (orjson when installed), and the wire size raw / gzip / br.
+It also times the /api/macro series conversion, iterrows vs column-wise.
+
+    python bench_responses.py [repeats]
+"""
+import sys
+import time
+import statistics
+import pandas as pd
+from starlette.responses import JSONResponse
+
+from app import responses
+from app.responses import FastJSONResponse
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+def macro_payload():
+    series = lambda n: [{"date": f"20{10 + i // 12:02d}-{i % 12 + 1:02d}", "value": round(0.1 * i, 2)} for i in range(n)]
+    return {"cpi": series(24), "ppi": series(24), "gdp": series(12), "deposit_volume": series(12),
+            "lpr": [{"date": f"2024-{i + 1:02d}-20", "value_1y": 3.45, "value_5y": 3.95} for i in range(12)],
+            "exchange_rate": [], "deposit_rates": [], "pmi": [], "fx_reserves": []}
+
+def tracking_payload(n=500):
+    return [{"id": i, "symbol": f"{600000 + i}", "name": "示例股份", "strategy_name": "放量突破",
+             "execution_date": "2024-10-18 14:30", "recommend_price": 12.34, "current_price": 13.1,
+             "return_percent": 6.16, "execution_id": i // 10, "return_t1": 1.2, "return_t3": 3.4,
+             "return_t5": None, "return_t20": None, "max_favorable": 7.8, "max_adverse": -2.1,
+             "window_closed": False} for i in range(n)]
+
+def reports_payload(n=200):
+    return [{"id": f"rep-{i}", "date": "2024-10-18T10:00:00", "score": 72, "summary": "组合集中度偏高，科技仓位占比过大，需要适度分散。",
+             "model_name": "deepseek-chat"} for i in range(n)]
+
+def stock_info_payload():
+    info = {f"field_{i}": f"值{i}" * 3 for i in range(40)}
+    info.update(introduction="公司主要从事高端白酒的生产与销售。" * 40, main_business="白酒" * 50,
+                pe_ttm=28.5, pb=8.9, total_mv=21000.0)
+    return info
+
+PAYLOADS = {
+    "/api/macro": macro_payload(),
+    "/api/strategies/tracking": tracking_payload(),
+    "/api/reports": reports_payload(),
+    "/api/stock_info": stock_info_payload(),
+}
+
+def timed(fn, repeats=REPEATS) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+def main():
+    print(f"encoder: {'orjson' if responses.orjson else 'json (orjson not installed)'}, "
+          f"brotli: {'yes' if responses.brotli else 'not installed'}\n")
+    print(f"{'endpoint':<26} {'json ms':>8} {'fast ms':>8} {'raw KB':>8} {'gzip KB':>8} {'br KB':>7} {'gzip ms':>8}")
+    for path, payload in PAYLOADS.items():
+        std_ms = timed(lambda: JSONResponse(payload).body)
+        fast_ms = timed(lambda: FastJSONResponse(payload).body)
+        body = FastJSONResponse(payload).body
+        gz = responses.compress(body, "gzip")
+        gzip_ms = timed(lambda: responses.compress(body, "gzip"), max(REPEATS // 5, 1))
+        br = f"{len(responses.compress(body, 'br')) / 1024:7.1f}" if responses.brotli else f"{'-':>7}"
+        print(f"{path:<26} {std_ms:8.3f} {fast_ms:8.3f} {len(body) / 1024:8.1f} {len(gz) / 1024:8.1f} {br} {gzip_ms:8.3f}")
+
+    # /api/macro conversion: per-row iterrows (before) vs column-wise macro_series
+    import server
+    df = pd.DataFrame({'月份': [f"{2000 + i // 12}年{i % 12 + 1:02d}月份" for i in range(300)],
+                       '全国-同比增长': [0.1 * i for i in range(300)]})
+    def iterrows():
+        df_sorted = df.sort_values('月份', ascending=True)
+        out = []
+        for _, row in df_sorted.tail(24).iterrows():
+            s = str(row['月份']).replace('年', '-').replace('月份', '').replace('月', '')
+            parts = s.split('-')
+            out.append({"date": f"{parts[0]}-{parts[1].zfill(2)}", "value": float(row['全国-同比增长'])})
+        return out
+    assert iterrows() == server.macro_series(df, '月份', {"value": '全国-同比增长'}, 24)
+    print(f"\nmacro series conversion: iterrows {timed(iterrows):.3f} ms, "
+          f"column-wise {timed(lambda: server.macro_series(df, '月份', {'value': '全国-同比增长'}, 24)):.3f} ms")
+
+if __name__ == "__main__":
+    main()
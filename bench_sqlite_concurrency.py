@@ -0,0 +1,129 @@
+"""
+Benchmark: mixed read/write throughput on SQLite, default settings vs the
+tuned configuration in app/database.py (WAL, synchronous=NORMAL, cache,
+mmap, busy_timeout) and vs the batched write queue.
+
+Reader threads run the tracking-style join, writer threads insert small
+recommendation rows and commit, all against one temporary database file.
+
+    python bench_sqlite_concurrency.py [seconds] [readers] [writers]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
+
+from app import models
+from app.database import Base, create_tuned_engine
+from app.write_queue import WriteQueue
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+READERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+WRITERS = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+def seed(SessionFactory):
+    db = SessionFactory()
+    user = models.User(username="bench", hashed_password="x")
+    db.add(user)
+    db.commit()
+    strategy = models.Strategy(name="bench", params={}, user_id=user.id)
+    db.add(strategy)
+    db.commit()
+    execution = models.StrategyExecution(strategy_id=strategy.id)
+    db.add(execution)
+    db.commit()
+    ids = (user.id, strategy.id, execution.id)
+    db.close()
+    return ids
+
+def new_rec(strategy_id, execution_id, i):
+    return models.StockRecommendation(
+        strategy_id=strategy_id, execution_id=execution_id, symbol=f"{600000 + i % 1000}",
+        name="bench", date="2026-01-01", price=10.0, change_percent=3.0,
+        volume_ratio=1.5, turnover_rate=5.0, reason={}
+    )
+
+def run(label, engine, use_queue=False):
+    Base.metadata.create_all(bind=engine)
+    SessionFactory = sessionmaker(bind=engine, autoflush=False)
+    user_id, strategy_id, execution_id = seed(SessionFactory)
+    wq = WriteQueue(SessionFactory) if use_queue else None
+
+    stop = time.time() + DURATION
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while time.time() < stop:
+            db = SessionFactory()
+            try:
+                db.query(models.StockRecommendation, models.StrategyExecution.created_at).join(
+                    models.StrategyExecution, models.StockRecommendation.execution_id == models.StrategyExecution.id
+                ).join(
+                    models.Strategy, models.StrategyExecution.strategy_id == models.Strategy.id
+                ).filter(models.Strategy.user_id == user_id).order_by(
+                    models.StrategyExecution.created_at.desc(), models.StockRecommendation.id.desc()
+                ).limit(50).all()
+                bump("reads")
+            except OperationalError:
+                bump("locked")
+            finally:
+                db.close()
+
+    def writer(n):
+        i = 0
+        while time.time() < stop:
+            i += 1
+            if wq:
+                try:
+                    wq.submit(lambda db: db.add(new_rec(strategy_id, execution_id, i))).result()
+                    bump("writes")
+                except OperationalError:
+                    bump("locked")
+                continue
+            db = SessionFactory()
+            try:
+                db.add(new_rec(strategy_id, execution_id, i))
+                db.commit()
+                bump("writes")
+            except OperationalError:
+                db.rollback()
+                bump("locked")
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - started
+    if wq:
+        wq.stop()
+    print(f"{label:<28} reads/s={counts['reads'] / elapsed:>8.1f}  writes/s={counts['writes'] / elapsed:>8.1f}  locked errors={counts['locked']}")
+    engine.dispose()
+
+if __name__ == "__main__":
+    print(f"{DURATION}s, {READERS} readers, {WRITERS} writers")
+    print("-" * 80)
+
+    tmp = tempfile.mkdtemp()
+    # Default SQLite: rollback journal, synchronous=FULL, pysqlite's 5 s timeout
+    default_engine = create_engine(f"sqlite:///{os.path.join(tmp, 'default.db')}", connect_args={"check_same_thread": False})
+    run("default", default_engine)
+
+    tmp = tempfile.mkdtemp()
+    run("tuned (WAL + pragmas)", create_tuned_engine(f"sqlite:///{os.path.join(tmp, 'tuned.db')}"))
+
+    tmp = tempfile.mkdtemp()
+    run("tuned + write queue", create_tuned_engine(f"sqlite:///{os.path.join(tmp, 'queued.db')}"), use_queue=True)
@@ -0,0 +1,83 @@
+"""
+Startup benchmark: time from spawning `uvicorn server:app` to the first
+healthy GET /api/health response, plus the startup phase / lazy import
+breakdown the server reports there.
+
+Each run starts a fresh process in an empty temporary working directory
+(new app.db, no JSON caches). For reference it also times importing the
+heavy modules that server.py no longer imports at load time.
+
+    python bench_startup.py [runs]
+"""
+import os
+import sys
+import time
+import socket
+import statistics
+import subprocess
+import tempfile
+import requests
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+REPO = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["akshare", "pandas", "numpy", "tushare"]
+TIMEOUT = 60
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_once():
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < TIMEOUT:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                resp = requests.get(f"http://127.0.0.1:{port}/api/health", timeout=1)
+                if resp.status_code == 200:
+                    return time.perf_counter() - started, resp.json()
+            except requests.RequestException:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError("server did not become healthy")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def heavy_import_seconds(module: str):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(out.stdout.strip()) if out.returncode == 0 else None
+
+def main():
+    times, report = [], None
+    for i in range(RUNS):
+        seconds, report = start_once()
+        times.append(seconds)
+        print(f"run {i + 1}: first healthy response after {seconds:.3f}s")
+    print(f"\ntime to first healthy response: median {statistics.median(times):.3f}s, min {min(times):.3f}s")
+
+    print("\nstartup phases (last run):")
+    for name, phase in report["phases"].items():
+        print(f"  {name:<20} {phase['seconds']:>8.3f}s  {phase['status']}")
+    print("lazy imports resolved before the health check:", report["lazy_imports"] or "none")
+
+    print("\nheavy imports kept off the startup path (cold import in a fresh interpreter):")
+    for module in HEAVY_MODULES:
+        seconds = heavy_import_seconds(module)
+        print(f"  {module:<10} {'not installed' if seconds is None else f'{seconds:.3f}s'}")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import { jsPDF } from 'jspdf';
 import { AnalysisResult } from './AnalysisResult';
 import { Modal } from './Modal';
 import { AnalysisStatus, AIReport } from '../types';
+import { fetchReportContent } from '../services/marketService';
 
 interface AIReportListProps {
   reports: AIReport[];
@@ -12,11 +13,22 @@ interface AIReportListProps {
 export const AIReportList: React.FC<AIReportListProps> = ({ reports, onDelete }) => {
   const [selectedReport, setSelectedReport] = useState<AIReport | null>(null);
 
+  // The list only carries summaries; load the body when a report is opened
+  const openReport = async (report: AIReport) => {
+    if (report.content) {
+      setSelectedReport(report);
+      return;
+    }
+    const content = await fetchReportContent(report.id);
+    report.content = content;
+    setSelectedReport({ ...report, content });
+  };
+
   const handleDownload = (report: AIReport) => {
     const element = document.createElement('div');
     
     // Simple markdown to HTML converter for PDF generation
-    let htmlContent = report.content
+    let htmlContent = (report.content || '')
       // Headers
       .replace(/### (.*)/g, '<h3 style="font-size: 16px; font-weight: bold; margin-top: 16px; margin-bottom: 8px; color: #1e293b;">$1</h3>')
       .replace(/## (.*)/g, '<h2 style="font-size: 18px; font-weight: bold; margin-top: 20px; margin-bottom: 10px; border-bottom: 1px solid #e2e8f0; padding-bottom: 4px; color: #0f172a;">$1</h2>')
@@ -101,7 +113,7 @@ export const AIReportList: React.FC<AIReportListProps> = ({ reports, onDelete })
                   <td className="px-6 py-4">
                     <div className="flex items-center justify-center gap-3">
                       <button 
-                        onClick={() => setSelectedReport(report)}
+                        onClick={() => openReport(report)}
                         className="text-indigo-600 hover:text-indigo-800 font-medium text-xs"
                         title="预览"
                       >
@@ -156,7 +168,7 @@ export const AIReportList: React.FC<AIReportListProps> = ({ reports, onDelete })
                 下载 PDF
               </button>
             </div>
-            <AnalysisResult status={AnalysisStatus.COMPLETE} result={selectedReport.content} />
+            <AnalysisResult status={AnalysisStatus.COMPLETE} result={selectedReport.content || ''} />
           </div>
         )}
       </Modal>
@@ -3,14 +3,16 @@ from sqlalchemy.orm import sessionmaker
 from app.models import Base, User
 from app.database import SQLALCHEMY_DATABASE_URL
 from app.auth import get_password_hash
+from app.migrations import run_migrations
 
 def init_db():
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
 
-    print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    print("Applying schema migrations...")
+    applied = run_migrations(engine)
+    print(f"Applied migrations: {applied or 'none (up to date)'}")
     
     # Check if admin exists
     admin_user = db.query(User).filter(User.username == "admin").first()
@@ -0,0 +1,122 @@
+"""
+One-shot importer: moves the old JSON stores into the database.
+
+Before the data/admin routers were mounted, server.py kept everything in
+flat files next to it:
+
+    user_assets.json   -> assets        (owned by --user)
+    user_reports.json  -> reports       (owned by --user)
+    user_goals.json    -> goals         (owned by --user)
+    user_models.json   -> model_configs (global)
+
+The files were not per-user, so assets, reports and goals are assigned to one
+account (default: admin). Rows are upserted by id and nothing is deleted, so
+re-running is safe and importing into an account with data keeps its rows.
+Each imported file is renamed to <name>.imported unless --keep is given.
+
+    python migrate_json_to_db.py [--user admin] [--dir .] [--keep] [--dry-run]
+"""
+import os
+import json
+import argparse
+
+from app import crud, schemas, models
+from app.database import SessionLocal, engine
+from app.migrations import run_migrations
+
+ASSETS_FILE = "user_assets.json"
+REPORTS_FILE = "user_reports.json"
+GOALS_FILE = "user_goals.json"
+MODELS_FILE = "user_models.json"
+
+def load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _upsert(db, model, collection, rows, user_id):
+    # Pure upsert: rows the account already has that are not in the file stay
+    crud._bump_sync_version(db, user_id, collection)
+    crud._upsert_rows(db, model, rows, owner="user_id")
+    db.commit()
+
+def import_assets(db, data, user_id):
+    assets = [schemas.AssetCreate(**a) for a in data]
+    _upsert(db, models.Asset, "assets", [crud._asset_row(a, user_id) for a in assets], user_id)
+    return len(assets)
+
+def import_reports(db, data, user_id):
+    reports = [
+        schemas.ReportCreate(
+            id=str(r["id"]),
+            timestamp=r.get("timestamp", ""),
+            summary=r.get("summary", ""),
+            content=r.get("content", ""),
+            score=int(r.get("score") or 0),
+            model_name=r.get("model_name")
+        )
+        for r in data
+    ]
+    _upsert(db, models.Report, "reports", [crud._report_row(r, user_id) for r in reports], user_id)
+    return len(reports)
+
+def import_goals(db, data, user_id):
+    if not data:
+        return 0
+    goal = schemas.GoalCreate(
+        targetProfit=data.get("targetProfit", 0),
+        targetDate=data.get("targetDate", ""),
+        availableCapital=data.get("availableCapital", 0)
+    )
+    crud.create_or_update_goal(db, goal, user_id)
+    return 1
+
+def import_models(db, data, user_id=None):
+    # Merge by id: configs already entered through the admin panel are kept
+    for m in data:
+        config = schemas.ModelConfigCreate(**m)
+        db.merge(models.ModelConfig(**config.dict()))
+    db.commit()
+    return len(data)
+
+IMPORTERS = (
+    (ASSETS_FILE, import_assets),
+    (REPORTS_FILE, import_reports),
+    (GOALS_FILE, import_goals),
+    (MODELS_FILE, import_models),
+)
+
+def migrate(username: str = "admin", directory: str = ".", keep: bool = False, dry_run: bool = False) -> dict:
+    run_migrations(engine)
+    db = SessionLocal()
+    counts = {}
+    try:
+        user = crud.get_user(db, username)
+        if not user:
+            raise SystemExit(f"User '{username}' not found (run init_db.py first)")
+        for filename, importer in IMPORTERS:
+            path = os.path.join(directory, filename)
+            data = load_json(path)
+            if data is None:
+                continue
+            if dry_run:
+                counts[filename] = len(data) if isinstance(data, list) else 1
+                continue
+            counts[filename] = importer(db, data, user.id)
+            if not keep:
+                os.replace(path, path + ".imported")
+            print(f"Imported {counts[filename]} rows from {filename}", flush=True)
+    finally:
+        db.close()
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the legacy JSON stores into the database")
+    parser.add_argument("--user", default="admin", help="account that receives assets, reports and goals")
+    parser.add_argument("--dir", default=".", help="directory holding the user_*.json files")
+    parser.add_argument("--keep", action="store_true", help="do not rename imported files")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be imported")
+    args = parser.parse_args()
+    counts = migrate(args.user, args.dir, keep=args.keep, dry_run=args.dry_run)
+    print(f"{'Would import' if args.dry_run else 'Done'}: {counts or 'no JSON files found'}")
@@ -7,6 +7,7 @@ import html2canvas from 'html2canvas';
 import jsPDF from 'jspdf';
 import { Modal } from '../components/Modal';
 import { StockDetail } from '../components/StockDetail';
+import { streamCompletion } from '../services/streamService';
 
 interface Strategy {
   id: number;
@@ -112,7 +113,8 @@ const AIStockSelection: React.FC = () => {
       setRecommendations([]);
       setTrackingItems([]);
     }
-  }, [selectedExecution]);
+    // Keyed on the id: streamed analysis updates must not refetch the lists
+  }, [selectedExecution?.id]);
 
   const fetchTrackingItems = async (executionId: number) => {
       try {
@@ -191,11 +193,16 @@ const AIStockSelection: React.FC = () => {
     if (!selectedExecution) return;
     setIsAnalyzing(true);
     try {
-      const res = await axios.post(`/api/strategies/executions/${selectedExecution.id}/analyze`);
+      // Streamed: the report fills in as tokens arrive; the server saves it when done
+      const analysis = await streamCompletion(
+        `/api/strategies/executions/${selectedExecution.id}/analyze?stream=true`,
+        undefined,
+        (text) => setSelectedExecution(prev => prev ? {...prev, ai_analysis: text} : prev)
+      );
       // Update selected execution with analysis
-      setSelectedExecution({...selectedExecution, ai_analysis: res.data.analysis});
+      setSelectedExecution({...selectedExecution, ai_analysis: analysis});
       // Also update in list
-      setExecutions(prev => prev.map(e => e.id === selectedExecution.id ? {...e, ai_analysis: res.data.analysis} : e));
+      setExecutions(prev => prev.map(e => e.id === selectedExecution.id ? {...e, ai_analysis: analysis} : e));
       
       alert('AI 分析完成');
     } catch (err) {
@@ -1,5 +1,6 @@
 import os
 import sys
+from app import startup_profile # First import: its clock is the start of the import-time breakdown
 
 # REMOVED proxy cleanup code as it breaks akshare connection
 # os.environ['NO_PROXY'] = '*'
@@ -12,8 +13,9 @@ import sys
 # if 'https_proxy' in os.environ:
 #     del os.environ['https_proxy']
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Response, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
 from pydantic import BaseModel
 import time
@@ -21,172 +23,271 @@ import json
 import requests
 import base64
 from typing import List, Optional, Dict, Any
-import akshare as ak
-import pandas as pd
-import tushare as ts
+from app.startup_profile import lazy_import
+ak = lazy_import("akshare", instrument="akshare")
+pd = lazy_import("pandas")
+ts = lazy_import("tushare")
 import datetime
-from app.routers import auth, strategies
-
-app = FastAPI()
-
-@app.on_event("startup")
-async def startup_event():
-    print("DEBUG: Server starting...", flush=True)
-    print(f"DEBUG: Proxy Env Vars: HTTP_PROXY={os.environ.get('HTTP_PROXY')}, HTTPS_PROXY={os.environ.get('HTTPS_PROXY')}", flush=True)
+import asyncio
+import anyio
+import threading
+from app.routers import auth, strategies, data, admin
+from app.services import background_jobs, outcome_tracker, retention, llm_cache, llm_stream, llm_gateway, model_registry, image_prep, prompt_context, market_digest, cache_backend
+from app.write_queue import write_queue
+from app import database, migrations, models
+from app import auth as auth_core
+from app import metrics
+from app.responses import FastJSONResponse, ResponseLayerMiddleware
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+def check_connectivity():
+    started = time.perf_counter()
     try:
         # Test basic connectivity
-        import requests
         print("DEBUG: Testing baidu connection...", flush=True)
         resp = requests.get("https://www.baidu.com", timeout=5)
         print(f"DEBUG: Connectivity check status: {resp.status_code}", flush=True)
+        startup_profile.record_phase("connectivity_check", time.perf_counter() - started)
     except Exception as e:
         print(f"DEBUG: Connectivity check failed: {e}", flush=True)
+        startup_profile.record_phase("connectivity_check", time.perf_counter() - started, status="error")
+
+CACHE_WARMUP_CLAIM = 600 # Seconds the warmup claim blocks other workers
+
+def warm_caches():
+    # One-time import of the legacy JSON caches; entries already in the
+    # backend (written by another worker or an early request) win. With a
+    # shared backend only the worker that claims it imports and renames.
+    with startup_profile.phase("cache_warmup"):
+        shared = cache_backend.get_backend().shared
+        if shared and not background_jobs.claim("cache_warmup", CACHE_WARMUP_CLAIM):
+            print("DEBUG: Cache warmup done by another worker", flush=True)
+            return
+        for path, cache in ((CACHE_FILE, stock_cache), (STOCK_BASIC_CACHE_FILE, stock_basic_cache)):
+            entries = load_cache(path)
+            for key, value in entries.items():
+                cache.setdefault(key, value)
+            if entries and shared:
+                try:
+                    os.replace(path, path + ".imported")
+                except FileNotFoundError:
+                    continue # Renamed by a worker whose claim had expired
+                print(f"DEBUG: Imported {len(entries)} entries from {path} into the shared cache", flush=True)
+
+@app.on_event("startup")
+async def startup_event():
+    startup_profile.record_phase("module_import", time.perf_counter() - startup_profile.PROCESS_START)
+    print("DEBUG: Server starting...", flush=True)
+    print(f"DEBUG: Proxy Env Vars: HTTP_PROXY={os.environ.get('HTTP_PROXY')}, HTTPS_PROXY={os.environ.get('HTTPS_PROXY')}", flush=True)
 
+    # The network probe and the JSON cache loads run in the background: the
+    # worker serves requests right away instead of blocking on them
+    for name, fn in (("connectivity_check", check_connectivity), ("cache_warmup", warm_caches)):
+        threading.Thread(target=fn, name=f"startup-{name}", daemon=True).start()
+
+    # Bring the schema (tables, columns, indexes) up to date; no-op when current
+    with startup_profile.phase("migrations"):
+        migrations.run_migrations(database.engine)
+
+    # Load model configs once; the job picks up changes made by other processes
+    with startup_profile.phase("model_registry"):
+        model_registry.load()
+    background_jobs.start_periodic_job(
+        "model_registry",
+        model_registry.MODEL_REGISTRY_REFRESH,
+        model_registry.refresh_job,
+        initial_delay=model_registry.MODEL_REGISTRY_REFRESH
+    )
+
+    # One market digest shared by every LLM prompt; the previous process's
+    # copy is served until the first rebuild
+    market_digest.configure(macro_fn=get_macro, news_fn=get_news)
+    market_digest.load_saved()
+    background_jobs.start_periodic_job(
+        "market_digest",
+        market_digest.MARKET_DIGEST_INTERVAL,
+        market_digest.refresh_job,
+        initial_delay=10,
+        shared=True
+    )
+
+    # Materialize T+N outcomes for recommendations in the background
+    background_jobs.start_periodic_job(
+        "recommendation_outcomes",
+        outcome_tracker.OUTCOME_REFRESH_INTERVAL,
+        outcome_tracker.run_outcome_job,
+        shared=True
+    )
+    # Age out old screen results into daily aggregates and compact the file
+    background_jobs.start_periodic_job(
+        "data_retention",
+        retention.RETENTION_INTERVAL,
+        retention.run_retention_job,
+        initial_delay=120,
+        shared=True
+    )
+
+@app.get("/api/health")
+async def health():
+    # Async so it answers even when the threadpool is saturated; includes the
+    # startup phase / lazy import breakdown
+    return {"status": "ok", **startup_profile.report(), "jobs": background_jobs.get_job_status()}
+
+metrics.gauge("threadpool_borrowed_threads", "Sync routes / to_thread calls currently holding a worker thread")
+metrics.gauge("threadpool_max_threads", "Size of the threadpool behind sync routes")
+metrics.gauge("threadpool_waiting_tasks", "Calls queued for a free worker thread")
+metrics.gauge("threadpool_saturation", "borrowed / max worker threads")
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Async so a saturated threadpool is still visible; also reads the
+    # limiter, which needs the event loop
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    metrics.set_gauge("threadpool_borrowed_threads", limiter.borrowed_tokens)
+    metrics.set_gauge("threadpool_max_threads", limiter.total_tokens)
+    metrics.set_gauge("threadpool_waiting_tasks", limiter.statistics().tasks_waiting)
+    metrics.set_gauge("threadpool_saturation", round(limiter.borrowed_tokens / limiter.total_tokens, 4))
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/cache/stats")
+def cache_stats(current_user: models.User = Depends(auth_core.get_current_admin_user)):
+    # Shared cache backend: kind, entry count, hit ratio per namespace
+    return cache_backend.get_stats()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    background_jobs.stop_all_jobs()
+    write_queue.stop()
+    await llm_gateway.aclose()
 
 app.include_router(auth.router)
 app.include_router(strategies.router)
+# Assets, reports, goals and model configs (per-user, DB-backed)
+app.include_router(data.router)
+app.include_router(admin.router)
 
+# orjson rendering, ETag / 304 and br / gzip for complete responses
+app.add_middleware(ResponseLayerMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Sync-Version", "X-LLM-Cache", "X-Recognition-Cache", "X-Prompt-Tokens"],
 )
 
 # --- Cache ---
+# Quotes and basic info live in the shared cache backend (cache_backend.py),
+# so every uvicorn worker sees the same entries. The JSON files of the
+# single-process version are imported once by warm_caches().
 CACHE_FILE = "stock_cache.json"
-def load_cache():
-    if os.path.exists(CACHE_FILE):
+STOCK_CACHE_TTL = 24 * 60 * 60
+def load_cache(path: str = CACHE_FILE):
+    if os.path.exists(path):
         try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except:
             return {}
     return {}
 
-def save_cache(data):
-    try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
-    except:
-        pass
-
-stock_cache = load_cache()
+stock_cache = cache_backend.namespace("stock", ttl=STOCK_CACHE_TTL)
 
 # --- Models ---
-MODELS_FILE = "user_models.json"
-
-class ModelConfig(BaseModel):
-    id: str
-    provider: str
-    name: str
-    api_key: str
-    base_url: str
-    modules: List[str]
-    is_active: bool
-
+# Active model per module, served from the in-memory registry (model_configs table)
 def get_active_model_for_module(module: str):
-    if os.path.exists(MODELS_FILE):
-        try:
-            with open(MODELS_FILE, 'r', encoding='utf-8') as f:
-                models = json.load(f)
-                for m in models:
-                    if m.get('is_active') and module in m.get('modules', []):
-                        return m
-        except:
-            pass
-    return None
-
-@app.get("/api/models")
-def get_models():
-    if os.path.exists(MODELS_FILE):
-        try:
-            with open(MODELS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-@app.post("/api/models")
-def save_models(models: List[ModelConfig]):
-    data = [m.dict() for m in models]
-    with open(MODELS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    return {"status": "success"}
+    return model_registry.get_model(module)
 
 # --- Chat ---
 class ChatRequest(BaseModel):
     messages: List[Dict[str, Any]]
     model: str = "deepseek-chat"
     temperature: float = 1.0
-
-@app.post("/api/chat")
-def chat_proxy(req: ChatRequest):
-    model_config = get_active_model_for_module("ai_report")
-    if not model_config:
-        raise HTTPException(status_code=500, detail="No model configured for AI Report")
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {model_config['api_key']}"
-    }
-    payload = {
-        "model": model_config['name'],
-        "messages": req.messages,
-        "temperature": req.temperature
-    }
-    try:
+    use_cache: bool = True # False: skip the LLM cache lookup (the answer is still stored)
+    stream: bool = False # True: relay tokens as Server-Sent Events
+
+async def _complete(model_config, messages, temperature, use_cache, stream, user_key, response: Response):
+    # Shared by /api/chat and /api/chat/portfolio_report: LLM cache + gateway, or an SSE relay
+    if stream:
+        return StreamingResponse(
+            llm_stream.stream_completion(model_config, messages, temperature, timeout=180, use_cache=use_cache, user_key=user_key),
+            media_type="text/event-stream",
+            headers=llm_stream.SSE_HEADERS
+        )
+
+    async def call():
         print(f"Proxying to {model_config['provider']}...")
         # Increase timeout to 180s for long generations
-        resp = requests.post(model_config['base_url'], headers=headers, json=payload, timeout=180)
-        if resp.status_code != 200:
-            print(f"API Error: {resp.text}")
-            raise HTTPException(status_code=resp.status_code, detail=resp.text)
-        return resp.json()
+        return await llm_gateway.chat_completion(model_config, messages, temperature, user_key=user_key, timeout=180)
+
+    try:
+        result, cache_hit = await llm_cache.acached_completion(model_config, messages, temperature, call, use_cache=use_cache)
+        response.headers["X-LLM-Cache"] = "HIT" if cache_hit else "MISS"
+        return result
+    except llm_gateway.LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# --- Assets ---
-ASSETS_FILE = "user_assets.json"
-class Asset(BaseModel):
-    id: str
-    symbol: str
-    name: str
-    type: str
-    quantity: float
-    costPrice: float
-    currentPrice: float
-    currency: str
-
-@app.get("/api/assets")
-def get_assets():
-    if os.path.exists(ASSETS_FILE):
-        try:
-            with open(ASSETS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+@app.post("/api/chat")
+async def chat_proxy(req: ChatRequest, response: Response, current_user: models.User = Depends(auth_core.get_current_active_user)):
+    model_config = get_active_model_for_module("ai_report")
+    if not model_config:
+        raise HTTPException(status_code=500, detail="No model configured for AI Report")
+    # user_key: fair queueing across users in the LLM gateway
+    return await _complete(model_config, req.messages, req.temperature, req.use_cache, req.stream, current_user.id, response)
+
+class PortfolioReportRequest(BaseModel):
+    holdings: List[Dict[str, Any]] # name, symbol, quantity, cost_price, current_price + technical indicators
+    news: List[Dict[str, Any]] = []
+    goals: Optional[Dict[str, Any]] = None
+    market_context: str = "" # Used only while no server-side market digest is available
+    temperature: float = 1.0
+    use_cache: bool = True
+    stream: bool = False
 
-@app.post("/api/assets")
-def save_assets(assets: List[Asset]):
-    data = [a.dict() for a in assets]
-    with open(ASSETS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    return {"status": "success"}
+@app.post("/api/chat/portfolio_report")
+async def portfolio_report(req: PortfolioReportRequest, response: Response, current_user: models.User = Depends(auth_core.get_current_active_user)):
+    # The prompt is assembled here from structured data, within REPORT_CONTEXT_TOKENS
+    model_config = get_active_model_for_module("ai_report")
+    if not model_config:
+        raise HTTPException(status_code=500, detail="No model configured for AI Report")
+    if not req.holdings:
+        raise HTTPException(status_code=400, detail="No holdings to analyze")
+    market_context = market_digest.get_text() or req.market_context
+    messages, stats = prompt_context.build_portfolio_messages(req.holdings, req.news, req.goals, market_context)
+    print(f"DEBUG: Portfolio report context for user {current_user.id}: {stats}", flush=True)
+    response.headers["X-Prompt-Tokens"] = str(stats["tokens"])
+    return await _complete(model_config, messages, req.temperature, req.use_cache, req.stream, current_user.id, response)
 
 # --- Recognize Assets (NEW) ---
 @app.post("/api/recognize_assets")
-async def recognize_assets(file: UploadFile = File(...)):
+async def recognize_assets(request: Request, response: Response, file: UploadFile = File(...), current_user: models.User = Depends(auth_core.get_current_active_user)):
     model_config = get_active_model_for_module("position_entry")
     if not model_config:
         raise HTTPException(status_code=500, detail="No model configured for Position Entry.")
 
-    contents = await file.read()
-    base64_image = base64.b64encode(contents).decode('utf-8')
-    mime_type = file.content_type or "image/jpeg"
+    try:
+        # Bounded read, then downscale / recompress off the event loop
+        if int(request.headers.get("content-length") or 0) > image_prep.MAX_UPLOAD_BYTES + 64 * 1024:
+            raise image_prep.ImageRejected(413, f"Image larger than {image_prep.MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        contents = await image_prep.read_upload(file)
+        image = await asyncio.to_thread(image_prep.preprocess, contents, file.content_type or "image/jpeg")
+    except image_prep.ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Same screenshot again: parsed holdings from the cache
+    cached = image_prep.get_cached(image["key"], model_config['name'])
+    response.headers["X-Recognition-Cache"] = "HIT" if cached is not None else "MISS"
+    if cached is not None:
+        return cached
+
+    image_prep.record_transfer(image["original_bytes"], image["bytes"])
+    base64_image = base64.b64encode(image["data"]).decode('utf-8')
+    mime_type = image["mime"]
     
     prompt = """
     请识别这张图片中的持仓信息，并提取为JSON格式。
@@ -202,83 +303,44 @@ async def recognize_assets(file: UploadFile = File(...)):
     如果无法识别任何数据，返回空数组 []。
     """
     
-    payload = {
-        "model": model_config['name'],
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{mime_type};base64,{base64_image}"
-                        }
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}"
                     }
-                ]
-            }
-        ],
-        "temperature": 0.1
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {model_config['api_key']}"
-    }
+                }
+            ]
+        }
+    ]
     
     try:
-        print(f"Sending image to {model_config['provider']} ({model_config['name']})...")
-        response = requests.post(model_config['base_url'], headers=headers, json=payload, timeout=120)
-        
-        if response.status_code != 200:
-             print(f"Recognition API Error: {response.text}")
-             raise HTTPException(status_code=response.status_code, detail=f"API Error: {response.text}")
-        
-        result = response.json()
+        print(f"Sending image to {model_config['provider']} ({model_config['name']}), "
+              f"{image['original_bytes'] // 1024} KiB -> {image['bytes'] // 1024} KiB {image['size']}...")
+        started = time.time()
+        result = await llm_gateway.chat_completion(model_config, messages, 0.1, user_key=current_user.id, timeout=120)
         content = result['choices'][0]['message']['content']
         print(f"Recognition result: {content[:100]}...")
         
         content = content.replace("```json", "").replace("```", "").strip()
-        return json.loads(content)
+        holdings = json.loads(content)
+        if isinstance(holdings, list) and holdings and all(isinstance(h, dict) for h in holdings):
+            image_prep.put_cached(image["key"], model_config['name'], holdings, time.time() - started)
+        return holdings
+    except llm_gateway.LLMError as e:
+        print(f"Recognition API Error: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=f"API Error: {e.detail}")
     except Exception as e:
         print(f"Recognition failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# --- Reports ---
-REPORTS_FILE = "user_reports.json"
-@app.get("/api/reports")
-def get_reports():
-    if os.path.exists(REPORTS_FILE):
-        try:
-            with open(REPORTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-@app.post("/api/reports")
-def save_reports(reports: List[Dict[str, Any]]):
-    with open(REPORTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(reports, f, indent=2, ensure_ascii=False)
-    return {"status": "success"}
-
-# --- Goals ---
-GOALS_FILE = "user_goals.json"
-@app.get("/api/goals")
-def get_goals():
-    if os.path.exists(GOALS_FILE):
-        try:
-            with open(GOALS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-@app.post("/api/goals")
-def save_goals(goals: Dict[str, Any]):
-    with open(GOALS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(goals, f, indent=2, ensure_ascii=False)
-    return {"status": "success"}
+@app.get("/api/recognize_assets/stats")
+def recognize_assets_stats(current_user: models.User = Depends(auth_core.get_current_active_user)):
+    return image_prep.get_cache_stats()
 
 # --- News ---
 @app.get("/api/news")
@@ -301,7 +363,9 @@ def get_news(limit: int = 20):
             "Referer": "http://finance.sina.com.cn/"
         }
         
-        resp = requests.get(url, params=params, headers=headers, timeout=5)
+        with metrics.upstream("sina_feed", "roll_news") as call:
+            resp = requests.get(url, params=params, headers=headers, timeout=5)
+            call.check(resp.status_code)
         if resp.status_code == 200:
             data_json = resp.json()
             if data_json and 'result' in data_json and 'data' in data_json['result']:
@@ -373,7 +437,9 @@ def get_stock(symbol: str):
                     sina_url = f"http://hq.sinajs.cn/list={sina_symbol}"
                     sina_headers = {"Referer": "http://finance.sina.com.cn/"}
                     # Try with system proxy first (default session)
-                    sina_resp = requests.get(sina_url, headers=sina_headers, timeout=5)
+                    with metrics.upstream("sina_hq", "quote") as call:
+                        sina_resp = requests.get(sina_url, headers=sina_headers, timeout=5)
+                        call.check(sina_resp.status_code)
                     if sina_resp.status_code == 200:
                         content = sina_resp.text
                         # var hq_str_sh600036="...";
@@ -405,7 +471,6 @@ def get_stock(symbol: str):
                                     "timestamp": time.time(),
                                     "data": data
                                 }
-                                save_cache(stock_cache)
                                 print(f"DEBUG: Sina API success for {symbol}", flush=True)
                                 return data
                 except Exception as sina_e:
@@ -458,7 +523,6 @@ def get_stock(symbol: str):
                     "timestamp": time.time(),
                     "data": data
                 }
-                save_cache(stock_cache)
                 return data
             else:
                 raise ValueError("No history data found after retries")
@@ -495,7 +559,9 @@ def get_stock(symbol: str):
             
             for i in range(5): # Retry 5 times
                 try:
-                    resp = s2.get(url, params=params, timeout=10)
+                    with metrics.upstream("eastmoney_push2his", "kline") as call:
+                        resp = s2.get(url, params=params, timeout=10)
+                        call.check(resp.status_code)
                     print(f"DEBUG: Attempt 2 (Try {i+1}) status: {resp.status_code}", flush=True)
                     if resp.status_code == 200:
                         data_json = resp.json()
@@ -523,7 +589,9 @@ def get_stock(symbol: str):
             s3.headers.update(headers)
             
             try:
-                resp = s3.get(url, params=params, timeout=10)
+                with metrics.upstream("eastmoney_push2his", "kline_direct") as call:
+                    resp = s3.get(url, params=params, timeout=10)
+                    call.check(resp.status_code)
                 print(f"DEBUG: Attempt 3 status: {resp.status_code}", flush=True)
                 if resp.status_code == 200:
                     data_json = resp.json()
@@ -560,7 +628,9 @@ def get_stock(symbol: str):
                 s4.trust_env = False
                 s4.headers.update(headers_ip)
                 
-                resp = s4.get(url_ip, params=params, timeout=10)
+                with metrics.upstream("eastmoney_push2his", "kline_ip") as call:
+                    resp = s4.get(url_ip, params=params, timeout=10)
+                    call.check(resp.status_code)
                 print(f"DEBUG: Attempt 4 status: {resp.status_code}", flush=True)
                 if resp.status_code == 200:
                      data_json = resp.json()
@@ -598,138 +668,75 @@ def get_stock(symbol: str):
                 "timestamp": time.time(),
                 "data": data
             }
-            save_cache(stock_cache)
             return data
     except Exception as e:
         print(f"Stock error: {e}")
         return {"symbol": symbol, "name": symbol, "current_price": 0.0}
 
 # --- Macro Data ---
+# Monthly / quarterly series: cached across workers, rebuilt every MACRO_TTL
+MACRO_TTL = 6 * 60 * 60
+macro_cache = cache_backend.namespace("macro", ttl=MACRO_TTL)
+
+def parse_date_zh(date_str) -> str:
+    # 2008年05月份 -> 2008-05; anything else is kept as is
+    s = str(date_str)
+    if '年' not in s:
+        return s
+    year, _, month = s.replace('月份', '').replace('月', '').partition('年')
+    return f"{year}-{month.zfill(2)}"
+
+def macro_series(df, date_col: str, values: dict, tail: int, sort: bool = True, zh_dates: bool = True) -> list:
+    """
+    values: output key -> source column. Works on whole columns (tolist /
+    to_numeric) instead of building a Series per row with iterrows.
+    """
+    if sort:
+        df = df.sort_values(date_col, ascending=True)
+    df = df.tail(tail)
+    dates = [parse_date_zh(d) if zh_dates else str(d) for d in df[date_col].tolist()]
+    columns = {key: pd.to_numeric(df[column], errors='coerce').astype(float).tolist() for key, column in values.items()}
+    return [{"date": date, **{key: col[i] for key, col in columns.items()}} for i, date in enumerate(dates)]
+
+MACRO_SOURCES = {
+    # key: (fetcher name, date column, {output key: column}, rows, sort, zh dates)
+    "cpi": ("macro_china_cpi", '月份', {"value": '全国-同比增长'}, 24, True, True),
+    "ppi": ("macro_china_ppi", '月份', {"value": '当月同比增长'}, 24, True, True),
+    "gdp": ("macro_china_gdp", '季度', {"value": '国内生产总值-同比增长'}, 12, False, False),
+    "lpr": ("macro_china_lpr", 'TRADE_DATE', {"value_1y": 'LPR1Y', "value_5y": 'LPR5Y'}, 12, True, False),
+    "deposit_volume": ("macro_china_money_supply", '月份', {"value": '货币和准货币(M2)-同比增长'}, 12, True, True),
+}
+
 @app.get("/api/macro")
 def get_macro():
-    try:
-        def parse_date_zh(date_str):
-            try:
-                # 2008年05月份 -> 2008-05
-                s = str(date_str).replace('年', '-').replace('月份', '').replace('月', '')
-                parts = s.split('-')
-                if len(parts) == 2:
-                    return f"{parts[0]}-{parts[1].zfill(2)}"
-                return s
-            except:
-                return str(date_str)
-
-        # 1. CPI
-        cpi_data = []
+    cached = macro_cache.get("all")
+    if cached:
+        return cached
+    result = {}
+    for key, (fetcher, date_col, values, tail, sort, zh_dates) in MACRO_SOURCES.items():
         try:
-            df = ak.macro_china_cpi()
-            # Columns: 月份, 全国-当月, 全国-同比增长, ...
-            df = df.sort_values('月份', ascending=True)
-            for _, row in df.tail(24).iterrows():
-                 cpi_data.append({
-                     "date": parse_date_zh(row['月份']),
-                     "value": float(row['全国-同比增长'])
-                 })
+            result[key] = macro_series(getattr(ak, fetcher)(), date_col, values, tail, sort, zh_dates)
         except Exception as e:
-            print(f"CPI Error: {e}")
-
-        # 2. PPI
-        ppi_data = []
-        try:
-            df = ak.macro_china_ppi()
-            # Columns: 月份, 当月, 当月同比增长, ...
-            # Check columns if changed, usually '当月同比增长'
-            # My test showed: 月份, 当月, 当月同比增长, 累计
-            df = df.sort_values('月份', ascending=True)
-            for _, row in df.tail(24).iterrows():
-                 ppi_data.append({
-                     "date": parse_date_zh(row['月份']),
-                     "value": float(row['当月同比增长'])
-                 })
-        except Exception as e:
-            print(f"PPI Error: {e}")
-
-        # 3. GDP
-        gdp_data = []
-        try:
-            df = ak.macro_china_gdp()
-            # Columns: 季度, 国内生产总值-绝对值(亿元), 国内生产总值-同比增长, ...
-            for _, row in df.tail(12).iterrows():
-                 gdp_data.append({
-                     "date": row['季度'],
-                     "value": float(row['国内生产总值-同比增长'])
-                 })
-        except Exception as e:
-             print(f"GDP Error: {e}")
-
-        # 4. LPR (Loan Prime Rate)
-        lpr_data = []
-        try:
-            df = ak.macro_china_lpr()
-            # Columns: TRADE_DATE, LPR1Y, LPR5Y
-            df = df.sort_values('TRADE_DATE', ascending=True)
-            for _, row in df.tail(12).iterrows():
-                 lpr_data.append({
-                     "date": str(row['TRADE_DATE']),
-                     "value_1y": float(row['LPR1Y']),
-                     "value_5y": float(row['LPR5Y'])
-                 })
-        except Exception as e:
-            print(f"LPR Error: {e}")
-
-        # 5. Money Supply (M2)
-        deposit_data = []
-        try:
-            df = ak.macro_china_money_supply()
-            # Columns: 月份, 货币和准货币(M2)-数量(亿元), 货币和准货币(M2)-同比增长, ...
-            df = df.sort_values('月份', ascending=True)
-            for _, row in df.tail(12).iterrows():
-                 deposit_data.append({
-                     "date": parse_date_zh(row['月份']),
-                     "value": float(row['货币和准货币(M2)-同比增长'])
-                 })
-        except Exception as e:
-            print(f"Money Supply Error: {e}")
-
-        return {
-            "cpi": cpi_data,
-            "ppi": ppi_data,
-            "lpr": lpr_data,
-            "gdp": gdp_data,
-            "deposit_volume": deposit_data,
-            "exchange_rate": [], 
-            "deposit_rates": [], 
-            "pmi": [],
-            "fx_reserves": []
-        }
-    except Exception as e:
-        print(f"Macro General Error: {e}")
-        return {
-            "cpi": [], "ppi": [], "lpr": [], "gdp": [], "deposit_volume": []
-        }
+            print(f"Macro {key} Error: {e}")
+            result[key] = []
+    result.update({"exchange_rate": [], "deposit_rates": [], "pmi": [], "fx_reserves": []})
+    if any(result[key] for key in MACRO_SOURCES):
+        macro_cache.set("all", result)
+    return result
+
+# --- Market Digest ---
+@app.get("/api/market/digest")
+def get_market_digest():
+    # The shared market background included in every LLM prompt
+    digest = market_digest.get_digest()
+    if digest is None:
+        raise HTTPException(status_code=503, detail="Market digest not built yet")
+    return digest
 
 # --- Stock Basic Info Cache (Tushare) ---
 STOCK_BASIC_CACHE_FILE = "stock_basic_cache.json"
-stock_basic_cache = {}
-
-def load_stock_basic_cache():
-    global stock_basic_cache
-    if os.path.exists(STOCK_BASIC_CACHE_FILE):
-        try:
-            with open(STOCK_BASIC_CACHE_FILE, 'r', encoding='utf-8') as f:
-                stock_basic_cache = json.load(f)
-        except:
-            stock_basic_cache = {}
-
-def save_stock_basic_cache():
-    try:
-        with open(STOCK_BASIC_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(stock_basic_cache, f, ensure_ascii=False)
-    except:
-        pass
-
-# Initialize cache
-load_stock_basic_cache()
+STOCK_BASIC_TTL = 30 * 24 * 60 * 60
+stock_basic_cache = cache_backend.namespace("stock_basic", ttl=STOCK_BASIC_TTL)
 
 @app.get("/api/stock_info/{symbol}")
 def get_stock_info(symbol: str):
@@ -748,8 +755,8 @@ def get_stock_info(symbol: str):
         info_dict = {}
         use_cache = False
         
-        if symbol in stock_basic_cache:
-            cached = stock_basic_cache[symbol]
+        cached = stock_basic_cache.get(symbol)
+        if cached:
             last_updated = cached.get('updated_at', 0)
             # 30 days * 24 * 3600 = 2592000 seconds
             if time.time() - last_updated < 2592000:
@@ -767,12 +774,14 @@ def get_stock_info(symbol: str):
             basic_df = pd.DataFrame()
             
             try:
-                 company_df = pro.stock_company(ts_code=ts_code)
+                 with metrics.upstream("tushare", "stock_company"):
+                     company_df = pro.stock_company(ts_code=ts_code)
             except Exception as e:
                  print(f"Tushare stock_company fetch failed: {e}")
     
             try:
-                 basic_df = pro.stock_basic(ts_code=ts_code)
+                 with metrics.upstream("tushare", "stock_basic"):
+                     basic_df = pro.stock_basic(ts_code=ts_code)
             except Exception as e:
                  print(f"Tushare stock_basic fetch failed: {e}")
     
@@ -787,7 +796,6 @@ def get_stock_info(symbol: str):
                     "updated_at": time.time(),
                     "data": info_dict
                 }
-                save_stock_basic_cache()
 
         # 2. Realtime Indicators (PE, PB, Market Cap)
         # Use Akshare individual info for market data (faster than spot list)
@@ -870,4 +878,13 @@ def get_stock_info(symbol: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # WEB_CONCURRENCY > 1 runs several worker processes; they share quotes,
+    # basic info, the spot snapshot and the market digest through the cache
+    # backend, and shared background jobs run in one worker per interval
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        if cache_backend.CACHE_BACKEND == "memory":
+            print("WARNING: CACHE_BACKEND=memory gives every worker its own cache", flush=True)
+        uvicorn.run("server:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
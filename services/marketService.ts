@@ -37,14 +37,79 @@ export const fetchCurrentPrice = async (symbol: string): Promise<StockData> => {
   }
 };
 
-export const getMarketContext = () => {
-  return "当前市场处于震荡上行区间，科技股领涨，传统能源板块回调。通胀预期略有下降，市场对美联储降息预期增强。";
+export interface MarketDigest {
+  text: string;
+  version: string;
+  built_at: number;
+  sources: Record<string, string>;
+}
+
+// Shared market background the backend adds to every AI prompt (null until built)
+export const fetchMarketDigest = async (): Promise<MarketDigest | null> => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/market/digest`);
+    return response.data;
+  } catch (error) {
+    return null;
+  }
+};
+
+// Delta sync: every list read carries the collection's version (X-Sync-Version).
+// Saves send only the rows that changed since then, against that version; a
+// 409 means another client wrote in between, so the list is read again and
+// our own changes are replayed once on top of it.
+interface SyncState {
+  version: number | null;
+  synced: Map<string, string>; // id -> JSON of the row the server holds
+  pending: Promise<void>; // Saves run one at a time, each against the previous one's version
+}
+
+const newSyncState = (): SyncState => ({ version: null, synced: new Map(), pending: Promise.resolve() });
+const assetSync = newSyncState();
+const reportSync = newSyncState();
+
+const remember = (state: SyncState, version: unknown, rows: { id: string }[]) => {
+  state.version = version == null ? null : Number(version);
+  state.synced = new Map(rows.map(row => [row.id, JSON.stringify(row)]));
+};
+
+const syncDelta = <T extends { id: string }>(
+  path: string, state: SyncState, rows: T[], reload: () => Promise<unknown>
+): Promise<void> => {
+  const run = async () => {
+    if (state.version === null) await reload();
+    const ids = new Set(rows.map(row => row.id));
+    const upserts = rows.filter(row => state.synced.get(row.id) !== JSON.stringify(row));
+    const deletes = [...state.synced.keys()].filter(id => !ids.has(id));
+    if (upserts.length === 0 && deletes.length === 0) return;
+
+    const post = () => axios.post(`${API_BASE_URL}/${path}/delta`, { base_version: state.version, upserts, deletes });
+    let response;
+    try {
+      response = await post();
+    } catch (error) {
+      if (!axios.isAxiosError(error) || error.response?.status !== 409) throw error;
+      await reload();
+      response = await post();
+    }
+    state.version = response.data.version;
+    upserts.forEach(row => state.synced.set(row.id, JSON.stringify(row)));
+    deletes.forEach(id => state.synced.delete(id));
+  };
+  const result = state.pending.then(run);
+  state.pending = result.catch(() => undefined);
+  return result;
+};
+
+const loadAssets = async (): Promise<Asset[]> => {
+  const response = await axios.get(`${API_BASE_URL}/assets`);
+  remember(assetSync, response.headers['x-sync-version'], response.data);
+  return response.data;
 };
 
 export const fetchAssets = async (): Promise<Asset[]> => {
   try {
-    const response = await axios.get(`${API_BASE_URL}/assets`);
-    const assets = response.data;
+    const assets = await loadAssets();
     
     // Refresh prices if needed (simple optimization: could be done in backend, but keeping frontend logic for now)
     // In a real app, backend should return latest prices or we fetch them in bulk
@@ -58,6 +123,8 @@ export const fetchAssets = async (): Promise<Asset[]> => {
             return asset;
         }
     }));
+    // Refreshed quotes alone are not edits: only the user's changes go into the next delta
+    updatedAssets.forEach((asset: Asset) => assetSync.synced.set(asset.id, JSON.stringify(asset)));
     
     return updatedAssets;
   } catch (error) {
@@ -68,25 +135,40 @@ export const fetchAssets = async (): Promise<Asset[]> => {
 
 export const saveAssets = async (assets: Asset[]): Promise<void> => {
   try {
-    await axios.post(`${API_BASE_URL}/assets`, assets);
+    await syncDelta('assets', assetSync, assets, loadAssets);
   } catch (error) {
     console.error("Failed to save assets:", error);
   }
 };
 
+const loadReports = async (): Promise<AIReport[]> => {
+  const response = await axios.get(`${API_BASE_URL}/reports`);
+  remember(reportSync, response.headers['x-sync-version'], response.data);
+  return response.data;
+};
+
 export const fetchReports = async (): Promise<AIReport[]> => {
   try {
-    const response = await axios.get(`${API_BASE_URL}/reports`);
-    return response.data;
+    return await loadReports();
   } catch (error) {
     console.error("Failed to fetch reports:", error);
     return [];
   }
 };
 
+export const fetchReportContent = async (id: string): Promise<string> => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/reports/${encodeURIComponent(id)}`);
+    return response.data.content || '';
+  } catch (error) {
+    console.error("Failed to fetch report content:", error);
+    return '';
+  }
+};
+
 export const saveReports = async (reports: AIReport[]): Promise<void> => {
   try {
-    await axios.post(`${API_BASE_URL}/reports`, reports);
+    await syncDelta('reports', reportSync, reports, loadReports);
   } catch (error) {
     console.error("Failed to save reports:", error);
   }
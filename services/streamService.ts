@@ -0,0 +1,54 @@
+// Reads a Server-Sent Events response from the backend's streaming LLM
+// endpoints. axios cannot consume a response incrementally in the browser,
+// so this uses fetch and attaches the bearer token itself.
+
+export const streamCompletion = async (
+  url: string,
+  body: unknown | undefined,
+  onDelta: (text: string, delta: string) => void
+): Promise<string> => {
+  const token = localStorage.getItem('token') || sessionStorage.getItem('token');
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+      ...(token ? { Authorization: `Bearer ${token}` } : {})
+    },
+    body: body === undefined ? undefined : JSON.stringify(body)
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'error') throw new Error(payload.detail || 'Stream error');
+      if (event === 'done') return payload.content ?? text;
+      if (payload.delta) {
+        text += payload.delta;
+        onDelta(text, payload.delta);
+      }
+    }
+  }
+  return text;
+};
@@ -0,0 +1,197 @@
+"""
+Cache backend tests: memory, SQLite and the Redis-protocol client (against
+a small in-process RESP server standing in for Redis).
+
+    python -m pytest -q test_cache_backend.py
+"""
+import os
+import time
+import tempfile
+import threading
+import socketserver
+import pytest
+
+from app.services import cache_backend, background_jobs
+
+class FakeRedis(socketserver.StreamRequestHandler):
+    """GET, SET [PX n] [NX], DEL, DBSIZE, PING, SELECT over RESP."""
+    store = {} # key -> (value, expires_at or None)
+    lock = threading.Lock()
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b"*"
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def live(self, key):
+        entry = self.store.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.store[key]
+            return None
+        return entry
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            with self.lock:
+                if cmd == b"GET":
+                    entry = self.live(args[1])
+                    reply = b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+                elif cmd == b"SET":
+                    options = [a.upper() for a in args[3:]]
+                    expires = time.time() + int(options[options.index(b"PX") + 1]) / 1000 if b"PX" in options else None
+                    if b"NX" in options and self.live(args[1]):
+                        reply = b"$-1\r\n"
+                    else:
+                        self.store[args[1]] = (args[2], expires)
+                        reply = b"+OK\r\n"
+                elif cmd == b"DEL":
+                    reply = b":%d\r\n" % int(self.store.pop(args[1], None) is not None)
+                elif cmd == b"DBSIZE":
+                    reply = b":%d\r\n" % len(self.store)
+                elif cmd in (b"PING", b"SELECT"):
+                    reply = b"+OK\r\n"
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+@pytest.fixture(scope="module")
+def redis_url():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRedis)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/1"
+    server.shutdown()
+
+def _make(kind, redis_url):
+    if kind == "memory":
+        return cache_backend.MemoryBackend()
+    if kind == "sqlite":
+        return cache_backend.SQLiteBackend(os.path.join(tempfile.mkdtemp(), "cache.db"))
+    FakeRedis.store.clear()
+    return cache_backend.RedisBackend(redis_url)
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, redis_url):
+    return _make(request.param, redis_url)
+
+def test_get_set_delete(backend):
+    assert backend.get("k") is None
+    backend.set("k", b"v1")
+    backend.set("k", b"v2")
+    assert backend.get("k") == b"v2"
+    backend.delete("k")
+    assert backend.get("k") is None
+
+def test_ttl_expiry(backend):
+    backend.set("short", b"x", ttl=0.05)
+    backend.set("long", b"y", ttl=60)
+    time.sleep(0.1)
+    assert backend.get("short") is None
+    assert backend.get("long") == b"y"
+
+def test_add_is_set_if_absent(backend):
+    assert backend.add("lock", b"a", ttl=0.05)
+    assert not backend.add("lock", b"b", ttl=0.05)
+    assert backend.get("lock") == b"a"
+    time.sleep(0.1)
+    assert backend.add("lock", b"c") # Expired entries can be taken over
+    assert backend.get("lock") == b"c"
+
+def test_shared_across_instances(redis_url):
+    # Two workers = two backend instances on the same file / server
+    path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    a, b = cache_backend.SQLiteBackend(path), cache_backend.SQLiteBackend(path)
+    a.set("quote", b"1")
+    assert b.get("quote") == b"1"
+    assert a.add("job", b"a", ttl=5) and not b.add("job", b"b", ttl=5)
+
+    FakeRedis.store.clear()
+    a, b = cache_backend.RedisBackend(redis_url), cache_backend.RedisBackend(redis_url)
+    a.set("quote", b"1")
+    assert b.get("quote") == b"1"
+
+def test_namespace_serializes_and_counts(monkeypatch):
+    monkeypatch.setattr(cache_backend, "_stats", {})
+    cache_backend.configure(cache_backend.MemoryBackend())
+    quotes = cache_backend.namespace("test_quotes")
+    quotes["600519"] = {"price": 1700.5, "name": "贵州茅台"}
+    assert "600519" in quotes and "000001" not in quotes
+    assert quotes["600519"] == {"price": 1700.5, "name": "贵州茅台"}
+    assert quotes.get("000001", "default") == "default"
+    with pytest.raises(KeyError):
+        quotes["000001"]
+    stats = cache_backend.get_stats()["namespaces"]["test_quotes"]
+    assert stats["hits"] == 2 and stats["misses"] == 3
+
+def test_non_json_value_is_a_miss(monkeypatch):
+    import pickle
+    monkeypatch.setattr(cache_backend, "_stats", {})
+    cache_backend.configure(cache_backend.MemoryBackend())
+    # Whatever another writer left under the key is never unpickled
+    cache_backend.get_backend().set("spot:snapshot", pickle.dumps({"df": None}), None)
+    assert cache_backend.namespace("spot").get("snapshot") is None
+    assert cache_backend.get_stats()["namespaces"]["spot"]["errors"] == 1
+
+def test_spot_snapshot_shared_as_json(monkeypatch):
+    import pandas as pd
+    from app.services import stock_screener
+    cache_backend.configure(cache_backend.MemoryBackend())
+    df = pd.DataFrame({"代码": ["000001", "600519"], "名称": ["平安银行", "贵州茅台"], "最新价": [10.5, None]})
+    stock_screener._share_snapshot({"df": df, "fetched_at": time.time(), "version": "v1"})
+    assert cache_backend.get_backend().get("spot:snapshot").startswith(b"{")
+    entry = stock_screener._shared_snapshot()
+    assert entry["version"] == "v1"
+    pd.testing.assert_frame_equal(entry["df"], df)
+
+def test_unreachable_backend_is_a_miss():
+    cache_backend.configure(cache_backend.RedisBackend("redis://127.0.0.1:9/0", timeout=0.5))
+    try:
+        quotes = cache_backend.namespace("test_down")
+        quotes["a"] = 1 # Logged, not raised
+        assert quotes.get("a") is None
+        assert not quotes.add("lock", 1)
+    finally:
+        cache_backend.configure(cache_backend.MemoryBackend())
+
+def test_shared_job_runs_once_per_interval(tmp_path):
+    path = str(tmp_path / "cache.db")
+    # Two workers (two backend instances on one file) race for the same run
+    cache_backend.configure(cache_backend.SQLiteBackend(path))
+    assert background_jobs.claim("nightly", 60)
+    cache_backend.configure(cache_backend.SQLiteBackend(path))
+    assert not background_jobs.claim("nightly", 60)
+    assert background_jobs.claim("other", 60)
+    cache_backend.configure(cache_backend.MemoryBackend())
+
+def test_legacy_import_runs_on_one_worker(tmp_path, monkeypatch, capsys):
+    import json
+    import server
+    from app import startup_profile
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / server.CACHE_FILE).write_text(json.dumps({"600519": {"price": 1}}), encoding="utf-8")
+    path = str(tmp_path / "cache.db")
+    try:
+        for _ in range(2): # Two workers starting on the same cache file
+            cache_backend.configure(cache_backend.SQLiteBackend(path))
+            server.warm_caches()
+            assert startup_profile.report()["phases"]["cache_warmup"]["status"] == "ok"
+        assert "Cache warmup done by another worker" in capsys.readouterr().out
+        assert (tmp_path / (server.CACHE_FILE + ".imported")).exists()
+        assert server.stock_cache.get("600519") == {"price": 1}
+    finally:
+        cache_backend.configure(cache_backend.MemoryBackend())
+
+def test_cache_stats_needs_admin():
+    import server
+    from fastapi.testclient import TestClient
+    assert TestClient(server.app).get("/api/cache/stats").status_code == 401
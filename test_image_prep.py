@@ -0,0 +1,79 @@
+"""
+Upload preprocessing / recognition cache tests.
+
+    python -m pytest -q test_image_prep.py
+"""
+import io
+import asyncio
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services import image_prep
+
+def _screenshot(size=(1170, 2532), fmt="PNG", **save_args) -> bytes:
+    # Phone-sized holdings screenshot: text rows on white
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for row in range(40):
+        draw.text((40, 60 + row * 60), f"60051{row % 10}  贵州茅台  {row * 100}  1500.{row:02d}", fill="black")
+    out = io.BytesIO()
+    img.save(out, format=fmt, **save_args)
+    return out.getvalue()
+
+class FakeUpload:
+    def __init__(self, data, content_type="image/png"):
+        self.content_type = content_type
+        self._buffer = io.BytesIO(data)
+    async def read(self, n=-1):
+        return self._buffer.read(n)
+
+def test_downscales_to_target_resolution():
+    raw = _screenshot()
+    image = image_prep.preprocess(raw, "image/png")
+    assert image["resized"]
+    assert max(image["size"]) == image_prep.TARGET_MAX_SIDE
+    assert image["mime"] == "image/jpeg"
+    assert image["bytes"] < image["original_bytes"]
+    assert Image.open(io.BytesIO(image["data"])).size == image["size"]
+
+def test_small_images_keep_their_encoding():
+    raw = _screenshot(size=(400, 300))
+    image = image_prep.preprocess(raw, "image/png")
+    assert not image["resized"]
+    assert image["bytes"] <= image["original_bytes"]
+
+def test_key_ignores_container_metadata():
+    a = _screenshot()
+    b = _screenshot(optimize=True, compress_level=9) # Same pixels, different bytes
+    assert a != b
+    assert image_prep.preprocess(a)["key"] == image_prep.preprocess(b)["key"]
+    assert image_prep.preprocess(a)["key"] != image_prep.preprocess(_screenshot(size=(1170, 2400)))["key"]
+
+def test_transparent_png_is_flattened():
+    img = Image.new("RGBA", (200, 100), (0, 0, 0, 0))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    image = image_prep.preprocess(out.getvalue(), "image/png")
+    decoded = Image.open(io.BytesIO(image["data"])).convert("RGB")
+    assert decoded.getpixel((10, 10)) == (255, 255, 255)
+
+def test_rejections():
+    with pytest.raises(image_prep.ImageRejected) as e:
+        image_prep.preprocess(b"not an image")
+    assert e.value.status_code == 400
+    with pytest.raises(image_prep.ImageRejected) as e:
+        asyncio.run(image_prep.read_upload(FakeUpload(b"x" * 5000), limit=4096))
+    assert e.value.status_code == 413
+    with pytest.raises(image_prep.ImageRejected) as e:
+        asyncio.run(image_prep.read_upload(FakeUpload(b"x", content_type="application/pdf")))
+    assert e.value.status_code == 415
+    assert asyncio.run(image_prep.read_upload(FakeUpload(b"x" * 4096), limit=4096)) == b"x" * 4096
+
+def test_cache_roundtrip_per_model():
+    holdings = [{"symbol": "600519", "name": "贵州茅台", "quantity": 100, "costPrice": 1500}]
+    image_prep.put_cached("k", "vision-a", holdings, 12.5)
+    assert image_prep.get_cached("k", "vision-a") == holdings
+    assert image_prep.get_cached("k", "vision-b") is None
+    image_prep.get_cached("k", "vision-a")[0]["quantity"] = 1 # Callers get copies
+    assert image_prep.get_cached("k", "vision-a") == holdings
+    assert image_prep.get_cache_stats()["saved_seconds"] >= 25
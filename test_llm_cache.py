@@ -0,0 +1,90 @@
+"""
+LLM response cache tests on a temporary migrated database.
+
+    python -m pytest -q test_llm_cache.py
+"""
+import os
+import tempfile
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import create_tuned_engine
+from app.migrations import run_migrations
+from app.services import llm_cache
+from app.write_queue import WriteQueue
+
+MODEL = {"name": "deepseek-chat", "provider": "deepseek"}
+
+def _setup():
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    engine = create_tuned_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    return sessionmaker(bind=engine, autoflush=False)
+
+def _completion(text, tokens=100):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": {"total_tokens": tokens}}
+
+def test_key_is_canonical():
+    a = llm_cache.cache_key("m", [{"role": "user", "content": "  hi\n"}], 1)
+    b = llm_cache.cache_key("m", [{"content": "hi", "role": "user"}], 1.0)
+    assert a == b
+    assert a != llm_cache.cache_key("m", [{"role": "user", "content": "hi"}], 0.7)
+    assert a != llm_cache.cache_key("other", [{"role": "user", "content": "hi"}], 1)
+    # Same model name behind two endpoints
+    assert llm_cache.cache_key("m", [{"role": "user", "content": "hi"}], 1, "https://proxy-a/v1") != \
+        llm_cache.cache_key("m", [{"role": "user", "content": "hi"}], 1, "https://proxy-b/v1")
+
+def test_repeat_is_served_from_cache():
+    queue = WriteQueue(session_factory=_setup())
+    calls = []
+    def call():
+        calls.append(1)
+        return _completion("analysis")
+    messages = [{"role": "user", "content": "analyze execution 7"}]
+
+    first, hit = llm_cache.cached_completion(MODEL, messages, 0.7, call, queue=queue)
+    assert not hit
+    queue.submit(lambda db: None).result() # Wait for the store job
+    second, hit = llm_cache.cached_completion(MODEL, messages, 0.7, call, queue=queue)
+    assert hit and second == first
+    assert len(calls) == 1
+
+    # Opt-out skips the lookup but refreshes the entry
+    _, hit = llm_cache.cached_completion(MODEL, messages, 0.7, call, use_cache=False, queue=queue)
+    assert not hit and len(calls) == 2
+    queue.stop()
+
+def test_errors_and_empty_answers_are_not_cached():
+    queue = WriteQueue(session_factory=_setup())
+    llm_cache.cached_completion(MODEL, [{"role": "user", "content": "x"}], 1, lambda: {"error": "boom"}, queue=queue)
+    queue.submit(lambda db: None).result()
+    db = queue.session_factory()
+    assert db.query(models.LLMCacheEntry).count() == 0
+    queue.stop()
+
+def test_eviction_is_lru_and_bounded():
+    db = _setup()()
+    keys = [f"k{i}" for i in range(5)]
+    for key in keys:
+        llm_cache.store(db, key, "m", _completion("x" * 100), 1.0, max_entries=10)
+        db.commit()
+    llm_cache.touch(db, "k0") # k0 becomes the most recently used
+    db.commit()
+    evicted = llm_cache.store(db, "k5", "m", _completion("y"), 1.0, max_entries=3, evict_every=1)
+    db.commit()
+    assert evicted == 3
+    remaining = {row.key for row in db.query(models.LLMCacheEntry)}
+    assert remaining == {"k0", "k4", "k5"}
+
+    size = db.get(models.LLMCacheEntry, "k4").size_bytes
+    llm_cache.evict(db, max_entries=10, max_bytes=size * 2)
+    db.commit()
+    assert db.query(models.LLMCacheEntry).count() == 2
+
+def test_eviction_runs_every_n_stores(monkeypatch):
+    monkeypatch.setattr(llm_cache, "_evict_state", {"stores": 0})
+    db = _setup()()
+    evicted = [llm_cache.store(db, f"k{i}", "m", _completion("x"), 1.0, max_entries=1, evict_every=3) for i in range(3)]
+    db.commit()
+    assert evicted == [0, 0, 2]
+    assert db.query(models.LLMCacheEntry).count() == 1
@@ -0,0 +1,126 @@
+"""
+SSE relay and LLM gateway tests against a local fake OpenAI-compatible endpoint.
+
+    python -m pytest -q test_llm_stream.py
+"""
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services import llm_cache, llm_stream, llm_gateway
+
+CHUNKS = ["今日", "市场", "情绪", "偏强"]
+
+class FakeProvider(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert body["stream"] is True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(b": keep-alive\n\n")
+        for text in CHUNKS:
+            chunk = {"choices": [{"index": 0, "delta": {"content": text}}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b'data: {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}\n\n')
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+def _provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, {"name": "fake", "provider": "fake", "api_key": "k",
+                    "base_url": f"http://127.0.0.1:{server.server_port}/v1/chat/completions"}
+
+def _collect(agen):
+    async def run():
+        frames = [frame async for frame in agen]
+        await llm_gateway.aclose()
+        return frames
+    return asyncio.run(run())
+
+def _parse(frames):
+    events = []
+    for frame in frames:
+        event, data = "message", None
+        for line in frame.strip().split("\n"):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+        events.append((event, data))
+    return events
+
+def test_parse_stream_line_skips_noise():
+    lines = [": ping", "", "event: x", "data: not json", 'data: {"choices":[{"delta":{"content":"a"}}]}',
+             'data: {"choices":[{"delta":{}}]}']
+    assert [llm_gateway.parse_stream_line(line) for line in lines] == ["", "", "", "", "a", ""]
+    assert llm_gateway.parse_stream_line("data: [DONE]") is None
+
+def test_stream_relays_deltas_and_saves_once(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    server, model_config = _provider()
+    saved = []
+    async def save(text):
+        saved.append(text)
+    try:
+        events = _parse(_collect(llm_stream.stream_completion(
+            model_config, [{"role": "user", "content": "hi"}], 0.7, on_complete=save
+        )))
+    finally:
+        server.shutdown()
+    assert [data["delta"] for event, data in events[:-1]] == CHUNKS
+    assert events[-1] == ("done", {"content": "".join(CHUNKS), "cached": False})
+    assert saved == ["".join(CHUNKS)]
+
+def test_upstream_error_is_an_error_event(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    saved = []
+    async def save(text):
+        saved.append(text)
+    model_config = {"name": "fake", "provider": "unreachable", "api_key": "k", "base_url": "http://127.0.0.1:9/unreachable"}
+    events = _parse(_collect(llm_stream.stream_completion(model_config, [], 0.7, timeout=2, on_complete=save)))
+    assert [event for event, _ in events] == ["error"]
+    assert saved == []
+    assert llm_gateway.get_metrics()["providers"]["unreachable"]["errors"] == 1
+
+def test_fair_limiter_round_robins_users():
+    order = []
+    async def run():
+        limiter = llm_gateway.FairLimiter(1)
+        release = asyncio.Event()
+        async def job(user, n):
+            await limiter.acquire(user)
+            try:
+                order.append((user, n))
+                await release.wait()
+            finally:
+                limiter.release()
+        # Alice queues four requests before Bob's two arrive
+        tasks = [asyncio.create_task(job("alice", n)) for n in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(job("bob", n)) for n in range(2)]
+        await asyncio.sleep(0)
+        assert limiter.inflight == 1 and limiter.queued == 5
+        release.set()
+        await asyncio.gather(*tasks)
+        assert limiter.inflight == 0 and limiter.queued == 0
+    asyncio.run(run())
+    assert order == [("alice", 0), ("alice", 1), ("bob", 0), ("alice", 2), ("bob", 1), ("alice", 3)]
+
+def test_cancelled_waiter_frees_its_place():
+    async def run():
+        limiter = llm_gateway.FairLimiter(1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.inflight == 0
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+"""
+Market digest tests with canned source data (no network).
+
+    python -m pytest -q test_market_digest.py
+"""
+import pandas as pd
+
+from app.services import market_digest, prompt_context, cache_backend
+
+SPOT = pd.DataFrame({"涨跌幅": [10.0, 2.5, 0.0, -1.0, -10.0], "成交额": [2e10, 3e10, 1e10, 2e10, 2e10]})
+INDICES = pd.DataFrame({"名称": ["上证指数", "沪深300", "其他"], "最新价": [3300.12, 3900.5, 1.0], "涨跌幅": [0.52, -0.3, 9.0]})
+SECTORS = pd.DataFrame({"板块名称": ["半导体", "银行", "煤炭", "医药"], "涨跌幅": [3.1, -0.5, -2.2, 1.4],
+                        "领涨股票": ["中芯国际", "招商银行", "中国神华", "恒瑞医药"]})
+MACRO = {"cpi": [{"date": "2024-08", "value": 0.6}, {"date": "2024-09", "value": 0.4}],
+         "lpr": [{"date": "2024-10-21", "value_1y": 3.1, "value_5y": 3.6}]}
+
+def test_sections():
+    assert market_digest.summarize_breadth(SPOT)[0].startswith("A股 上涨 2 / 下跌 2 / 平盘 1")
+    assert market_digest.summarize_breadth(SPOT)[1] == "两市成交额 1000 亿"
+    assert market_digest.summarize_indices(INDICES) == ["上证指数 3300.12 (+0.52%); 沪深300 3900.50 (-0.30%)"]
+    sectors = market_digest.summarize_sectors(SECTORS)
+    assert sectors[0].startswith("领涨行业: 半导体 +3.10%, 领涨 中芯国际; 医药")
+    assert sectors[1].startswith("领跌行业: 煤炭 -2.20%")
+    assert market_digest.summarize_macro(MACRO) == ["CPI同比 0.4% (2024-09, 前值 0.6); LPR 1Y 3.1% / 5Y 3.6%"]
+    assert market_digest.summarize_breadth(None) == [] and market_digest.summarize_macro({}) == []
+
+def test_unchanged_data_keeps_version(monkeypatch, tmp_path):
+    cache_backend.configure(cache_backend.SQLiteBackend(str(tmp_path / "cache.db")))
+    data = {"breadth": market_digest.summarize_breadth(SPOT), "indices": [], "sectors": [],
+            "macro": market_digest.summarize_macro(MACRO), "headlines": ["- 要闻一"]}
+    monkeypatch.setattr(market_digest, "_fetch_sources", lambda: (dict(data), {k: "ok" for k in data}))
+    first = market_digest.build()
+    assert "市场宽度:" in first["text"] and "要闻:" in first["text"] and "指数:" not in first["text"]
+    assert first["tokens"] <= market_digest.MARKET_DIGEST_TOKENS
+    # Same data later: same text and version, so prompts keep the same prefix
+    second = market_digest.build()
+    assert (second["version"], second["text"]) == (first["version"], first["text"])
+    data["headlines"] = ["- 要闻二"]
+    assert market_digest.build()["version"] != first["version"]
+
+    # Another worker / the next process reads it from the shared backend
+    monkeypatch.setattr(market_digest, "_state", {"digest": None, "builds": 0})
+    assert "要闻二" in market_digest.get_text()
+    monkeypatch.setattr(market_digest, "_state", {"digest": None, "builds": 0})
+    assert market_digest.load_saved() and market_digest.get_stats()["builds"] == 0
+
+    system = prompt_context.with_market_context("系统", market_digest.get_text())
+    assert system.startswith("系统\n\n**市场宏观背景:**\n市场摘要")
+    cache_backend.configure(cache_backend.MemoryBackend())
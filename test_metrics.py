@@ -0,0 +1,107 @@
+"""
+Instrumentation API and the Prometheus /metrics endpoint.
+
+    python -m pytest -q test_metrics.py
+"""
+import sys
+import types
+import pytest
+from fastapi.testclient import TestClient
+
+from app import metrics, startup_profile
+from app.services import stock_screener
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def lines_for(text: str, name: str) -> list:
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+def test_counter_gauge_and_escaping():
+    metrics.inc("test_events_total", source="sina_hq")
+    metrics.inc("test_events_total", 2, source="sina_hq")
+    metrics.set_gauge("test_depth", 7, queue='a "b"\n')
+    text = metrics.render()
+    assert 'test_events_total{source="sina_hq"} 3' in text
+    assert 'test_depth{queue="a \\"b\\"\\n"} 7' in text
+    assert "# TYPE test_events_total counter" in text
+
+def test_histogram_buckets_are_cumulative():
+    metrics.histogram("test_latency_seconds", "Test latency", buckets=(0.1, 1, 10))
+    for value in (0.05, 0.5, 0.5, 20):
+        metrics.observe("test_latency_seconds", value, stage="x")
+    text = metrics.render()
+    assert lines_for(text, "test_latency_seconds_bucket") == [
+        'test_latency_seconds_bucket{stage="x",le="0.1"} 1',
+        'test_latency_seconds_bucket{stage="x",le="1"} 3',
+        'test_latency_seconds_bucket{stage="x",le="10"} 3',
+        'test_latency_seconds_bucket{stage="x",le="+Inf"} 4',
+    ]
+    assert 'test_latency_seconds_count{stage="x"} 4' in text
+    assert 'test_latency_seconds_sum{stage="x"} 21.05' in text
+
+def test_upstream_counts_exceptions_and_bad_status():
+    with metrics.upstream("sina_hq", "quote") as call:
+        call.check(200)
+    with metrics.upstream("sina_hq", "quote") as call:
+        call.check(503)
+    with pytest.raises(TimeoutError):
+        with metrics.upstream("sina_hq", "quote"):
+            raise TimeoutError()
+    text = metrics.render()
+    assert 'upstream_requests_total{endpoint="quote",outcome="ok",source="sina_hq"} 1' in text
+    assert 'upstream_requests_total{endpoint="quote",outcome="error",source="sina_hq"} 2' in text
+    assert 'upstream_errors_total{endpoint="quote",reason="http_503",source="sina_hq"} 1' in text
+    assert 'upstream_errors_total{endpoint="quote",reason="TimeoutError",source="sina_hq"} 1' in text
+    assert 'upstream_request_duration_seconds_count{endpoint="quote",source="sina_hq"} 3' in text
+
+def test_lazy_module_times_every_function(monkeypatch):
+    fake = types.ModuleType("fake_quotes")
+    fake.spot = lambda: "table"
+    fake.VERSION = "1.0"
+    monkeypatch.setitem(sys.modules, "fake_quotes", fake)
+    ak = startup_profile.lazy_import("fake_quotes", instrument="akshare")
+
+    assert ak.spot() == "table" and ak.spot() == "table"
+    assert ak.spot is ak.spot # One wrapper per function
+    assert ak.VERSION == "1.0"
+    # Patching through the stand-in stores the function itself and times the replacement
+    monkeypatch.setattr(ak, "spot", lambda: "patched")
+    assert fake.spot() == "patched"
+    assert ak.spot() == "patched"
+    monkeypatch.undo()
+    assert not getattr(fake.spot, "_upstream_timed", False)
+
+    text = metrics.render()
+    assert 'upstream_requests_total{endpoint="spot",outcome="ok",source="akshare"} 3' in text
+
+def test_cache_collectors_report_hit_ratio(monkeypatch):
+    monkeypatch.setattr(stock_screener, "_cache_stats", {"hits": 3, "misses": 1, "evictions": 2, "saved_seconds": 0.0})
+    text = metrics.render()
+    assert 'cache_hits_total{cache="screen_result"} 3' in text
+    assert 'cache_misses_total{cache="screen_result"} 1' in text
+    assert 'cache_hit_ratio{cache="screen_result"} 0.75' in text
+    assert 'cache_evictions_total{cache="screen_result"} 2' in text
+
+def test_failing_collector_does_not_break_the_scrape():
+    @metrics.register_collector
+    def broken():
+        raise RuntimeError("boom")
+    try:
+        metrics.inc("test_alive_total")
+        assert "test_alive_total 1" in metrics.render()
+    finally:
+        metrics._collectors.remove(broken)
+
+def test_metrics_endpoint_reports_threadpool():
+    import server
+    client = TestClient(server.app)
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "threadpool_max_threads 40" in resp.text
+    assert lines_for(resp.text, "threadpool_saturation ")
+    assert "# TYPE threadpool_borrowed_threads gauge" in resp.text
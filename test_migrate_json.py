@@ -0,0 +1,43 @@
+"""
+Legacy JSON importer on a temporary migrated database.
+
+    python -m pytest -q test_migrate_json.py
+"""
+import os
+import tempfile
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import create_tuned_engine
+from app.migrations import run_migrations
+import migrate_json_to_db
+
+def _asset(asset_id, quantity=100):
+    return {"id": asset_id, "symbol": "600519", "name": "贵州茅台", "type": "stock", "quantity": quantity,
+            "costPrice": 1500.0, "currentPrice": 1700.0, "currency": "CNY"}
+
+def _report(report_id, content="body"):
+    return {"id": report_id, "timestamp": "2026-01-01", "summary": "s", "content": content, "score": 60}
+
+def test_import_keeps_existing_rows():
+    engine = create_tuned_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import.db')}")
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    user = models.User(username="admin", hashed_password="x")
+    db.add(user)
+    db.commit()
+    migrate_json_to_db.import_assets(db, [_asset("kept"), _asset("both", quantity=1)], user.id)
+    migrate_json_to_db.import_reports(db, [_report("kept"), _report("both", "old")], user.id)
+
+    assert migrate_json_to_db.import_assets(db, [_asset("both", quantity=5), _asset("new")], user.id) == 2
+    migrate_json_to_db.import_reports(db, [_report("both", "new")], user.id)
+    db.expire_all()
+
+    assets = {a.id: a for a in db.query(models.Asset).filter(models.Asset.user_id == user.id)}
+    assert set(assets) == {"kept", "both", "new"}
+    assert assets["both"].quantity == 5
+    reports = {r.id: r for r in db.query(models.Report).filter(models.Report.user_id == user.id)}
+    assert set(reports) == {"kept", "both"}
+    assert reports["both"].content == "new"
+    versions = {v.collection: v.version for v in db.query(models.SyncVersion).filter(models.SyncVersion.user_id == user.id)}
+    assert versions["assets"] == 2 and versions["reports"] == 2
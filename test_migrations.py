@@ -0,0 +1,36 @@
+"""
+Migrations started by several worker processes at once on a fresh database.
+
+    python -m pytest -q test_migrations.py
+"""
+import os
+import sys
+import tempfile
+import subprocess
+from sqlalchemy import text
+
+from app.database import create_tuned_engine
+from app.migrations import MIGRATIONS, MIGRATIONS_TABLE
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+WORKERS = 4
+
+def test_concurrent_workers_migrate_once():
+    path = os.path.join(tempfile.mkdtemp(), "race.db")
+    code = (
+        "from app.database import create_tuned_engine\n"
+        "from app.migrations import run_migrations\n"
+        f"print(len(run_migrations(create_tuned_engine({f'sqlite:///{path}'!r}))))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    procs = [subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(path), env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for _ in range(WORKERS)]
+    results = [p.communicate(timeout=120) + (p.returncode,) for p in procs]
+    assert all(code == 0 for _, _, code in results), [err for _, err, _ in results]
+    # One worker applied everything, the others found nothing pending
+    applied = sorted(int(out.strip().splitlines()[-1]) for out, _, _ in results)
+    assert applied == [0] * (WORKERS - 1) + [len(MIGRATIONS)]
+
+    with create_tuned_engine(f"sqlite:///{path}").connect() as conn:
+        versions = [row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))]
+    assert sorted(versions) == sorted(m[0] for m in MIGRATIONS)
@@ -0,0 +1,68 @@
+"""
+Model registry tests on a temporary migrated database.
+
+    python -m pytest -q test_model_registry.py
+"""
+import os
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas, models
+from app.database import create_tuned_engine
+from app.migrations import run_migrations
+from app.services import model_registry
+
+def _config(id, modules, is_active=True):
+    return schemas.ModelConfigCreate(id=id, provider="p", name=f"model-{id}", api_key="k",
+                                     base_url="http://x", modules=modules, is_active=is_active)
+
+def _setup():
+    path = os.path.join(tempfile.mkdtemp(), "registry.db")
+    engine = create_tuned_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    model_registry.configure(factory)
+    return engine, factory
+
+def test_lookup_by_module_with_fallback():
+    engine, factory = _setup()
+    db = factory()
+    crud.save_models_bulk(db, [
+        _config("a", ["ai_report"]),
+        _config("b", ["stock_selection"], is_active=False),
+        _config("c", ["ai_report", "position_entry"]),
+    ])
+    assert model_registry.get_model("ai_report")["id"] == "a"
+    assert model_registry.get_model("position_entry")["id"] == "c"
+    # Inactive stock_selection model: falls back to ai_report
+    assert model_registry.get_model("stock_selection", "ai_report")["id"] == "a"
+    assert model_registry.get_model("unknown") is None
+
+def test_no_queries_until_invalidated():
+    engine, factory = _setup()
+    db = factory()
+    crud.save_models_bulk(db, [_config("a", ["ai_report"])])
+    model_registry.get_model("ai_report")
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    for _ in range(100):
+        model_registry.get_model("ai_report")
+    assert statements == []
+
+    # A write through crud invalidates; the next lookup sees the new config
+    crud.save_models_bulk(db, [_config("z", ["ai_report"])])
+    assert model_registry.get_model("ai_report")["id"] == "z"
+
+def test_refresh_picks_up_external_writes():
+    engine, factory = _setup()
+    db = factory()
+    crud.save_models_bulk(db, [_config("a", ["ai_report"])])
+    assert model_registry.get_model("ai_report")["id"] == "a"
+    # Written without crud (another process): visible after the refresh job
+    db.query(models.ModelConfig).filter(models.ModelConfig.id == "a").update({"is_active": False})
+    db.commit()
+    assert model_registry.get_model("ai_report")["id"] == "a"
+    model_registry.refresh_job()
+    assert model_registry.get_model("ai_report") is None
@@ -0,0 +1,120 @@
+"""
+Pending-outcome selection, closing outcomes only after history was tried, and
+how tracking prices closed outcomes.
+
+    python -m pytest -q test_outcome_tracker.py
+"""
+import os
+import datetime
+import tempfile
+import pandas as pd
+from sqlalchemy.orm import sessionmaker
+
+from app import models, crud
+from app.database import create_tuned_engine
+from app.migrations import run_migrations
+from app.services import outcome_tracker
+from app.write_queue import WriteQueue
+
+def _setup(dates):
+    engine = create_tuned_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'outcomes.db')}")
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    user = models.User(username="o", hashed_password="x")
+    db.add(user)
+    db.commit()
+    strategy = models.Strategy(name="s", params={}, user_id=user.id)
+    db.add(strategy)
+    db.commit()
+    execution = models.StrategyExecution(strategy_id=strategy.id)
+    db.add(execution)
+    db.flush()
+    recs = []
+    for i, date in enumerate(dates):
+        rec = models.StockRecommendation(strategy_id=strategy.id, execution_id=execution.id, symbol=f"60000{i}",
+                                         name="x", date=date, price=10.0, change_percent=1.0, reason={})
+        db.add(rec)
+        recs.append(rec)
+    db.commit()
+    return db, recs
+
+def _refresh(monkeypatch, db, histories):
+    """refresh_outcomes with history per symbol (None: the fetch fails)."""
+    def fetch(symbol, start_date):
+        if histories.get(symbol) is None:
+            raise ConnectionError("no history")
+        return histories[symbol]
+    monkeypatch.setattr(outcome_tracker, "fetch_daily_history", fetch)
+    queue = WriteQueue(session_factory=sessionmaker(bind=db.get_bind(), autoflush=False))
+    monkeypatch.setattr(outcome_tracker, "write_queue", queue)
+    try:
+        return outcome_tracker.refresh_outcomes(db, max_workers=1)
+    finally:
+        queue.stop()
+        db.expire_all()
+
+def _history(start, days):
+    dates = pd.bdate_range(start, periods=days).strftime("%Y-%m-%d")
+    closes = [10.0 + i * 0.1 for i in range(days)]
+    return pd.DataFrame({"日期": dates, "收盘": closes, "最高": closes, "最低": closes})
+
+def test_old_recommendations_get_history_before_closing(monkeypatch):
+    db, (backfilled, partial, failed, recent) = _setup(["2026-03-02", "2026-03-03", "2026-03-04", "2026-10-14"])
+    db.add(models.RecommendationOutcome(recommendation_id=failed.id, symbol=failed.symbol,
+                                        return_t1=1.5, days_observed=3, is_closed=False))
+    db.commit()
+    histories = {
+        backfilled.symbol: _history("2026-03-02", 30),
+        partial.symbol: _history("2026-03-03", 4), # Suspended after three sessions
+        failed.symbol: None,
+        recent.symbol: None,
+    }
+    assert _refresh(monkeypatch, db, histories) == 2
+    outcomes = {o.recommendation_id: o for o in db.query(models.RecommendationOutcome)}
+    # Old but with history: computed like any other, not an empty closed row
+    assert outcomes[backfilled.id].is_closed and outcomes[backfilled.id].return_t5 == 5.0
+    assert outcomes[backfilled.id].last_close is not None
+    # Window cannot fill any more: closed with what was observed
+    assert outcomes[partial.id].is_closed and outcomes[partial.id].days_observed == 3
+    assert outcomes[partial.id].return_t3 is not None
+    # Fetch failed past the max age: closed as it is
+    assert outcomes[failed.id].is_closed and outcomes[failed.id].return_t1 == 1.5
+    # Recent failure stays pending for the next run
+    assert recent.id not in outcomes
+    assert [r.id for r in crud.get_recommendations_pending_outcome(db)] == [recent.id]
+
+def test_old_recommendation_without_history_gets_closed_placeholder(monkeypatch):
+    db, (rec,) = _setup(["2026-03-02"])
+    _refresh(monkeypatch, db, {rec.symbol: None})
+    outcome = db.query(models.RecommendationOutcome).one()
+    assert outcome.is_closed and outcome.last_close is None and outcome.return_t20 is None
+    assert crud.get_recommendations_pending_outcome(db) == []
+
+def test_least_recently_updated_first():
+    db, recs = _setup(["2026-09-01", "2026-09-02", "2026-09-03"])
+    now = datetime.datetime(2026, 10, 1)
+    db.add(models.RecommendationOutcome(recommendation_id=recs[0].id, symbol="a", updated_at=now))
+    db.add(models.RecommendationOutcome(recommendation_id=recs[1].id, symbol="b", updated_at=now - datetime.timedelta(days=1)))
+    db.commit()
+    # No outcome row yet first, then the stalest open row
+    assert [r.id for r in crud.get_recommendations_pending_outcome(db, limit=2)] == [recs[2].id, recs[1].id]
+
+def test_tracking_prices_closed_outcome_without_history_live(monkeypatch):
+    from fastapi import Response
+    from app.routers import strategies
+    db, (closed, placeholder) = _setup(["2026-03-02", "2026-03-03"])
+    db.add(models.RecommendationOutcome(recommendation_id=closed.id, symbol=closed.symbol, is_closed=True, last_close=12.0))
+    db.add(models.RecommendationOutcome(recommendation_id=placeholder.id, symbol=placeholder.symbol, is_closed=True))
+    db.commit()
+    requested = []
+    def prices(symbols):
+        requested.extend(symbols)
+        return {placeholder.symbol: 11.0}
+    monkeypatch.setattr(strategies, "fetch_realtime_prices_batch", prices)
+    user = db.query(models.User).one()
+
+    items = {i.id: i for i in strategies.get_strategy_tracking(Response(), None, None, 50, None, user, db)}
+    assert requested == [placeholder.symbol]
+    assert items[closed.id].current_price == 12.0 and items[closed.id].return_percent == 20.0
+    # No fake 0% from falling back to the recommendation price
+    assert items[placeholder.id].current_price == 11.0 and items[placeholder.id].return_percent == 10.0
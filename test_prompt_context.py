@@ -0,0 +1,65 @@
+"""
+Prompt context budgeting tests.
+
+    python -m pytest -q test_prompt_context.py
+"""
+from app.services import prompt_context
+from app.services.prompt_context import ContextBuilder, estimate_tokens
+
+COLUMNS = [("name", "名称"), ("change", "涨幅%")]
+
+def _rows(n):
+    return [{"name": f"股票{i}", "change": 10.0 - i * 0.1} for i in range(n)]
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("贵州茅台") == 4
+
+def test_table_trimmed_to_budget_keeps_best_rows():
+    rows = _rows(200)
+    text, stats = ContextBuilder(300).add_table("候选", COLUMNS, rows, min_rows=3,
+                                                overflow=lambda d: f"另有 {len(d)} 只").build()
+    kept = stats["sections"]["候选"]["rows"]
+    assert 3 <= kept < 200
+    assert stats["tokens"] <= 300
+    assert "| 股票0 | 9.9 |" not in text and "| 股票0 | 10 |" in text # Highest ranked first
+    assert f"| 股票{kept - 1} |" in text and f"| 股票{kept} |" not in text
+    assert f"另有 {200 - kept} 只" in text
+    # Field names appear once, in the header
+    assert text.count("名称") == 1
+
+def test_required_sections_survive_a_tiny_budget():
+    text, stats = (ContextBuilder(10)
+                   .add_text("任务", "必须保留的说明")
+                   .add_text("背景", "可选背景", required=False, priority=1)
+                   .add_table("新闻", COLUMNS, _rows(5), min_rows=0)
+                   .add_table("持仓", COLUMNS, _rows(5), min_rows=2)
+                   .build())
+    assert "必须保留的说明" in text and "可选背景" not in text
+    assert "新闻" not in text # No rows fit: no empty header either
+    assert stats["sections"]["持仓"] == {"rows": 2, "dropped": 3}
+
+def test_portfolio_collapses_small_positions():
+    holdings = [{"name": f"H{i}", "symbol": f"{i:06d}", "quantity": 100, "cost_price": 10,
+                 "current_price": 10 + i} for i in range(60)]
+    news = [{"title": f"新闻{i}", "source": "s", "summary": "摘要" * 20} for i in range(30)]
+    messages, stats = prompt_context.build_portfolio_messages(holdings, news, None, "大盘震荡\n   板块轮动", budget=800)
+    content = messages[1]["content"]
+    assert stats["tokens"] <= 800
+    assert "大盘震荡\n板块轮动" in messages[0]["content"] and "大盘震荡" not in content
+    held = stats["sections"]["用户资产组合 (含技术指标与仓位权重)"]
+    assert held["rows"] >= prompt_context.REPORT_MIN_HOLDINGS and held["dropped"] > 0
+    assert "| H59 |" in content # Largest position first
+    assert f"其余 {held['dropped']} 只小仓位合计" in content
+    assert "<meta>" in content and "当前总市值: 237000.00" in content
+
+def test_shared_section_builds_once():
+    calls = []
+    def build():
+        calls.append(1)
+        return "digest"
+    assert prompt_context.shared_section("test:k", build) == "digest"
+    assert prompt_context.shared_section("test:k", build) == "digest"
+    assert len(calls) == 1
+    assert prompt_context.market_context_section("  a\n\n  b  ") == "a\nb"
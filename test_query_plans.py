@@ -0,0 +1,155 @@
+"""
+Query-plan regression tests for the hot read paths.
+
+Builds a migrated, seeded SQLite database in a temp dir, runs each crud query
+once to capture its SQL, then checks EXPLAIN QUERY PLAN: every table must be
+reached through an index (no full-table SCAN), and single-table listings must
+come back in index order (no temp B-tree sort).
+
+    python -m pytest -q test_query_plans.py
+"""
+import os
+import re
+import datetime
+import tempfile
+from sqlalchemy import event, create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import models, crud
+from app.database import create_tuned_engine
+from app.migrations import run_migrations, MIGRATIONS
+
+N_USERS = 20
+N_STRATEGIES = 100
+N_EXECUTIONS = 2000
+N_RECOMMENDATIONS = 20000
+N_REPORTS = 5000
+BASE_TIME = datetime.datetime(2026, 1, 1)
+
+_state = {}
+
+def _seeded():
+    if _state:
+        return _state
+    path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    engine = create_tuned_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    users = [models.User(username=f"plan{i}", hashed_password="x") for i in range(N_USERS)]
+    db.add_all(users)
+    db.commit()
+    strategies = [models.Strategy(name=f"s{i}", params={}, user_id=users[i % N_USERS].id) for i in range(N_STRATEGIES)]
+    db.add_all(strategies)
+    db.commit()
+    executions = [
+        models.StrategyExecution(strategy_id=strategies[i % N_STRATEGIES].id, created_at=BASE_TIME + datetime.timedelta(minutes=i))
+        for i in range(N_EXECUTIONS)
+    ]
+    db.add_all(executions)
+    db.commit()
+    db.execute(models.StockRecommendation.__table__.insert(), [
+        dict(strategy_id=executions[i % N_EXECUTIONS].strategy_id, execution_id=executions[i % N_EXECUTIONS].id,
+             symbol=f"{600000 + i % 500}", name="x", date="2026-01-01", price=10.0, reason={})
+        for i in range(N_RECOMMENDATIONS)
+    ])
+    db.execute(models.Report.__table__.insert(), [
+        dict(id=f"r{i}", user_id=users[i % N_USERS].id, timestamp=f"2026-01-{i % 28 + 1:02d}T00:00:{i % 60:02d}",
+             summary="s", content="c", score=50, model_name="m")
+        for i in range(N_REPORTS)
+    ])
+    db.commit()
+    db.execute(text("ANALYZE"))
+    db.commit()
+
+    captured = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, context, executemany: captured.append((statement, parameters)))
+    _state.update(engine=engine, db=db, captured=captured, user_id=users[3].id,
+                  strategy_id=strategies[3].id, execution_id=executions[3].id)
+    return _state
+
+def query_plan(fn) -> list:
+    """Runs fn (one crud call) and returns the plan lines of the last statement it executed."""
+    state = _seeded()
+    state["captured"].clear()
+    fn(state["db"])
+    statement, parameters = state["captured"][-1]
+    with state["engine"].connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+def full_scans(plan: list) -> list:
+    # "SCAN t" / "SCAN t AS x" without USING INDEX; subquery / CTE scans are fine
+    return [line for line in plan if re.match(r"^SCAN (?!\()\w+( AS \w+)?$", line) and not line.startswith("SCAN ranked")]
+
+def assert_indexed(plan: list, ordered: bool = False):
+    assert not full_scans(plan), "\n".join(plan)
+    if ordered:
+        assert not any("TEMP B-TREE FOR ORDER BY" in line for line in plan), "\n".join(plan)
+
+def test_tracking_uses_indexes():
+    s = _seeded()
+    assert_indexed(query_plan(lambda db: crud.get_tracking_page(db, s["user_id"], 51)))
+
+def test_tracking_cursor_page_uses_indexes():
+    s = _seeded()
+    after = (BASE_TIME + datetime.timedelta(minutes=N_EXECUTIONS // 2), 10 ** 9)
+    assert_indexed(query_plan(lambda db: crud.get_tracking_page(db, s["user_id"], 51, after=after)))
+
+def test_tracking_by_execution_is_ordered_lookup():
+    s = _seeded()
+    plan = query_plan(lambda db: crud.get_tracking_page(db, s["user_id"], 51, execution_id=s["execution_id"]))
+    assert_indexed(plan, ordered=True)
+    assert any("ix_stock_recommendations_execution_id_id" in line for line in plan), "\n".join(plan)
+
+def test_tracking_by_strategy_uses_indexes():
+    s = _seeded()
+    plan = query_plan(lambda db: crud.get_tracking_page(db, s["user_id"], 51, strategy_id=s["strategy_id"]))
+    assert_indexed(plan)
+    assert any("ix_strategy_executions_strategy_id_created_at" in line for line in plan), "\n".join(plan)
+
+def test_tracking_summary_uses_indexes():
+    s = _seeded()
+    assert_indexed(query_plan(lambda db: crud.get_tracking_summary(db, s["user_id"], "t5")))
+
+def test_execution_cache_counts_are_per_user():
+    s = _seeded()
+    plan = query_plan(lambda db: crud.get_execution_cache_counts(db, s["user_id"]))
+    assert_indexed(plan)
+    counts = crud.get_execution_cache_counts(s["db"], s["user_id"])
+    assert counts["executions_total"] == N_EXECUTIONS // N_USERS
+
+def test_executions_listing_is_index_ordered():
+    s = _seeded()
+    plan = query_plan(lambda db: crud.get_executions(db, s["strategy_id"]))
+    assert_indexed(plan, ordered=True)
+    assert any("ix_strategy_executions_strategy_id_created_at" in line for line in plan), "\n".join(plan)
+
+def test_reports_listing_is_index_ordered():
+    s = _seeded()
+    plan = query_plan(lambda db: crud.get_report_summaries(db, s["user_id"]))
+    assert_indexed(plan, ordered=True)
+    assert any("ix_reports_user_id_timestamp" in line for line in plan), "\n".join(plan)
+
+def test_migrations_upgrade_legacy_database():
+    # A database created by the old init_db.py: no migrations table, no new columns or indexes
+    path = os.path.join(tempfile.mkdtemp(), "legacy.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, hashed_password VARCHAR, role VARCHAR, is_active BOOLEAN, created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE strategies (id INTEGER PRIMARY KEY, name VARCHAR, description VARCHAR, params JSON, priority INTEGER, schedule_time VARCHAR, is_active BOOLEAN, created_at DATETIME, user_id INTEGER)"))
+        conn.execute(text("CREATE TABLE strategy_executions (id INTEGER PRIMARY KEY, strategy_id INTEGER, created_at DATETIME, ai_analysis TEXT)"))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'legacy')"))
+        conn.execute(text("INSERT INTO strategies (id, name, user_id) VALUES (1, 'legacy', 1)"))
+        conn.execute(text("INSERT INTO strategy_executions (strategy_id, ai_analysis) VALUES (1, 'kept')"))
+
+    assert run_migrations(engine) == [m[0] for m in MIGRATIONS]
+    assert run_migrations(engine) == []
+
+    with engine.connect() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(strategy_executions)"))}
+        indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(strategy_executions)"))}
+        kept = conn.execute(text("SELECT ai_analysis FROM strategy_executions")).scalar()
+    assert {"snapshot_version", "params_hash", "cache_hit"} <= columns
+    assert "ix_strategy_executions_strategy_id_created_at" in indexes
+    assert kept == "kept"
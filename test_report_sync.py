@@ -0,0 +1,57 @@
+"""
+Report writes without content and the report body compression migration.
+
+    python -m pytest -q test_report_sync.py
+"""
+import os
+import tempfile
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app import models, crud, schemas, migrations
+from app.database import create_tuned_engine
+from app.migrations import run_migrations
+
+def _setup():
+    engine = create_tuned_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reports.db')}")
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    user = models.User(username="r", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return engine, db, user
+
+def _report(report_id, content=None):
+    return schemas.ReportCreate(id=report_id, timestamp="2026-01-01", summary="s", score=50, content=content)
+
+def test_new_report_without_content_is_rejected():
+    engine, db, user = _setup()
+    crud.save_reports_bulk(db, [_report("a", "body")], user.id)
+    # Known id: the stored body is kept
+    crud.save_reports_bulk(db, [_report("a")], user.id)
+    db.expire_all()
+    assert crud.get_report(db, "a", user.id).content == "body"
+
+    with pytest.raises(crud.MissingReportContent) as e:
+        crud.save_reports_bulk(db, [_report("a"), _report("b")], user.id)
+    assert e.value.report_ids == ["b"]
+    with pytest.raises(crud.MissingReportContent):
+        crud.apply_reports_delta(db, schemas.ReportDelta(base_version=0, upserts=[_report("c")]), user.id)
+    with pytest.raises(crud.MissingReportContent):
+        crud.create_report(db, _report("d"), user.id)
+    assert db.query(models.Report).count() == 1
+
+def test_compress_migration_pages_through_bodies():
+    engine, db, user = _setup()
+    with engine.begin() as conn:
+        for i in range(7):
+            conn.execute(
+                text("INSERT INTO reports (id, timestamp, summary, content, score, user_id) VALUES (:id, '', '', :body, 0, :uid)"),
+                {"id": f"r{i}", "body": f"plain body {i}", "uid": user.id}
+            )
+    with engine.begin() as conn:
+        migrations._compress_report_content(conn, batch_size=3)
+        assert conn.execute(text("SELECT COUNT(*) FROM reports WHERE typeof(content) = 'text'")).scalar() == 0
+    db.expire_all()
+    assert crud.get_report(db, "r6", user.id).content == "plain body 6"
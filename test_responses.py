@@ -0,0 +1,86 @@
+"""
+Response layer tests: orjson rendering, ETag / 304 and compression.
+
+    python -m pytest -q test_responses.py
+"""
+import numpy as np
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import responses
+from app.responses import FastJSONResponse, ResponseLayerMiddleware
+
+ROWS = [{"symbol": f"{i:06d}", "name": "贵州茅台", "price": 1700.5 + i} for i in range(200)]
+
+def _client():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(ResponseLayerMiddleware)
+
+    @app.get("/big")
+    def big():
+        return ROWS
+
+    @app.get("/small")
+    def small():
+        return {"ok": True, "nan": float("nan"), "np": np.float64(1.5)}
+
+    @app.get("/versioned")
+    def versioned(response: Response):
+        response.headers["ETag"] = '"v7"'
+        return ROWS
+
+    @app.get("/stream")
+    def stream():
+        def gen():
+            for i in range(3):
+                yield f"data: {i}\n\n" * 200
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    @app.post("/big")
+    def post_big():
+        return ROWS
+
+    return TestClient(app)
+
+def test_fast_json_handles_numpy_and_nan():
+    resp = _client().get("/small", headers={"Accept-Encoding": "identity"})
+    assert resp.json() == {"ok": True, "nan": None, "np": 1.5}
+    assert "content-encoding" not in resp.headers # Below COMPRESS_MIN_BYTES
+
+def test_gzip_negotiated_on_size():
+    resp = _client().get("/big", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.json() == ROWS # Decoded by the client
+    assert int(resp.headers["content-length"]) < len(responses.dumps(ROWS)) / 3
+    assert "content-encoding" not in _client().get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+def test_choose_encoding():
+    assert responses.choose_encoding("gzip;q=0, deflate") is None
+    assert responses.choose_encoding("deflate, gzip;q=0.5") == "gzip"
+    expected = "br" if responses.brotli is not None else "gzip"
+    assert responses.choose_encoding("gzip, br") == expected
+
+def test_etag_and_304():
+    client = _client()
+    first = client.get("/big")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    again = client.get("/big", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    # Route-provided ETags are kept and honoured
+    assert client.get("/versioned").headers["etag"] == '"v7"'
+    assert client.get("/versioned", headers={"If-None-Match": 'W/"v7"'}).status_code == 304
+    # Only GET
+    assert "etag" not in client.post("/big").headers
+
+def test_streaming_passes_through():
+    resp = _client().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in resp.headers and "etag" not in resp.headers
+    assert resp.text.count("data: 2") == 200
+
+def test_render_numpy_directly():
+    # Returned as a response object, skipping jsonable_encoder
+    body = FastJSONResponse({"arr": np.arange(3), "v": np.int64(4)}).body
+    assert body == b'{"arr":[0,1,2],"v":4}'
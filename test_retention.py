@@ -0,0 +1,83 @@
+"""
+Retention / compaction tests on a temporary migrated database.
+
+    python -m pytest -q test_retention.py
+"""
+import os
+import datetime
+import tempfile
+from sqlalchemy.orm import sessionmaker
+
+from app import models, crud
+from app.database import create_tuned_engine
+from app.migrations import run_migrations
+from app.services import retention
+
+NOW = datetime.datetime(2026, 10, 1, 12, 0)
+
+def _setup(days_back=(200, 200, 150, 10, 1)):
+    path = os.path.join(tempfile.mkdtemp(), "retention.db")
+    engine = create_tuned_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    user = models.User(username="r", hashed_password="x")
+    db.add(user)
+    db.commit()
+    strategy = models.Strategy(name="s", params={}, user_id=user.id)
+    db.add(strategy)
+    db.commit()
+    for n, days in enumerate(days_back):
+        execution = models.StrategyExecution(strategy_id=strategy.id, created_at=NOW - datetime.timedelta(days=days))
+        db.add(execution)
+        db.flush()
+        for i in range(3):
+            rec = models.StockRecommendation(
+                strategy_id=strategy.id, execution_id=execution.id, symbol=f"60000{i}", name="x",
+                date="2026-01-01", price=10.0, change_percent=2.0, reason={}
+            )
+            db.add(rec)
+            db.flush()
+            db.add(models.RecommendationOutcome(recommendation_id=rec.id, symbol=rec.symbol, return_t5=(i - 1) * 1.5, is_closed=True))
+    db.commit()
+    return engine, db, user, strategy
+
+def test_retention_rolls_up_and_cascades():
+    engine, db, user, strategy = _setup()
+    stats = retention.apply_retention(db, rules={"raw_days": 90, "keep_latest": 1}, now=NOW, batch_size=1)
+    assert stats["executions"] == 3
+    assert stats["batches"] == 3
+
+    assert db.query(models.StrategyExecution).count() == 2
+    assert db.query(models.StockRecommendation).count() == 6
+    assert db.query(models.RecommendationOutcome).count() == 6
+
+    daily = {row.day: row for row in db.query(models.StrategyDailyStat).all()}
+    assert len(daily) == 2 # Two executions on the same day were merged additively
+    day = (NOW - datetime.timedelta(days=200)).strftime("%Y-%m-%d")
+    assert daily[day].executions == 2
+    assert daily[day].recommendations == 6
+    assert daily[day].n_return_t5 == 6
+    assert daily[day].wins_t5 == 2
+    assert abs(daily[day].sum_change_percent - 12.0) < 1e-9
+
+def test_keep_latest_protects_old_strategies():
+    engine, db, user, strategy = _setup(days_back=(400, 300))
+    stats = retention.apply_retention(db, rules={"raw_days": 90, "keep_latest": 2}, now=NOW)
+    assert stats["executions"] == 0
+    assert db.query(models.StrategyExecution).count() == 2
+
+def test_delete_user_cascades():
+    engine, db, user, strategy = _setup(days_back=(1,))
+    crud.delete_user(db, user.id)
+    assert db.query(models.Strategy).count() == 0
+    assert db.query(models.StockRecommendation).count() == 0
+    assert db.query(models.RecommendationOutcome).count() == 0
+
+def test_compact_runs_incremental_vacuum():
+    engine, db, user, strategy = _setup(days_back=(200,) * 50)
+    retention.apply_retention(db, rules={"raw_days": 90, "keep_latest": 0}, now=NOW)
+    db.close()
+    result = retention.compact(engine)
+    assert result["action"] == "incremental_vacuum"
+    assert result["free_pages_before"] > 0
+    assert result["free_pages_after"] < result["free_pages_before"]
@@ -0,0 +1,33 @@
+"""
+Lazy import / startup timing tests.
+
+    python -m pytest -q test_startup_profile.py
+"""
+import sys
+import pytest
+
+from app import startup_profile
+
+def test_lazy_module_imports_on_first_use():
+    sys.modules.pop("colorsys", None)
+    colorsys = startup_profile.lazy_import("colorsys")
+    assert "colorsys" not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+    entry = startup_profile.report()["lazy_imports"]["colorsys"]
+    assert entry["trigger"] == f"{__name__}.test_lazy_module_imports_on_first_use"
+    assert entry["seconds"] >= 0
+
+def test_lazy_module_setattr_reaches_real_module(monkeypatch):
+    json_module = startup_profile.lazy_import("json")
+    monkeypatch.setattr(json_module, "_bench_marker", 1, raising=False)
+    assert sys.modules["json"]._bench_marker == 1
+
+def test_phases_record_status():
+    with startup_profile.phase("ok_step"):
+        pass
+    with pytest.raises(ValueError):
+        with startup_profile.phase("bad_step"):
+            raise ValueError()
+    phases = startup_profile.report()["phases"]
+    assert phases["ok_step"]["status"] == "ok" and phases["bad_step"]["status"] == "error"
@@ -0,0 +1,27 @@
+"""
+Sweep grid limits and checkpoint naming.
+
+    python -m pytest -q test_strategy_optimizer.py
+"""
+import pytest
+
+from app.services import strategy_optimizer
+
+def test_count_matches_expansion():
+    for spec in ({"start": 1, "stop": 5, "step": 1}, {"start": 0, "stop": 1, "step": 0.1}, [2, 3], 4):
+        assert strategy_optimizer.count_values(spec) == len(strategy_optimizer.expand_values(spec))
+
+def test_oversized_grid_is_rejected_before_expanding():
+    grid = {"min_change": {"start": 0, "stop": 1e9, "step": 0.001}}
+    with pytest.raises(strategy_optimizer.GridTooLarge):
+        strategy_optimizer.expand_grid({}, grid)
+    # The product counts, not each axis on its own
+    grid = {"min_change": list(range(100)), "max_change": list(range(100))}
+    with pytest.raises(strategy_optimizer.GridTooLarge):
+        strategy_optimizer.check_grid_size(grid)
+
+def test_checkpoint_per_sweep():
+    a = strategy_optimizer.checkpoint_path_for(1, {}, {"min_change": [1, 2]}, 10)
+    b = strategy_optimizer.checkpoint_path_for(1, {}, {"min_change": [1, 3]}, 10)
+    assert a != b
+    assert a == strategy_optimizer.checkpoint_path_for(1, {}, {"min_change": [1, 2]}, 10)
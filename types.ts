@@ -19,7 +19,7 @@ export interface AIReport {
   id: string;
   timestamp: string;
   summary: string;
-  content: string;
+  content?: string; // Not included in the list response, loaded on demand
   score: number;
   model_name?: string;
 }
@@ -31,6 +31,7 @@ export interface ModelConfig {
   api_key: string;
   base_url: string;
   modules: string[];
+  is_active?: boolean;
 }
 
 export interface MarketNews {